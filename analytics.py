@@ -0,0 +1,271 @@
+"""
+Run analytics.
+
+Loads run records (the JSONL written by the web app and by sweep.py) into
+columnar NumPy arrays and computes pass rates, attempts-to-pass distributions,
+token cost and latency percentiles per group without looping over records.
+
+Group-key columns are dictionary-encoded (integer codes + a list of labels) and
+per-turn latencies are stored Arrow-style as one flat values array plus offsets.
+
+Usage:
+    python analytics.py runs.jsonl sweep_runs.jsonl --by collector_personality,collector_model
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+# USD per 1M tokens (input, output), shared with the model router
+from router import MODEL_PRICES
+
+# Columns that can be grouped on (dictionary-encoded)
+KEY_COLUMNS = ["collector_personality", "collector_model", "prompt_version", "source", "output_governor"]
+
+PERCENTILES = (50, 90, 95, 99)
+MAX_ATTEMPTS_TRACKED = 16
+
+
+class RunTable:
+    """Columnar run records: one NumPy array per field."""
+
+    def __init__(self, columns: dict, categories: dict, turn_values: np.ndarray, turn_offsets: np.ndarray):
+        self.columns = columns
+        self.categories = categories
+        self.turn_values = turn_values
+        self.turn_offsets = turn_offsets
+
+    def __len__(self):
+        return len(self.columns["passed"])
+
+    @property
+    def num_turns(self) -> int:
+        return len(self.turn_values)
+
+
+class RunLog:
+    """Incrementally loaded run records from one or more JSONL files.
+
+    Only bytes appended since the last refresh are parsed, so repeated calls
+    (e.g. from the /stats endpoint) cost time proportional to new runs only.
+    """
+
+    def __init__(self, paths: list):
+        self.paths = list(paths)
+        self.offsets = {path: 0 for path in self.paths}
+        self.categories = {key: [] for key in KEY_COLUMNS}
+        self.category_codes = {key: {} for key in KEY_COLUMNS}
+        self.chunks = []
+        self._table = None
+
+    def _encode(self, key: str, value) -> int:
+        value = "" if value is None else str(value)
+        codes = self.category_codes[key]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.categories[key].append(value)
+        return codes[value]
+
+    def _parse(self, lines: list) -> dict:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        turn_lists = [r.get("turn_latencies_s") or [] for r in records]
+        chunk = {
+            "passed": np.fromiter((bool(r.get("passed")) for r in records), dtype=bool, count=len(records)),
+            "attempts": np.fromiter((r.get("attempts", 0) for r in records), dtype=np.int16, count=len(records)),
+            "prompt_tokens": np.fromiter((r.get("prompt_tokens", 0) for r in records), dtype=np.int64, count=len(records)),
+            "completion_tokens": np.fromiter((r.get("completion_tokens", 0) for r in records), dtype=np.int64, count=len(records)),
+            "latency_s": np.fromiter((r.get("latency_s", 0.0) for r in records), dtype=np.float64, count=len(records)),
+            # NaN for records written before calls were priced by the model that made them
+            "cost_usd": np.fromiter((r.get("cost_usd", np.nan) for r in records), dtype=np.float64, count=len(records)),
+            "turn_counts": np.fromiter((len(t) for t in turn_lists), dtype=np.int64, count=len(records)),
+            "turn_values": np.fromiter((x for t in turn_lists for x in t), dtype=np.float32),
+        }
+        for key in KEY_COLUMNS:
+            chunk[key] = np.fromiter((self._encode(key, r.get(key)) for r in records), dtype=np.int32, count=len(records))
+        return chunk
+
+    def refresh(self) -> bool:
+        """Parse newly appended complete lines; return True if anything was added."""
+        added = False
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                f.seek(self.offsets[path])
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # Leave a partially written last line for next time
+            if end == 0:
+                continue
+            self.offsets[path] += end
+            self.chunks.append(self._parse(data[:end].decode("utf-8").splitlines()))
+            added = True
+        if added:
+            self._table = None
+        return added
+
+    def table(self) -> RunTable:
+        """Return all loaded runs as a single RunTable (cached until new data arrives)."""
+        if self._table is None:
+            names = ["passed", "attempts", "prompt_tokens", "completion_tokens", "latency_s", "cost_usd"] + KEY_COLUMNS
+            if self.chunks:
+                columns = {name: np.concatenate([c[name] for c in self.chunks]) for name in names}
+                turn_counts = np.concatenate([c["turn_counts"] for c in self.chunks])
+                turn_values = np.concatenate([c["turn_values"] for c in self.chunks])
+            else:
+                columns = {name: np.zeros(0, dtype=np.int32) for name in names}
+                turn_counts = np.zeros(0, dtype=np.int64)
+                turn_values = np.zeros(0, dtype=np.float32)
+            turn_offsets = np.concatenate([[0], np.cumsum(turn_counts)])
+            self._table = RunTable(columns, self.categories, turn_values, turn_offsets)
+        return self._table
+
+
+def load_runs(paths: list) -> RunTable:
+    """Load run records from JSONL files into a RunTable."""
+    log = RunLog(paths)
+    log.refresh()
+    return log.table()
+
+
+def run_costs(table: RunTable) -> tuple:
+    """USD cost per run and a mask of the runs whose cost is only an estimate.
+
+    Runs record `cost_usd`, each call priced at the model that made it (the
+    router's or a hedge's pick, the judges and the optimizer included). Older
+    records only have token totals, so every token is priced at the
+    collector model's rate and the run is flagged as estimated.
+    """
+    labels = table.categories["collector_model"]
+    price_in = np.array([MODEL_PRICES.get(label, (0.0, 0.0))[0] for label in labels] or [0.0])
+    price_out = np.array([MODEL_PRICES.get(label, (0.0, 0.0))[1] for label in labels] or [0.0])
+    model = table.columns["collector_model"]
+    estimated = np.isnan(table.columns["cost_usd"])
+    estimate = (table.columns["prompt_tokens"] * price_in[model]
+                + table.columns["completion_tokens"] * price_out[model]) / 1e6
+    return np.where(estimated, estimate, table.columns["cost_usd"]), estimated
+
+
+def group_runs(table: RunTable, by: list):
+    """Return (group index per run, list of group label tuples) for the given key columns."""
+    if not by or len(table) == 0:
+        return np.zeros(len(table), dtype=np.int64), [()]
+    stacked = np.stack([table.columns[key] for key in by], axis=1)
+    unique_codes, group = np.unique(stacked, axis=0, return_inverse=True)
+    labels = [tuple(table.categories[key][code] for key, code in zip(by, row)) for row in unique_codes]
+    return group.reshape(-1), labels
+
+
+def grouped_percentiles(values: np.ndarray, group: np.ndarray, num_groups: int, percentiles=PERCENTILES) -> np.ndarray:
+    """Nearest-rank percentiles of values within each group, shape (num_groups, len(percentiles))."""
+    result = np.full((num_groups, len(percentiles)), np.nan)
+    if len(values) == 0:
+        return result
+    order = np.lexsort((values, group))
+    sorted_values = values[order]
+    counts = np.bincount(group, minlength=num_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    nonempty = counts > 0
+    for i, q in enumerate(percentiles):
+        rank = np.floor(q / 100 * (counts - 1)).astype(np.int64)
+        result[nonempty, i] = sorted_values[(starts + rank)[nonempty]]
+    return result
+
+
+def compute_stats(table: RunTable, by: list = None) -> list:
+    """Aggregate pass rate, attempts-to-pass, cost and latency per group."""
+    by = by or []
+    group, labels = group_runs(table, by)
+    num_groups = len(labels)
+    if len(table) == 0:
+        return []
+
+    passed = table.columns["passed"]
+    attempts = np.clip(table.columns["attempts"].astype(np.int64), 0, MAX_ATTEMPTS_TRACKED)
+    runs = np.bincount(group, minlength=num_groups)
+    passes = np.bincount(group, weights=passed, minlength=num_groups)
+    attempts_hist = np.bincount(
+        group[passed] * (MAX_ATTEMPTS_TRACKED + 1) + attempts[passed],
+        minlength=num_groups * (MAX_ATTEMPTS_TRACKED + 1),
+    ).reshape(num_groups, MAX_ATTEMPTS_TRACKED + 1)
+    attempts_sum = np.bincount(group[passed], weights=attempts[passed], minlength=num_groups)
+    tokens = table.columns["prompt_tokens"] + table.columns["completion_tokens"]
+    token_sum = np.bincount(group, weights=tokens, minlength=num_groups)
+    costs, estimated = run_costs(table)
+    cost_sum = np.bincount(group, weights=costs, minlength=num_groups)
+    estimated_runs = np.bincount(group, weights=estimated, minlength=num_groups)
+    run_latency = grouped_percentiles(table.columns["latency_s"], group, num_groups)
+
+    turn_group = np.repeat(group, np.diff(table.turn_offsets))
+    turn_latency = grouped_percentiles(table.turn_values.astype(np.float64), turn_group, num_groups)
+    turns = np.bincount(turn_group, minlength=num_groups)
+
+    stats = []
+    for g, label in enumerate(labels):
+        stats.append({
+            "group": dict(zip(by, label)),
+            "runs": int(runs[g]),
+            "pass_rate": round(float(passes[g] / runs[g]), 4),
+            "mean_attempts_to_pass": round(float(attempts_sum[g] / passes[g]), 3) if passes[g] else None,
+            "attempts_to_pass": {str(a): int(n) for a, n in enumerate(attempts_hist[g]) if n},
+            "mean_tokens": round(float(token_sum[g] / runs[g]), 1),
+            "total_cost_usd": round(float(cost_sum[g]), 6),
+            "cost_estimated_runs": int(estimated_runs[g]),
+            "run_latency_s": {f"p{q}": round(float(v), 3) for q, v in zip(PERCENTILES, run_latency[g]) if not np.isnan(v)},
+            "turns": int(turns[g]),
+            "turn_latency_s": {f"p{q}": round(float(v), 3) for q, v in zip(PERCENTILES, turn_latency[g]) if not np.isnan(v)},
+        })
+    return stats
+
+
+def print_report(stats: list):
+    """Print stats as a console table."""
+    print("=" * 60)
+    print("📊 RUN ANALYTICS")
+    print("=" * 60)
+    if not stats:
+        print("No runs found.")
+        return
+    for row in stats:
+        label = ", ".join(f"{k}={v}" for k, v in row["group"].items()) or "all runs"
+        print(f"\n{label}")
+        print("-" * 40)
+        print(f"  Runs:                {row['runs']}")
+        print(f"  Pass rate:           {row['pass_rate']:.1%}")
+        print(f"  Mean attempts/pass:  {row['mean_attempts_to_pass']}")
+        print(f"  Attempts to pass:    {row['attempts_to_pass']}")
+        print(f"  Mean tokens/run:     {row['mean_tokens']}")
+        estimated = (f" ({row['cost_estimated_runs']} older run(s) estimated at the collector rate)"
+                     if row["cost_estimated_runs"] else "")
+        print(f"  Total cost:          ${row['total_cost_usd']:.4f}{estimated}")
+        print(f"  Run latency (s):     {row['run_latency_s']}")
+        print(f"  Turn latency (s):    {row['turn_latency_s']} over {row['turns']} turns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pass-rate, cost and latency report over run records.")
+    parser.add_argument("paths", nargs="+", help="Run record JSONL files (runs.jsonl, sweep_runs.jsonl)")
+    parser.add_argument("--by", default="collector_personality", help="Comma-separated group columns: " + ", ".join(KEY_COLUMNS))
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    by = [key for key in args.by.split(",") if key]
+    unknown = [key for key in by if key not in KEY_COLUMNS]
+    if unknown:
+        parser.error(f"Unknown group column(s): {', '.join(unknown)}")
+
+    stats = compute_stats(load_runs(args.paths), by)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_report(stats)
+
+
+if __name__ == "__main__":
+    main()
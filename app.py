@@ -1,45 +1,90 @@
 from flask import Flask, render_template, request, Response, send_file, jsonify
-from groq import Groq
 from dotenv import load_dotenv
 import json
 import os
-import google.generativeai as genai
 import time
 import uuid
 import io
-from elevenlabs import ElevenLabs
+import hashlib
+import threading
+import checkpoints
+import judges
+import prompt_deltas
+import providers
+import tracing
+import tts_formats
 
 load_dotenv()
 
 app = Flask(__name__)
-client = Groq()
 
-# Initialize Gemini client
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if gemini_api_key:
-    genai.configure(api_key=gemini_api_key)
-
-# Initialize ElevenLabs client
-elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
-elevenlabs_client = None
+# Provider clients (Groq, Gemini, ElevenLabs) are imported and built lazily on
+# first use via providers.get(), so importing this module stays fast
 TTS_ENABLED = True  # Set to True when you have ElevenLabs credits available
-if elevenlabs_api_key and TTS_ENABLED:
-    elevenlabs_client = ElevenLabs(api_key=elevenlabs_api_key)
 
 # Voice IDs for different speakers (ElevenLabs pre-made voices)
 COLLECTOR_VOICE_ID = "bIHbv24MWmeRgasZH58o"  # Roger - collector voice
 CUSTOMER_VOICE_ID = "bIHbv24MWmeRgasZH58o"   # Will - customer voice
 
-# Store generated audio files
+# Store generated audio files, keyed by a hash of text, voice and output format
 audio_storage = {}
+# ElevenLabs output format of each stored clip
+audio_formats = {}
+# Bytes and time-to-first-audio per transcript (tts_formats.py)
+audio_stats = tts_formats.AudioStats()
 # Store audio sequence for full conversation playback
 audio_sequence = []
 
+# Run records (one JSON line per training run) for /stats and analytics.py
+RUNS_LOG_PATH = os.getenv("RUNS_LOG_PATH", "runs.jsonl")
+run_log = None  # analytics.RunLog, created on the first /stats request
+job_queue = None  # jobqueue.JobQueue, opened on the first /jobs request
+
 # Model configurations
 DEBT_COLLECTOR_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
 DEFAULTER_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
 JUDGE_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
 
+# Judge ensemble: judges run in parallel and the verdict returns once JUDGE_QUORUM agree.
+# Each entry is (provider, model, temperature); repeat an entry to add more samples.
+JUDGE_ENSEMBLE_ENABLED = os.getenv("JUDGE_ENSEMBLE", "0") == "1"
+JUDGE_ENSEMBLE = [
+    ("gemini", "gemini-2.0-flash-exp", 0.2),
+    ("groq", JUDGE_MODEL, 0.2),
+    ("groq", "openai/gpt-oss-120b", 0.2),
+]
+JUDGE_QUORUM = int(os.getenv("JUDGE_QUORUM", "2"))
+
+# Ask judges for schema-constrained JSON where the provider supports it
+JUDGE_STRUCTURED_OUTPUT = os.getenv("JUDGE_STRUCTURED_OUTPUT", "1") == "1"
+
+# Start new runs from the closest previously passing prompt (prompt_library.py)
+PROMPT_LIBRARY_ENABLED = os.getenv("PROMPT_LIBRARY", "0") == "1"
+
+# "full" asks the optimizer for a rewritten prompt; "rules" asks only for new
+# rules to append, which cuts optimizer output tokens and latency
+OPTIMIZER_MODE = os.getenv("OPTIMIZER_MODE", "full")
+
+# "record" captures provider calls and finished runs to cassettes, "replay" serves them (cassette.py)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")
+
+# "inline" runs training in the request thread; "process" runs it in the
+# workers.py process pool (TRAINING_WORKERS processes, default one per core)
+TRAINING_BACKEND = os.getenv("TRAINING_BACKEND", "inline")
+
+# Pick collector/defaulter/judge/optimizer models per call from router.py pools
+# using live latency, error rates and token prices instead of the constants above
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER", "0") == "1"
+
+# Re-send collector/defaulter turns that run past their p90 latency (hedging.py)
+HEDGE_REQUESTS_ENABLED = os.getenv("HEDGE_REQUESTS", "0") == "1"
+
+# Learned per-role token budgets, stop sequences and streamed reply cleaning (governor.py)
+OUTPUT_GOVERNOR_ENABLED = os.getenv("OUTPUT_GOVERNOR", "0") == "1"
+
+# Serve the collector's first turn from background-generated openers (openers.py)
+OPENER_POOL_ENABLED = os.getenv("OPENER_POOL", "0") == "1"
+
 # Default configurations
 DEFAULT_CONFIG = {
     "collector_personality": "aggressive and firm",
@@ -100,20 +145,10 @@ You are {customer_name}, a customer with an overdue debt of ${debt_amount:,.0f}
 - Keep responses to 2-3 sentences maximum
 """
 
-# Store current state
+# Store current state (prompts are generated by /start-training and /reset)
 current_state = {
-    "debt_collector_prompt": get_debt_collector_prompt(
-        DEFAULT_CONFIG["company_name"],
-        DEFAULT_CONFIG["customer_name"],
-        DEFAULT_CONFIG["debt_amount"],
-        DEFAULT_CONFIG["collector_personality"]
-    ),
-    "defaulter_prompt": get_defaulter_prompt(
-        DEFAULT_CONFIG["customer_name"],
-        DEFAULT_CONFIG["debt_amount"],
-        DEFAULT_CONFIG["months_overdue"],
-        DEFAULT_CONFIG["available_funds"]
-    ),
+    "debt_collector_prompt": None,
+    "defaulter_prompt": None,
     "config": DEFAULT_CONFIG.copy(),
     "conversation_log": [],
     "attempt": 0,
@@ -207,44 +242,212 @@ If Judge said: "Agent was rude and used capital letters"
 Now fix this one:
 """
 
+OPTIMIZER_RULES_PROMPT = """
+You are a Senior Prompt Engineer and Debt Collection Compliance Trainer.
 
-def get_response(model: str, messages: list) -> str:
-    """Get a response from the specified model."""
-    completion = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.8,
-        max_completion_tokens=256,
-        top_p=1,
-        stream=False
-    )
-    return completion.choices[0].message.content
+A debt collector's conversation FAILED a compliance check. Do NOT rewrite its system prompt. Instead, write the smallest set of new rules that, appended to the current prompt, would have prevented this exact failure.
+
+You will receive:
+1. The current system prompt used by the collector
+2. The full conversation that failed
+3. The Judge's exact feedback (one short sentence)
+
+Rules you write must:
+- Target the specific mistake the Judge identified
+- Keep the collector firm and goal-oriented, but 100% compliant and professional
+- Not repeat rules the current prompt already contains
+- Be one short sentence each; 1-3 rules in total
+
+Output ONLY the new rules, one per line starting with "- ", inside <add_rules> tags. No explanations.
+
+Now fix this one:
+"""
+
+
+_usage_lock = threading.Lock()
+
+
+def add_usage(usage: dict, prompt_tokens: int, completion_tokens: int, model: str = None):
+    """Add one call's token counts, and their cost at `model`'s prices, to a per-run usage dict (if tracked)."""
+    if usage is not None:
+        cost = 0.0
+        if model:
+            import router  # Prices live with the model router
+            cost = router.token_cost(model, prompt_tokens, completion_tokens)
+        # Ensemble judges add to the same dict from several threads
+        with _usage_lock:
+            usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (prompt_tokens or 0)
+            usage["completion_tokens"] = usage.get("completion_tokens", 0) + (completion_tokens or 0)
+            usage["cost_usd"] = usage.get("cost_usd", 0.0) + cost
+
+
+def count_model(models: dict, role: str, model: str):
+    """Count one turn of `role` answered by `model` in a per-run {role: {model: turns}} dict (if tracked)."""
+    if models is not None:
+        role_models = models.setdefault(role, {})
+        role_models[model] = role_models.get(model, 0) + 1
 
 
-def generate_tts(text: str, voice_id: str) -> str:
-    """Generate TTS audio using ElevenLabs and return audio ID."""
+def primary_model(models: dict, role: str, default: str) -> str:
+    """The model that answered most of a role's turns in a run; `default` if the role made none."""
+    role_models = models.get(role)
+    return max(role_models, key=role_models.get) if role_models else default
+
+
+def get_response(model: str, messages: list, usage: dict = None, role: str = None, models: dict = None) -> str:
+    """Get a response from the specified model (the router's pick for `role` with MODEL_ROUTER=1).
+
+    The model that actually answered is counted in `models`.
+    """
+    with tracing.span("turn", role=role, model=model):
+        if role and MODEL_ROUTER_ENABLED:
+            import router
+            response, _ = router.get_router().call(
+                role, lambda provider, routed: _complete(routed, messages, usage, role, models)
+            )
+            return response
+        return _complete(model, messages, usage, role, models)[0]
+
+
+def get_opener(model: str, messages: list, usage: dict = None, models: dict = None) -> str:
+    """The collector's first turn: a pooled opener for its system prompt with OPENER_POOL=1, else a live one."""
+    if OPENER_POOL_ENABLED:
+        import openers
+        with tracing.span("turn", role="collector", model=model, opener="pool"):
+            pooled = openers.get_pool().take(model, messages[0]["content"], _opener_completion)
+        if pooled:
+            text, tokens = pooled
+            if tokens:
+                add_usage(usage, *tokens, model)
+            count_model(models, "collector", model)
+            return text
+    return get_response(model, messages, usage, "collector", models)
+
+
+def prefill_openers(collector_prompt: str):
+    """Start generating pooled openers for a new collector prompt (OPENER_POOL=1)."""
+    if OPENER_POOL_ENABLED:
+        import openers
+        openers.get_pool().prefill(DEBT_COLLECTOR_MODEL, collector_prompt, _opener_completion)
+
+
+def _opener_completion(model: str, messages: list) -> tuple:
+    # Generated off the critical path, so neither routed nor hedged
+    return _chat(model, messages, "collector")
+
+
+def _complete(model: str, messages: list, usage: dict = None, role: str = None, models: dict = None) -> tuple:
+    """One chat completion, hedged for `role` with HEDGE_REQUESTS=1; adds the winner's tokens to usage."""
+    if role and HEDGE_REQUESTS_ENABLED:
+        import hedging
+        (text, model), tokens = hedging.get_hedger().call(
+            role, lambda hedge_model: _chat_as(hedge_model, messages, role), model
+        )
+    else:
+        text, tokens = _chat(model, messages, role)
+    if tokens:
+        add_usage(usage, *tokens, model)
+    if role:
+        count_model(models, role, model)
+    return text, tokens
+
+
+def _chat_as(model: str, messages: list, role: str = None) -> tuple:
+    """_chat with the answering model returned beside the text: ((text, model), usage)."""
+    text, tokens = _chat(model, messages, role)
+    return (text, model), tokens
+
+
+def _chat(model: str, messages: list, role: str = None) -> tuple:
+    """One Groq chat completion; returns (text, (prompt_tokens, completion_tokens) or None).
+
+    With OUTPUT_GOVERNOR=1, `role` replies are streamed under the governor's
+    token budget and stop sequences and come back cleaned.
+    """
+    if role and OUTPUT_GOVERNOR_ENABLED:
+        import governor
+        gov = governor.get_governor()
+        options = gov.request_options(role)
+        with tracing.span("groq.chat", model=model, governed=True), providers.limit("groq"):
+            stream = providers.get("groq").chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.8,
+                top_p=1,
+                stream=True,
+                **options
+            )
+            return gov.consume(role, stream, options["max_completion_tokens"],
+                               sum(len(message["content"]) for message in messages))
+    with tracing.span("groq.chat", model=model), providers.limit("groq"):
+        completion = providers.get("groq").chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.8,
+            max_completion_tokens=256,
+            top_p=1,
+            stream=False
+        )
+    if not completion.usage:
+        return completion.choices[0].message.content, None
+    return completion.choices[0].message.content, (completion.usage.prompt_tokens, completion.usage.completion_tokens)
+
+
+def _tracked(fn, usage: dict = None) -> tuple:
+    """Call fn(call_usage), add its tokens to usage and return (result, (prompt_tokens, completion_tokens))."""
+    call_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    result = fn(call_usage)
+    if usage is not None:
+        with _usage_lock:
+            for key, value in call_usage.items():
+                usage[key] = usage.get(key, 0) + value
+    return result, (call_usage["prompt_tokens"], call_usage["completion_tokens"])
+
+
+def append_run_record(record: dict):
+    """Append one finished training run to the run log."""
+    with open(RUNS_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def generate_tts(text: str, voice_id: str, output_format: str = None, transcript_id: str = None) -> str:
+    """Generate TTS audio using ElevenLabs in output_format and return audio ID.
+
+    Clips are cached per text, voice and format, so viewing a transcript again
+    (or from another device in the same format) doesn't regenerate them.
+    """
+    elevenlabs_client = providers.get("elevenlabs") if TTS_ENABLED else None
     print(f"🔊 TTS Request - Client exists: {elevenlabs_client is not None}, TTS_ENABLED: {TTS_ENABLED}")
     
     if not elevenlabs_client:
         print("⚠️ TTS skipped - ElevenLabs client not initialized")
         return None
     
+    output_format = output_format or tts_formats.choose_format()
+    # The ID names the exact bytes, so the browser may cache /audio/<id> freely
+    audio_id = hashlib.sha1(f"{voice_id}\0{output_format}\0{text}".encode("utf-8")).hexdigest()[:24]
+    if audio_id in audio_storage:
+        audio_stats.clip(transcript_id, audio_id, len(audio_storage[audio_id]), 0.0, cached=True)
+        return audio_id
+    
     try:
-        print(f"🎤 Generating TTS for text: {text[:50]}...")
+        print(f"🎤 Generating TTS ({output_format}) for text: {text[:50]}...")
+        start = time.perf_counter()
         # Generate audio using ElevenLabs
-        audio_generator = elevenlabs_client.text_to_speech.convert(
-            voice_id=voice_id,
-            text=text,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128"
-        )
-        
-        # Collect audio bytes from generator
-        audio_bytes = b"".join(audio_generator)
+        with tracing.span("elevenlabs.tts", voice_id=voice_id, chars=len(text), output_format=output_format):
+            audio_generator = elevenlabs_client.text_to_speech.convert(
+                voice_id=voice_id,
+                text=text,
+                model_id="eleven_multilingual_v2",
+                output_format=output_format
+            )
+            
+            # Collect audio bytes from generator
+            audio_bytes = b"".join(audio_generator)
         
-        # Store audio with unique ID
-        audio_id = str(uuid.uuid4())
         audio_storage[audio_id] = audio_bytes
+        audio_formats[audio_id] = output_format
+        audio_stats.clip(transcript_id, audio_id, len(audio_bytes), time.perf_counter() - start, cached=False)
         
         print(f"✅ TTS generated successfully - ID: {audio_id}, Size: {len(audio_bytes)} bytes")
         return audio_id
@@ -253,58 +456,145 @@ def generate_tts(text: str, voice_id: str) -> str:
         return None
 
 
-def judge_conversation(conversation_log: list) -> dict:
-    """Judge the conversation for compliance using Gemini API."""
-    conversation_json = json.dumps(conversation_log, indent=2)
-    full_prompt = f"{JUDGE_SYSTEM_PROMPT}\n\n{conversation_json}"
-    
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response_obj = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=256,
+def call_judge(provider: str, model: str, conversation_json: str, temperature: float = 0.2, usage: dict = None):
+    """Stream one judge model's raw output as text chunks.
+
+    With JUDGE_STRUCTURED_OUTPUT the provider is asked for schema-constrained
+    JSON (Gemini response schema, streamed; Groq JSON response format, which
+    Groq only supports on non-streamed calls).
+    """
+    with tracing.span(f"{provider}.judge", model=model), providers.limit(provider):
+        if provider == "gemini":
+            genai = providers.get("gemini")
+            config = {"temperature": temperature, "max_output_tokens": 256}
+            if JUDGE_STRUCTURED_OUTPUT:
+                config.update(response_mime_type="application/json", response_schema=judges.VERDICT_SCHEMA)
+            response_obj = genai.GenerativeModel(model).generate_content(
+                f"{JUDGE_SYSTEM_PROMPT}\n\n{conversation_json}",
+                generation_config=genai.types.GenerationConfig(**config),
+                stream=True
             )
-        )
-        response = response_obj.text
-    except Exception as e:
+            usage_metadata = None
+            try:
+                for chunk in response_obj:
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.parts:
+                        yield chunk.text
+            finally:
+                if usage_metadata:
+                    add_usage(usage, usage_metadata.prompt_token_count, usage_metadata.candidates_token_count, model)
+            return
+
         judge_messages = [
             {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
             {"role": "user", "content": conversation_json}
         ]
-        completion = client.chat.completions.create(
-            model=JUDGE_MODEL,
+        if JUDGE_STRUCTURED_OUTPUT:
+            # Groq's JSON mode does not stream: one blocking call, handed to the parser as a single chunk
+            completion = providers.get("groq").chat.completions.create(
+                model=model,
+                messages=judge_messages,
+                temperature=temperature,
+                max_completion_tokens=256,
+                top_p=1,
+                stream=False,
+                response_format={"type": "json_object"}
+            )
+            if completion.usage:
+                add_usage(usage, completion.usage.prompt_tokens, completion.usage.completion_tokens, model)
+            yield completion.choices[0].message.content or ""
+            return
+    
+        stream = providers.get("groq").chat.completions.create(
+            model=model,
             messages=judge_messages,
-            temperature=0.2,
+            temperature=temperature,
             max_completion_tokens=256,
             top_p=1,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.x_groq and chunk.x_groq.usage:
+                    add_usage(usage, chunk.x_groq.usage.prompt_tokens, chunk.x_groq.usage.completion_tokens, model)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Stop the HTTP stream if the parser already has every field
+            stream.close()
+
+
+def judge_conversation(conversation_log: list, usage: dict = None) -> dict:
+    """Judge the conversation for compliance using Gemini API (or the judge ensemble)."""
+    with tracing.span("judge"):
+        conversation_json = json.dumps(conversation_log, indent=2)
+
+        if JUDGE_ENSEMBLE_ENABLED:
+            judge_fns = [
+                tracing.wrap(lambda log, provider=provider, model=model, temperature=temperature:
+                             judges.parse_verdict_stream(
+                                 call_judge(provider, model, conversation_json, temperature, usage=usage)
+                             ))
+                for provider, model, temperature in JUDGE_ENSEMBLE
+            ]
+            return judges.judge_ensemble(judge_fns, conversation_log, JUDGE_QUORUM)
+
+        if MODEL_ROUTER_ENABLED:
+            # An unreadable verdict counts as a failed call and moves on to the next judge model
+            import router
+            verdict, _ = router.get_router().call(
+                "judge",
+                lambda provider, model: _tracked(
+                    lambda call_usage: judges.parse_verdict_stream(
+                        call_judge(provider, model, conversation_json, usage=call_usage)
+                    ),
+                    usage,
+                ),
+                ok=lambda verdict: not verdict.get("parse_error"),
+            )
+            return verdict
+
+        try:
+            return judges.parse_verdict_stream(call_judge("gemini", "gemini-2.0-flash-exp", conversation_json, usage=usage))
+        except Exception as e:
+            tracing.annotate(fallback=f"{type(e).__name__}: {e}")
+            return judges.parse_verdict_stream(call_judge("groq", JUDGE_MODEL, conversation_json, usage=usage))
+
+
+def _optimizer_completion(provider: str, model: str, full_prompt: str, max_tokens: int) -> tuple:
+    """One optimizer call on Gemini or Groq; returns ((text, model), (prompt_tokens, completion_tokens) or None)."""
+    if provider == "gemini":
+        genai = providers.get("gemini")
+        with tracing.span("gemini.optimize", model=model), providers.limit("gemini"):
+            response_obj = genai.GenerativeModel(model).generate_content(
+                full_prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.3,
+                    max_output_tokens=max_tokens,
+                )
+            )
+        usage_metadata = response_obj.usage_metadata
+        usage = (usage_metadata.prompt_token_count, usage_metadata.candidates_token_count) if usage_metadata else None
+        return (response_obj.text, model), usage
+    with tracing.span("groq.optimize", model=model), providers.limit("groq"):
+        completion = providers.get("groq").chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": full_prompt}],
+            temperature=0.3,
+            max_completion_tokens=max_tokens,
+            top_p=1,
             stream=False
         )
-        response = completion.choices[0].message.content
-    
-    try:
-        start = response.find('{')
-        end = response.rfind('}') + 1
-        if start != -1 and end > start:
-            verdict = json.loads(response[start:end])
-        else:
-            verdict = json.loads(response)
-    except json.JSONDecodeError:
-        verdict = {
-            "pass": False,
-            "feedback": f"Judge response parsing error: {response[:100]}",
-            "hang_up_detected": False
-        }
-    
-    return verdict
+    usage = (completion.usage.prompt_tokens, completion.usage.completion_tokens) if completion.usage else None
+    return (completion.choices[0].message.content, model), usage
 
 
-def optimize_prompt(current_prompt: str, conversation_log: list, judge_feedback: str) -> str:
+def optimize_prompt(current_prompt: str, conversation_log: list, judge_feedback: str, usage: dict = None) -> str:
     """Optimize the debt collector's prompt based on Judge feedback using Gemini."""
-    conversation_json = json.dumps(conversation_log, indent=2)
-    
-    optimizer_input = f"""
+    with tracing.span("optimize", mode=OPTIMIZER_MODE):
+        conversation_json = json.dumps(conversation_log, indent=2)
+
+        optimizer_input = f"""
 Current System Prompt:
 {current_prompt}
 
@@ -315,32 +605,42 @@ Judge's Feedback:
 {judge_feedback}
 """
     
-    full_prompt = f"{OPTIMIZER_SYSTEM_PROMPT}\n{optimizer_input}"
+        rules_mode = OPTIMIZER_MODE == "rules"
+        system_prompt = OPTIMIZER_RULES_PROMPT if rules_mode else OPTIMIZER_SYSTEM_PROMPT
+        full_prompt = f"{system_prompt}\n{optimizer_input}"
     
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response_obj = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=1024,
-            )
-        )
-        response = response_obj.text
+        max_tokens = 256 if rules_mode else 1024
+    
+        try:
+            if MODEL_ROUTER_ENABLED:
+                import router
+                (response, model), call_usage = router.get_router().call(
+                    "optimizer", lambda provider, model: _optimizer_completion(provider, model, full_prompt, max_tokens)
+                )
+            else:
+                (response, model), call_usage = _optimizer_completion(
+                    "gemini", "gemini-2.0-flash-exp", full_prompt, max_tokens
+                )
+            if call_usage:
+                add_usage(usage, *call_usage, model)
+                prompt_deltas.record_optimizer_output("rules" if rules_mode else "full", call_usage[1])
         
-        start_tag = "<new_prompt>"
-        end_tag = "</new_prompt>"
-        start_idx = response.find(start_tag)
-        end_idx = response.find(end_tag)
+            if rules_mode:
+                return prompt_deltas.add_rules(current_prompt, prompt_deltas.extract_rules(response))
         
-        if start_idx != -1 and end_idx != -1:
-            new_prompt = response[start_idx + len(start_tag):end_idx].strip()
-            return new_prompt
-        else:
-            return response.strip()
+            start_tag = "<new_prompt>"
+            end_tag = "</new_prompt>"
+            start_idx = response.find(start_tag)
+            end_idx = response.find(end_tag)
+        
+            if start_idx != -1 and end_idx != -1:
+                new_prompt = response[start_idx + len(start_tag):end_idx].strip()
+                return new_prompt
+            else:
+                return response.strip()
             
-    except Exception as e:
-        return current_prompt
+        except Exception as e:
+            return current_prompt
 
 
 @app.route('/')
@@ -353,18 +653,165 @@ def serve_audio(audio_id):
     """Serve generated audio file."""
     if audio_id in audio_storage:
         audio_bytes = audio_storage[audio_id]
+        audio_stats.served(audio_id, len(audio_bytes))
+        # IDs are never reused, so the browser can keep clips it has prefetched
         return send_file(
             io.BytesIO(audio_bytes),
-            mimetype='audio/mpeg',
-            as_attachment=False
+            mimetype=tts_formats.mimetype(audio_formats.get(audio_id, "")),
+            as_attachment=False,
+            max_age=3600
         )
     return "Audio not found", 404
 
 
+@app.route('/audio-stats', methods=['POST'])
+def report_audio_stats():
+    """Record the client's time to first audio for a transcript (sent by the page via sendBeacon)."""
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        audio_stats.client_first_audio(str(data["transcript_id"]), float(data["first_audio_s"]))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Expected transcript_id and first_audio_s"}), 400
+    return "", 204
+
+
 @app.route('/audio-sequence')
 def get_audio_sequence():
-    """Return the list of audio IDs for the full conversation."""
-    return jsonify({"audio_ids": audio_sequence})
+    """Return the audio IDs for the full conversation, with each clip's size for prefetch planning."""
+    return jsonify({
+        "audio_ids": audio_sequence,
+        "clips": [{"id": audio_id, "bytes": len(audio_storage.get(audio_id, b""))} for audio_id in audio_sequence]
+    })
+
+
+def worker_pool_report() -> dict:
+    """Process pool counters, or None when training runs inline."""
+    if TRAINING_BACKEND != "process":
+        return None
+    import workers
+    return workers.get_pool().report()
+
+
+def model_router_report() -> dict:
+    """Router statistics per role and model, or None when the router is off."""
+    if not MODEL_ROUTER_ENABLED:
+        return None
+    import router
+    return router.get_router().report()
+
+
+def hedging_report() -> dict:
+    """Hedged request statistics per role, or None when hedging is off."""
+    if not HEDGE_REQUESTS_ENABLED:
+        return None
+    import hedging
+    return hedging.get_hedger().report()
+
+
+def opener_pool_report() -> dict:
+    """Opener pool hit rate and first-turn latency saved, or None with OPENER_POOL off."""
+    if not OPENER_POOL_ENABLED:
+        return None
+    import openers
+    return openers.get_pool().report()
+
+
+def output_governor_report() -> dict:
+    """Per-role token budgets and cleaning counts, or None with OUTPUT_GOVERNOR off."""
+    if not OUTPUT_GOVERNOR_ENABLED:
+        return None
+    import governor
+    return governor.get_governor().report()
+
+
+@app.route('/stats')
+def stats():
+    """Pass rate, attempts, cost and latency aggregates over recorded runs."""
+    global run_log
+    import analytics  # NumPy is only needed once stats are requested
+    import prompt_library
+    
+    by = [key for key in request.args.get('by', 'collector_personality').split(',') if key]
+    unknown = [key for key in by if key not in analytics.KEY_COLUMNS]
+    if unknown:
+        return jsonify({"error": f"Unknown group column(s): {', '.join(unknown)}"}), 400
+    
+    if run_log is None:
+        run_log = analytics.RunLog([RUNS_LOG_PATH])
+    run_log.refresh()
+    table = run_log.table()
+    return jsonify({
+        "runs": len(table),
+        "turns": table.num_turns,
+        "by": by,
+        "groups": analytics.compute_stats(table, by),
+        "judge_ensemble": judges.ensemble_report(),
+        "judge_parsing": judges.parse_report(),
+        "prompt_library": prompt_library.get_library().report() if PROMPT_LIBRARY_ENABLED else None,
+        "prompt_deltas": prompt_deltas.report(),
+        "worker_pool": worker_pool_report(),
+        "model_router": model_router_report(),
+        "hedging": hedging_report(),
+        "output_governor": output_governor_report(),
+        "opener_pool": opener_pool_report(),
+        "audio": audio_stats.report(),
+        "audio_storage": {"clips": len(audio_storage), "bytes": sum(len(clip) for clip in audio_storage.values())}
+    })
+
+
+def get_job_queue():
+    global job_queue
+    if job_queue is None:
+        import jobqueue
+        job_queue = jobqueue.JobQueue()
+    return job_queue
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a durable training run for the jobqueue.py worker daemon.
+
+    The job runs through training_events with this app's prompts and models,
+    as a run from /start-training would.
+    """
+    import jobqueue
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        scenario = {
+            "collector_personality": data.get('collector_personality', DEFAULT_CONFIG["collector_personality"]),
+            "company_name": data.get('company_name', DEFAULT_CONFIG["company_name"]),
+            "customer_name": data.get('customer_name', DEFAULT_CONFIG["customer_name"]),
+            "debt_amount": float(data.get('debt_amount', DEFAULT_CONFIG["debt_amount"])),
+            "months_overdue": int(data.get('months_overdue', DEFAULT_CONFIG["months_overdue"])),
+            "available_funds": float(data.get('available_funds', DEFAULT_CONFIG["available_funds"]))
+        }
+        priority = int(data.get('priority', jobqueue.PRIORITY_INTERACTIVE))
+        max_attempts = int(data.get('max_attempts', 5))
+        num_turns = int(data.get('num_turns', 5))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid job parameters: {e}"}), 400
+    
+    job_id = get_job_queue().enqueue(scenario, priority, max_attempts, num_turns, source="web")
+    return jsonify({"id": job_id, "status": "queued"}), 202
+
+
+@app.route('/jobs')
+def list_jobs():
+    """Job counts by status and the most recent jobs (?status=queued&limit=50)."""
+    status = request.args.get('status')
+    limit = request.args.get('limit', 50, type=int)
+    queue = get_job_queue()
+    return jsonify({"counts": queue.counts(), "jobs": queue.list(status, limit)})
+
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """One job with its latest checkpoint and, once finished, its result."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 @app.route('/reset', methods=['POST'])
@@ -386,9 +833,12 @@ def reset():
     current_state["conversation_log"] = []
     current_state["attempt"] = 0
     current_state["is_running"] = False
+    # The next run most likely starts from the default prompt
+    prefill_openers(current_state["debt_collector_prompt"])
     
     # Clear audio storage
     audio_storage.clear()
+    audio_formats.clear()
     audio_sequence.clear()
     
     return '''
@@ -401,30 +851,51 @@ def reset():
     '''
 
 
+def trace_options() -> dict:
+    """{"profile": [...]} when the request asks for ?trace=1 or ?profile=cpu,memory, else None."""
+    if request.values.get('trace') != '1' and not request.values.get('profile'):
+        return None
+    return {"profile": [name for name in request.values.get('profile', '').split(',') if name]}
+
+
 @app.route('/view-transcript', methods=['POST'])
 def view_transcript():
-    """Show transcript with TTS and auto-play conversation."""
+    """Show transcript with TTS and auto-play conversation (traced with ?trace=1 or ?profile=...)."""
+    trace = trace_options()
+    if trace is None:
+        return render_transcript()
+    with tracing.trace("transcript", profile=trace["profile"], source="web"):
+        return render_transcript()
+
+
+def render_transcript() -> str:
+    """Generate TTS for the successful conversation and build the transcript HTML."""
     conversation_log = current_state.get("successful_conversation", [])
     
     if not conversation_log:
         return '<div class="error">No successful conversation found.</div>'
     
-    # Clear previous audio
-    audio_storage.clear()
+    # Clear the previous sequence; clips stay cached per format
     audio_sequence.clear()
     
+    # Pick the most compact format this client can decode
+    output_format = tts_formats.negotiate(request.headers)
+    transcript_id = uuid.uuid4().hex[:12]
+    audio_stats.start(transcript_id, output_format)
+    tracing.annotate(output_format=output_format)
+    
     # Build transcript HTML and generate TTS
     transcript_html = []
     audio_ids = []
     
     for idx, msg in enumerate(conversation_log):
         if msg["role"] == "Debt Collector Agent":
-            audio_id = generate_tts(msg["content"], COLLECTOR_VOICE_ID)
+            audio_id = generate_tts(msg["content"], COLLECTOR_VOICE_ID, output_format, transcript_id)
             icon = "🏦"
             role_class = "collector"
             role_name = "Debt Collector Agent"
         else:  # customer
-            audio_id = generate_tts(msg["content"], CUSTOMER_VOICE_ID)
+            audio_id = generate_tts(msg["content"], CUSTOMER_VOICE_ID, output_format, transcript_id)
             icon = "👤"
             role_class = "defaulter"
             role_name = f"Defaulter ({current_state['config']['customer_name']})"
@@ -445,13 +916,16 @@ def view_transcript():
         ''')
     
     messages_html = ''.join(transcript_html)
-    audio_ids_str = ','.join(f'"{aid}"' for aid in audio_ids)
+    audio_ids_str = ','.join(audio_ids)
+    # A training attempt started by another request may have cleared the clips already
+    audio_sizes_str = ','.join(str(len(audio_storage.get(aid, b""))) for aid in audio_ids)
     
     print(f"📊 Transcript generation:")
     print(f"   - Total messages: {len(conversation_log)}")
     print(f"   - Audio IDs generated: {len(audio_ids)}")
     print(f"   - Audio IDs: {audio_ids}")
     print(f"   - Audio IDs string: {audio_ids_str}")
+    print(f"   - Audio format: {output_format} ({sum(len(audio_storage.get(aid, b'')) for aid in audio_ids)} bytes)")
     
     return f'''
     <div class="transcript-status">
@@ -464,152 +938,292 @@ def view_transcript():
     <div class="tts-complete">
         {"✅ Audio ready! Playing conversation..." if audio_ids else "ℹ️ TTS not available."}
     </div>
-    <div id="audio-trigger" data-audio-ids="{audio_ids_str}" style="display:none;"></div>
+    <div id="audio-trigger" data-audio-ids="{audio_ids_str}" data-audio-sizes="{audio_sizes_str}" data-transcript-id="{transcript_id}" style="display:none;"></div>
     '''
 
 
-@app.route('/start-training', methods=['POST'])
-def start_training():
-    """Start the training loop with streaming updates."""
+def training_events(config: dict, collector_prompt: str, defaulter_prompt: str, warm_similarity: float = None,
+                    max_attempts: int = 5, num_turns: int = 5, trace: dict = None, run_id: str = None,
+                    resume: dict = None):
+    """Run one training loop, yielding its progress as plain event dicts.
+
+    Touches no web front-end state, so it runs the same inline or in a worker
+    process (workers.py); render_event() turns the events into HTML. With
+    `trace` ({"profile": [...]}) the run is traced (tracing.py) and a final
+    "trace" event names the files written. Each step is checkpointed under
+    `run_id` (checkpoints.py); `resume` is a loaded checkpoint to continue.
+    """
+    run_args = (config, collector_prompt, defaulter_prompt, warm_similarity, max_attempts, num_turns, run_id, resume)
+    if trace is None:
+        yield from _training_events(*run_args)
+        return
+    with tracing.trace("run", profile=trace.get("profile", ()), source="web", backend=TRAINING_BACKEND,
+                       **config) as run_trace:
+        yield from _training_events(*run_args)
+    yield {"type": "trace", "trace_id": run_trace.trace_id, "files": run_trace.files}
+
+
+def _training_events(config: dict, collector_prompt: str, defaulter_prompt: str, warm_similarity: float,
+                     max_attempts: int, num_turns: int, run_id: str, resume: dict):
+    # Per-run metrics for the run log
+    run_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    run_models = {}
+    turn_latencies = []
+    parse_retries = 0
+    run_start = time.perf_counter()
     
-    # Get form data
-    config = current_state["config"]
-    collector_personality = request.form.get('collector_personality', config["collector_personality"])
-    company_name = request.form.get('company_name', config["company_name"])
-    customer_name = request.form.get('customer_name', config["customer_name"])
-    debt_amount = float(request.form.get('debt_amount', config["debt_amount"]))
-    months_overdue = int(request.form.get('months_overdue', config["months_overdue"]))
-    available_funds = float(request.form.get('available_funds', config["available_funds"]))
+    if resume:
+        checkpoint = checkpoints.RunCheckpoint(resume["run_id"])
+        first_attempt, attempt_prompt, turns, verdict = checkpoints.resume_point(resume)
+        # The attempt record is already written unless the run stopped between attempts
+        started_attempt = resume["attempt"]
+    else:
+        checkpoint = checkpoints.RunCheckpoint(run_id)
+        checkpoint.start(config, collector_prompt, defaulter_prompt, max_attempts, num_turns, "web")
+        first_attempt, attempt_prompt, turns, verdict, started_attempt = 1, collector_prompt, [], None, 0
+    # Prompt versions are kept as a delta chain; only diffs go to the browser
+    prompt_history = prompt_deltas.PromptHistory(attempt_prompt)
     
-    # Update config
-    current_state["config"] = {
-        "collector_personality": collector_personality,
-        "company_name": company_name,
-        "customer_name": customer_name,
-        "debt_amount": debt_amount,
-        "months_overdue": months_overdue,
-        "available_funds": available_funds
-    }
+    def timed_response(model, messages, role):
+        start = time.perf_counter()
+        response = get_response(model, messages, run_usage, role, run_models)
+        turn_latencies.append(round(time.perf_counter() - start, 3))
+        return response
     
-    # Generate prompts
-    initial_collector_prompt = get_debt_collector_prompt(company_name, customer_name, debt_amount, collector_personality)
-    defaulter_prompt = get_defaulter_prompt(customer_name, debt_amount, months_overdue, available_funds)
+    def timed_opener(messages):
+        start = time.perf_counter()
+        response = get_opener(DEBT_COLLECTOR_MODEL, messages, run_usage, run_models)
+        turn_latencies.append(round(time.perf_counter() - start, 3))
+        return response
     
-    current_state["debt_collector_prompt"] = initial_collector_prompt
-    current_state["defaulter_prompt"] = defaulter_prompt
+    def record_run(passed, attempts):
+        append_run_record({
+            "run_id": checkpoint.run_id,
+            "source": "web",
+            **config,
+            "collector_model": primary_model(run_models, "collector", DEBT_COLLECTOR_MODEL),
+            "defaulter_model": primary_model(run_models, "defaulter", DEFAULTER_MODEL),
+            "models": run_models,
+            "output_governor": "on" if OUTPUT_GOVERNOR_ENABLED else "off",
+            "prompt_version": hashlib.sha1(collector_prompt.encode("utf-8")).hexdigest()[:12],
+            "passed": passed,
+            "attempts": attempts,
+            "prompt_tokens": run_usage["prompt_tokens"],
+            "completion_tokens": run_usage["completion_tokens"],
+            "cost_usd": round(run_usage["cost_usd"], 6),
+            "parse_retry_attempts": parse_retries,
+            "latency_s": round(time.perf_counter() - run_start, 3),
+            "turn_latencies_s": turn_latencies,
+            "warm_start": warm_similarity is not None,
+        })
+        if CASSETTE_MODE == "record" and not resume:
+            import cassette
+            cassette.record_run({
+                "source": "web",
+                "scenario": config,
+                "defaulter_prompt": defaulter_prompt,
+                "max_attempts": max_attempts,
+                "num_turns": num_turns,
+                "initial_prompt": collector_prompt,
+                "prompt_version": hashlib.sha1(collector_prompt.encode("utf-8")).hexdigest()[:12],
+                "warm_start": warm_similarity is not None,
+                "passed": passed,
+                "attempts": attempts,
+            })
+        if PROMPT_LIBRARY_ENABLED:
+            import prompt_library
+            prompt_library.get_library().record(
+                "web", config["collector_personality"], config["company_name"], config["customer_name"],
+                config["debt_amount"], config["months_overdue"], config["available_funds"], passed, attempts, prompt_history.latest, warm_similarity is not None
+            )
     
-    def generate():
-        max_attempts = 5
-        num_turns = 5
-        
-        current_state["attempt"] = 0
-        current_state["is_running"] = True
-        
-        yield f'''
+    yield {"type": "start", "warm_similarity": warm_similarity, "run_id": checkpoint.run_id,
+           "resumed": {"attempt": first_attempt, "messages": len(turns)} if resume else None}
+    
+    try:
+        for attempt in range(first_attempt, max_attempts + 1):
+            with tracing.span("attempt", attempt=attempt):
+                yield {"type": "attempt", "attempt": attempt}
+                if attempt != started_attempt:
+                    checkpoint.attempt(attempt, prompt_history.latest)
+
+                # Initialize conversation, replaying any checkpointed messages of this attempt
+                collector_messages, defaulter_messages = checkpoints.histories(
+                    prompt_history.latest, defaulter_prompt, turns
+                )
+                conversation_log = checkpoints.conversation_log(turns, "Debt Collector Agent")
+                for message in conversation_log:
+                    yield {"type": "message", **message}
+
+                # Collector opens, then each turn is a defaulter reply and a collector reply
+                for index in range(len(turns) if verdict is None else 1 + 2 * num_turns, 1 + 2 * num_turns):
+                    if index % 2 == 0:
+                        role = "collector"
+                        response = (timed_opener(collector_messages) if index == 0
+                                    else timed_response(DEBT_COLLECTOR_MODEL, collector_messages, "collector"))
+                        conversation_log.append({"role": "Debt Collector Agent", "content": response})
+                        collector_messages.append({"role": "assistant", "content": response})
+                        defaulter_messages.append({"role": "user", "content": response})
+                    else:
+                        role = "defaulter"
+                        response = timed_response(DEFAULTER_MODEL, defaulter_messages, "defaulter")
+                        conversation_log.append({"role": "customer", "content": response})
+                        defaulter_messages.append({"role": "assistant", "content": response})
+                        collector_messages.append({"role": "user", "content": response})
+                    checkpoint.turn(attempt, role, response)
+                    yield {"type": "message", **conversation_log[-1]}
+
+                # Judge evaluation (a resumed attempt may already be judged)
+                if verdict is None:
+                    yield {"type": "judging", "conversation_log": conversation_log}
+                    verdict = judge_conversation(conversation_log, run_usage)
+                    checkpoint.verdict(attempt, verdict)
+                yield {"type": "verdict", "verdict": verdict}
+                turns, attempt_verdict, verdict = [], verdict, None
+
+                if attempt_verdict.get("pass", False):
+                    checkpoint.finish(True, attempt)
+                    record_run(True, attempt)
+                    yield {"type": "success", "attempt": attempt, "conversation_log": conversation_log,
+                           "final_prompt": prompt_history.latest}
+                    return
+
+                # Optimize if not last attempt
+                if attempt < max_attempts:
+                    if attempt_verdict.get("parse_error"):
+                        # The next attempt is spent only because the verdict was unreadable
+                        judges.record_parse_retry()
+                        parse_retries += 1
+                
+                    yield {"type": "optimizing"}
+                    new_prompt = optimize_prompt(
+                        prompt_history.latest,
+                        conversation_log,
+                        attempt_verdict.get("feedback", "No feedback"),
+                        run_usage
+                    )
+                    checkpoint.prompt(attempt, new_prompt)
+                    prefill_openers(new_prompt)
+                    diff_html = prompt_deltas.render_diff_html(prompt_history.latest, new_prompt)
+                    prompt_history.add(new_prompt)
+                    yield {"type": "prompt", "version": len(prompt_history) - 1, "prompt": new_prompt, "diff_html": diff_html}
+    finally:
+        # Also reached when the client disconnects mid-run; the checkpoint stays resumable
+        checkpoint.close()
+    
+    # Failed after all attempts
+    checkpoint.finish(False, max_attempts)
+    record_run(False, max_attempts)
+    yield {"type": "failure", "max_attempts": max_attempts}
+
+
+def render_event(event: dict) -> str:
+    """Render one training event as an htmx out-of-band fragment, updating current_state."""
+    kind = event["type"]
+    
+    if kind == "queued":
+        return f'''
+        <div id="conversation-area" class="conversation-area" hx-swap-oob="true">
+            <div class="status-banner starting">
+                <span>⏳</span> Waiting for a free worker ({event["ahead"]} queued ahead)...
+            </div>
+        </div>
+        '''
+    
+    if kind == "start":
+        html = f'''
         <div id="conversation-area" class="conversation-area" hx-swap-oob="true">
             <div class="status-banner starting">
                 <span>🚀</span> Starting Training Loop...
             </div>
         </div>
         '''
-        
-        for attempt in range(1, max_attempts + 1):
-            current_state["attempt"] = attempt
-            current_state["conversation_log"] = []
-            
-            # Attempt header
-            yield f'''
+        if event["warm_similarity"] is not None:
+            html += f'''
+            <div class="status-banner starting" hx-swap-oob="beforeend:#conversation-area">
+                <span>📚</span> Warm start from prompt library (similarity {event["warm_similarity"]:.2f})
+            </div>
+            '''
+        if event.get("resumed"):
+            html += f'''
+            <div class="status-banner starting" hx-swap-oob="beforeend:#conversation-area">
+                <span>↩️</span> Resuming run {event["run_id"]} at attempt {event["resumed"]["attempt"]}
+                after {event["resumed"]["messages"]} checkpointed message(s)
+            </div>
+            '''
+        return html
+    
+    if kind == "attempt":
+        current_state["attempt"] = event["attempt"]
+        current_state["conversation_log"] = []
+        # Clear audio sequence for this attempt
+        audio_sequence.clear()
+        audio_storage.clear()
+        audio_formats.clear()
+        return f'''
             <div class="attempt-header" hx-swap-oob="beforeend:#conversation-area">
-                <h3>📍 Attempt {attempt}</h3>
+                <h3>📍 Attempt {event["attempt"]}</h3>
             </div>
             '''
-            
-            # Initialize conversation
-            collector_messages = [{"role": "system", "content": current_state["debt_collector_prompt"]}]
-            defaulter_messages = [{"role": "system", "content": current_state["defaulter_prompt"]}]
-            conversation_log = []
-            
-            # Clear audio sequence for this attempt
-            audio_sequence.clear()
-            audio_storage.clear()
-            
-            # Collector starts
-            collector_response = get_response(DEBT_COLLECTOR_MODEL, collector_messages)
-            conversation_log.append({"role": "Debt Collector Agent", "content": collector_response})
-            
-            yield f'''
+    
+    if kind == "message":
+        if event["role"] == "Debt Collector Agent":
+            return f'''
             <div class="message collector" hx-swap-oob="beforeend:#conversation-area">
                 <div class="message-header"><span class="icon">🏦</span> Debt Collector Agent</div>
-                <div class="message-content">{collector_response}</div>
+                <div class="message-content">{event["content"]}</div>
             </div>
             '''
-            
-            collector_messages.append({"role": "assistant", "content": collector_response})
-            defaulter_messages.append({"role": "user", "content": collector_response})
-            
-            # Conversation turns
-            for turn in range(num_turns):
-                # Defaulter responds
-                defaulter_response = get_response(DEFAULTER_MODEL, defaulter_messages)
-                conversation_log.append({"role": "customer", "content": defaulter_response})
-                
-                yield f'''
+        return f'''
                 <div class="message defaulter" hx-swap-oob="beforeend:#conversation-area">
                     <div class="message-header"><span class="icon">👤</span> Defaulter ({current_state["config"]["customer_name"]})</div>
-                    <div class="message-content">{defaulter_response}</div>
+                    <div class="message-content">{event["content"]}</div>
                 </div>
                 '''
-                
-                defaulter_messages.append({"role": "assistant", "content": defaulter_response})
-                collector_messages.append({"role": "user", "content": defaulter_response})
-                
-                # Collector responds
-                collector_response = get_response(DEBT_COLLECTOR_MODEL, collector_messages)
-                conversation_log.append({"role": "Debt Collector Agent", "content": collector_response})
-                
-                yield f'''
-                <div class="message collector" hx-swap-oob="beforeend:#conversation-area">
-                    <div class="message-header"><span class="icon">🏦</span> Debt Collector Agent</div>
-                    <div class="message-content">{collector_response}</div>
-                </div>
-                '''
-                
-                collector_messages.append({"role": "assistant", "content": collector_response})
-                defaulter_messages.append({"role": "user", "content": collector_response})
-            
-            current_state["conversation_log"] = conversation_log
-            
-            # Judge evaluation
-            yield f'''
+    
+    if kind == "judging":
+        current_state["conversation_log"] = event["conversation_log"]
+        return f'''
             <div class="judge-section" hx-swap-oob="beforeend:#conversation-area">
                 <div class="judge-header">⚖️ Judge Evaluating...</div>
             </div>
             '''
-            
-            verdict = judge_conversation(conversation_log)
-            passed = verdict.get("pass", False)
-            feedback = verdict.get("feedback", "No feedback")
-            hang_up = verdict.get("hang_up_detected", False)
-            
-            status_class = "pass" if passed else "fail"
-            status_icon = "✅" if passed else "❌"
-            
-            yield f'''
+    
+    if kind == "verdict":
+        verdict = event["verdict"]
+        passed = verdict.get("pass", False)
+        feedback = verdict.get("feedback", "No feedback")
+        hang_up = verdict.get("hang_up_detected", False)
+        
+        status_class = "pass" if passed else "fail"
+        status_icon = "✅" if passed else "❌"
+        
+        confidence_html = ""
+        if "confidence" in verdict:
+            votes = verdict["votes"]
+            confidence_html = (
+                f'<div class="verdict-hangup">Judge confidence: {verdict["confidence"]:.0%} '
+                f'({votes["pass"]} pass / {votes["fail"]} fail of {verdict["judges"]} judges'
+                f'{", early consensus" if verdict["early"] else ""})</div>'
+            )
+        
+        return f'''
             <div class="verdict-card {status_class}" hx-swap-oob="beforeend:#conversation-area">
                 <div class="verdict-header">{status_icon} {"PASS" if passed else "FAIL"}</div>
                 <div class="verdict-feedback">{feedback}</div>
                 <div class="verdict-hangup">Hang-up Detected: {"Yes" if hang_up else "No"}</div>
+                {confidence_html}
             </div>
             '''
-            
-            if passed:
-                # Store the successful conversation for transcript
-                current_state["successful_conversation"] = conversation_log.copy()
-                
-                yield f'''
+    
+    if kind == "success":
+        # Store the successful conversation for transcript
+        current_state["successful_conversation"] = list(event["conversation_log"])
+        current_state["debt_collector_prompt"] = event["final_prompt"]
+        return f'''
                 <div class="success-banner" hx-swap-oob="beforeend:#conversation-area">
                     <h2>🎉 SUCCESS!</h2>
-                    <p>Agent passed compliance check in {attempt} attempt(s)!</p>
+                    <p>Agent passed compliance check in {event["attempt"]} attempt(s)!</p>
                 </div>
                 <div class="transcript-section" hx-swap-oob="beforeend:#conversation-area">
                     <button class="btn btn-transcript" hx-post="/view-transcript" hx-target="#transcript-container" hx-swap="innerHTML">
@@ -619,46 +1233,185 @@ def start_training():
                 </div>
                 <div class="final-prompt" hx-swap-oob="beforeend:#conversation-area">
                     <h4>📋 Final Optimized Prompt:</h4>
-                    <pre>{current_state["debt_collector_prompt"]}</pre>
+                    <pre>{event["final_prompt"]}</pre>
                 </div>
                 '''
-                current_state["is_running"] = False
-                return
-            
-            # Optimize if not last attempt
-            if attempt < max_attempts:
-                yield f'''
+    
+    if kind == "optimizing":
+        return f'''
                 <div class="optimizer-section" hx-swap-oob="beforeend:#conversation-area">
                     <div class="optimizer-header">🔧 Optimizer: Improving prompt...</div>
                 </div>
                 '''
-                
-                new_prompt = optimize_prompt(
-                    current_state["debt_collector_prompt"],
-                    conversation_log,
-                    feedback
-                )
-                current_state["debt_collector_prompt"] = new_prompt
-                
-                yield f'''
+    
+    if kind == "prompt":
+        current_state["debt_collector_prompt"] = event["prompt"]
+        return f'''
                 <div class="new-prompt-card" hx-swap-oob="beforeend:#conversation-area">
-                    <h4>📝 New Optimized Prompt:</h4>
-                    <pre>{new_prompt}</pre>
+                    <h4>📝 Prompt Changes (v{event["version"]}):</h4>
+                    <pre class="prompt-diff">{event["diff_html"]}</pre>
                 </div>
                 <div class="divider" hx-swap-oob="beforeend:#conversation-area"></div>
                 '''
-        
-        # Failed after all attempts
-        yield f'''
+    
+    if kind == "failure":
+        return f'''
         <div class="failure-banner" hx-swap-oob="beforeend:#conversation-area">
             <h2>❌ Training Failed</h2>
-            <p>Agent did not pass after {max_attempts} attempts.</p>
+            <p>Agent did not pass after {event["max_attempts"]} attempts.</p>
         </div>
         '''
-        current_state["is_running"] = False
     
-    return Response(generate(), mimetype='text/html')
+    if kind == "trace":
+        files = "".join(f"<li>{name}: <code>{path}</code></li>" for name, path in event["files"].items())
+        return f'''
+        <div class="status-banner starting" hx-swap-oob="beforeend:#conversation-area">
+            <span>🔬</span> Trace {event["trace_id"]} written
+            <ul>{files}</ul>
+        </div>
+        '''
+    
+    if kind == "error":
+        resume_button = ""
+        # Not offered once the run finished (its checkpoint is deleted) or with checkpoints off
+        if event.get("run_id") and checkpoints.exists(event["run_id"]):
+            resume_button = f'''
+            <button class="btn btn-primary" hx-post="/resume-training" hx-vals='{{"run_id": "{event["run_id"]}"}}'
+                    hx-target="#conversation-area" hx-swap="innerHTML">
+                ↩️ Resume from Last Turn
+            </button>
+            '''
+        return f'''
+        <div class="failure-banner" hx-swap-oob="beforeend:#conversation-area">
+            <h2>❌ Training Error</h2>
+            <p>{event["error"]}</p>
+            {resume_button}
+        </div>
+        '''
+    
+    return ""
+
 
+def initial_prompts(config: dict) -> tuple:
+    """A web run's starting prompts for config: (collector_prompt, defaulter_prompt, warm_similarity or None)."""
+    collector_prompt = get_debt_collector_prompt(config["company_name"], config["customer_name"],
+                                                 config["debt_amount"], config["collector_personality"])
+    defaulter_prompt = get_defaulter_prompt(config["customer_name"], config["debt_amount"],
+                                            config["months_overdue"], config["available_funds"])
+    
+    # Warm start from the closest previously passing prompt of the same scenario, if one is similar enough
+    warm_similarity = None
+    if PROMPT_LIBRARY_ENABLED:
+        import prompt_library
+        library_prompt, similarity = prompt_library.get_library().warm_start(
+            "web", config["collector_personality"], config["company_name"], config["customer_name"],
+            config["debt_amount"], config["months_overdue"], config["available_funds"]
+        )
+        if library_prompt:
+            collector_prompt = library_prompt
+            warm_similarity = similarity
+    return collector_prompt, defaulter_prompt, warm_similarity
+
+
+@app.route('/start-training', methods=['POST'])
+def start_training():
+    """Start the training loop with streaming updates."""
+    
+    # Get form data
+    config = current_state["config"]
+    collector_personality = request.form.get('collector_personality', config["collector_personality"])
+    company_name = request.form.get('company_name', config["company_name"])
+    customer_name = request.form.get('customer_name', config["customer_name"])
+    debt_amount = float(request.form.get('debt_amount', config["debt_amount"]))
+    months_overdue = int(request.form.get('months_overdue', config["months_overdue"]))
+    available_funds = float(request.form.get('available_funds', config["available_funds"]))
+    
+    # Update config
+    current_state["config"] = {
+        "collector_personality": collector_personality,
+        "company_name": company_name,
+        "customer_name": customer_name,
+        "debt_amount": debt_amount,
+        "months_overdue": months_overdue,
+        "available_funds": available_funds
+    }
+    
+    initial_collector_prompt, defaulter_prompt, warm_similarity = initial_prompts(current_state["config"])
+    current_state["debt_collector_prompt"] = initial_collector_prompt
+    current_state["defaulter_prompt"] = defaulter_prompt
+    
+    # ?trace=1 traces this run; ?profile=cpu,memory also profiles it (tracing.py)
+    run_args = (current_state["config"], initial_collector_prompt, defaulter_prompt, warm_similarity)
+    return stream_training(run_args, trace_options(), checkpoints.new_run_id())
+
+
+@app.route('/resume-training', methods=['POST'])
+def resume_training():
+    """Continue a checkpointed run (form field run_id, default the most recent) from its last turn."""
+    run_id = request.form.get('run_id')
+    if not run_id:
+        runs = checkpoints.pending(source="web")
+        if not runs:
+            return '<div class="error">No checkpointed run to resume.</div>', 404
+        run_id = runs[0]["run_id"]
+    try:
+        state = checkpoints.load(run_id)
+    except (OSError, ValueError) as e:
+        return f'<div class="error">Cannot resume run {run_id}: {e}</div>', 404
+    if state["finished"]:
+        return f'<div class="error">Run {run_id} already finished.</div>', 409
+    if state["run"]["source"] != "web":
+        return f'<div class="error">Run {run_id} was started from the CLI; resume it with python main.py --resume {run_id}.</div>', 409
+    
+    run = state["run"]
+    current_state["config"] = run["config"]
+    current_state["debt_collector_prompt"] = checkpoints.resume_point(state)[1]
+    current_state["defaulter_prompt"] = run["defaulter_prompt"]
+    
+    run_args = (run["config"], run["collector_prompt"], run["defaulter_prompt"], None,
+                run["max_attempts"], run["num_turns"])
+    return stream_training(run_args, trace_options(), run_id, resume=state)
+
+
+@app.route('/checkpoints')
+def list_checkpoints():
+    """Checkpointed web runs that can be resumed, newest first."""
+    return jsonify(checkpoints.pending(source="web"))
+
+
+def stream_training(run_args: tuple, trace: dict, run_id: str, resume: dict = None) -> Response:
+    """Stream one training run as htmx fragments, inline or on the worker pool.
+
+    A run that raises ends with an error banner offering to resume it from
+    its checkpoint.
+    """
+    kwargs = {"trace": trace, "run_id": run_id, "resume": resume}
+    if TRAINING_BACKEND == "process":
+        import workers  # multiprocessing is only loaded when the pool is used
+        events = workers.get_pool().stream(training_events, *run_args, **kwargs)
+    else:
+        events = training_events(*run_args, **kwargs)
+    
+    def generate():
+        current_state["attempt"] = 0
+        current_state["is_running"] = True
+        try:
+            for event in events:
+                if event["type"] == "error":
+                    # Worker failures arrive as events; the checkpoint is the parent's run ID
+                    event = {**event, "run_id": run_id}
+                # Inline runs: HTML building and the time Flask takes to send each
+                # fragment land in the run's trace (no-ops when untraced)
+                with tracing.span("render", event=event["type"]):
+                    html = render_event(event)
+                with tracing.span("flask.stream"):
+                    yield html
+        except Exception as e:
+            yield render_event({"type": "error", "error": f"{type(e).__name__}: {e}", "run_id": run_id})
+        finally:
+            current_state["is_running"] = False
+    
+    return Response(generate(), mimetype='text/html')
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,185 @@
+"""
+Run-scoped audio spool and single-process playback for the CLI.
+
+Each CLI run gets its own directory under SPOOL_DIR (default audio_spool/),
+so concurrent runs never overwrite each other's clips. Synthesized clips are
+handed to a background writer thread and the TTS loop moves straight on to
+the next message; the writer stores each clip atomically and appends a line
+to the run's manifest.jsonl:
+
+    {"index": 0, "role": "collector", "speaker": ..., "text": ..., "file": ..., "bytes": ..., "format": ...}
+    ...
+    {"complete": true, "clips": 11, "bytes": 120448, "errors": 0}
+
+Old runs are removed when a new spool opens: at most SPOOL_KEEP_RUNS run
+directories are kept, and any older than SPOOL_MAX_AGE_H hours are deleted.
+
+play() streams the clips, in order, into one long-lived ffplay (or mpg123)
+process over stdin, printing each line as its audio starts.
+"""
+
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+import tts_formats
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", "audio_spool")
+SPOOL_KEEP_RUNS = int(os.getenv("SPOOL_KEEP_RUNS", "10"))
+SPOOL_MAX_AGE_H = float(os.getenv("SPOOL_MAX_AGE_H", "24"))
+MANIFEST = "manifest.jsonl"
+
+# Players that read one continuous stream from stdin, in order of preference
+PLAYERS = [
+    ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "pipe:0"],
+    ["mpg123", "-q", "-"],
+]
+
+# Marks the end of the writer queue
+_STOP = None
+
+
+def cleanup(root: str = SPOOL_DIR, keep_runs: int = SPOOL_KEEP_RUNS, max_age_h: float = SPOOL_MAX_AGE_H,
+            exclude: tuple = ()) -> list:
+    """Delete run directories beyond the newest keep_runs or older than max_age_h; returns those removed."""
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and name not in exclude:
+            runs.append((os.path.getmtime(path), path))
+    runs.sort(reverse=True)
+    cutoff = time.time() - max_age_h * 3600
+    removed = []
+    for rank, (mtime, path) in enumerate(runs):
+        if rank >= keep_runs or mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+class AudioSpool:
+    """One run's clip directory, filled by a background writer thread."""
+
+    def __init__(self, run_id: str = None, root: str = SPOOL_DIR):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.root = root
+        self.path = os.path.join(root, self.run_id)
+        os.makedirs(self.path, exist_ok=True)
+        self.removed = cleanup(root, exclude=(self.run_id,))
+        self.entries = []
+        self.errors = []
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="audio-spool", daemon=True)
+        self.writer.start()
+        self.closed = False
+
+    def put(self, index: int, role: str, speaker: str, text: str, audio_bytes: bytes, output_format: str) -> str:
+        """Queue one clip for writing and return the path it will have."""
+        filename = f"{index:02d}_{role}.{tts_formats.extension(output_format)}"
+        entry = {"index": index, "role": role, "speaker": speaker, "text": text,
+                 "file": os.path.join(self.path, filename), "bytes": len(audio_bytes), "format": output_format}
+        self.queue.put((entry, audio_bytes))
+        return entry["file"]
+
+    def _write_loop(self):
+        with open(os.path.join(self.path, MANIFEST), "a", encoding="utf-8") as manifest:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+                entry, audio_bytes = item
+                try:
+                    # Write then rename, so a reader never sees a partial clip
+                    tmp_path = entry["file"] + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(audio_bytes)
+                    os.replace(tmp_path, entry["file"])
+                except OSError as e:
+                    self.errors.append(f"{entry['file']}: {e}")
+                    continue
+                self.entries.append(entry)
+                manifest.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                manifest.flush()
+            manifest.write(json.dumps({"complete": True, "clips": len(self.entries),
+                                       "bytes": sum(e["bytes"] for e in self.entries),
+                                       "errors": len(self.errors)}) + "\n")
+
+    def close(self) -> list:
+        """Wait for queued writes to finish; returns the written clip entries in order."""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(_STOP)
+            self.writer.join()
+        return sorted(self.entries, key=lambda entry: entry["index"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_manifest(path: str) -> list:
+    """Clip entries of a spooled run directory, in order."""
+    entries = []
+    with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn final line from an interrupted run
+            if "index" in entry:
+                entries.append(entry)
+    return sorted(entries, key=lambda entry: entry["index"])
+
+
+def _start_player():
+    for command in PLAYERS:
+        try:
+            return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def play(entries: list, gap_s: float = 0.5, on_clip=None) -> bool:
+    """Play clips through one player process fed over stdin; returns False if no player is installed.
+
+    Clips are written as the previous one finishes (by its constant-bitrate
+    duration), so on_clip(entry) fires roughly when its audio starts and the
+    pipe never holds more than about one clip.
+    """
+    player = _start_player()
+    if player is None:
+        return False
+    next_start = time.monotonic()
+    try:
+        for entry in entries:
+            time.sleep(max(0.0, next_start - time.monotonic()))
+            if on_clip:
+                on_clip(entry)
+            with open(entry["file"], "rb") as f:
+                player.stdin.write(f.read())
+            player.stdin.flush()
+            kbps = tts_formats.FORMATS.get(entry["format"], tts_formats.FORMATS["mp3_44100_128"])["kbps"]
+            next_start = time.monotonic() + entry["bytes"] * 8 / (kbps * 1000) + gap_s
+    except BrokenPipeError:
+        pass  # Player exited early (e.g. closed by the user)
+    finally:
+        try:
+            player.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            player.wait(timeout=max(0.0, next_start - time.monotonic()) + 5)
+        except subprocess.TimeoutExpired:
+            player.kill()
+    return True
@@ -0,0 +1,87 @@
+"""
+Import-time benchmark for app.py and main.py.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, reports
+the total and the slowest top-level imports, fails if a module exceeds its
+budget, and checks that no provider SDK was imported eagerly.
+
+Usage:
+    python bench_import.py                 # check app and main against budgets
+    python bench_import.py main --top 20   # one module, more detail
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative import time of the module itself, in milliseconds (best of RUNS
+# fresh interpreters; interpreter/site startup is reported but not budgeted).
+# Before lazy providers: app ~1200 ms, main ~1300 ms.
+IMPORT_BUDGET_MS = {
+    "app": 250,
+    "main": 50,
+}
+RUNS = 3
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ["groq", "google.generativeai", "elevenlabs", "numpy"]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module: str) -> tuple:
+    """Import module in a fresh interpreter; return (module_us, [(cumulative_us, name)], eagerly loaded SDKs)."""
+    check = f"import {module}, sys; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    )
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two extra spaces per level
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative), name.strip()))
+    eager = [m for m in result.stdout.strip().split(",") if m]
+    module_us = next(us for us, name in top_level if name == module)
+    return module_us, top_level, eager
+
+
+def check_module(module: str, top: int = 8) -> bool:
+    """Print the import report for one module; return True if within budget and lazy."""
+    runs = [measure(module) for _ in range(RUNS)]
+    module_us, top_level, eager = min(runs, key=lambda run: run[0])
+    budget_ms = IMPORT_BUDGET_MS.get(module)
+    total_ms = module_us / 1000
+    startup_ms = sum(us for us, _ in top_level) / 1000
+    within = budget_ms is None or total_ms <= budget_ms
+
+    status = "✅" if within and not eager else "❌"
+    budget = f" (budget {budget_ms} ms)" if budget_ms else ""
+    print(f"\n{status} import {module}: {total_ms:.1f} ms{budget}, {startup_ms:.1f} ms with interpreter startup")
+    print("-" * 40)
+    for us, name in sorted(top_level, reverse=True)[:top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+    if eager:
+        print(f"  ⚠️  Provider SDKs imported eagerly: {', '.join(eager)}")
+    return within and not eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time of app.py / main.py against a budget.")
+    parser.add_argument("modules", nargs="*", default=list(IMPORT_BUDGET_MS))
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to show")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  IMPORT-TIME BENCHMARK")
+    print("=" * 60)
+    ok = all([check_module(module, args.top) for module in args.modules])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Bulk offline judging and optimization through the provider batch API.
+
+Judging a large backlog of archived conversations one request at a time is
+bound by round-trip latency and billed at the full rate. This packs every
+judge request into batch-job files (OpenAI-compatible /v1/chat/completions
+JSONL, which is what Groq's batch API takes), submits them, polls until they
+finish and maps each result back to its conversation by custom_id. Failed
+conversations that carry the collector prompt they were run with are then
+sent through the optimizer as a second batch stage, using main.py's optimizer
+prompt and output handling.
+
+Input is a JSONL file of run records with a "conversation_log" field (and
+optionally "id" and "collector_prompt" / "final_prompt"), bare conversation
+lists, or a convlog.py archive. With PROVIDER_STUB=1 the jobs go to the
+stand-in batch server in stub_provider.py.
+
+Usage:
+    python bulk.py runs.jsonl --output judged.jsonl
+    python bulk.py archive.rvcl --output judged.jsonl --no-optimize --poll-s 30
+"""
+
+import argparse
+import json
+import os
+import time
+
+import providers
+
+JUDGE_MODEL = os.getenv("BULK_JUDGE_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+OPTIMIZER_MODEL = os.getenv("BULK_OPTIMIZER_MODEL", "meta-llama/llama-4-maverick-17b-128e-instruct")
+BATCH_MAX_REQUESTS = int(os.getenv("BULK_BATCH_MAX_REQUESTS", "50000"))  # Groq's per-file limit
+COMPLETION_WINDOW = os.getenv("BULK_COMPLETION_WINDOW", "24h")
+ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def load_conversations(path: str):
+    """Yield {"id", "conversation_log", "prompt"} from a JSONL file or a conversation archive."""
+    if path.endswith(".rvcl"):
+        import convlog
+        with convlog.ConversationArchive(path) as archive:
+            for index, conversation in enumerate(archive):
+                yield {"id": str(index), "conversation_log": conversation.to_log(), "prompt": None}
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                record = {"conversation_log": record}
+            yield {
+                "id": str(record.get("id", record.get("run_id", index))),
+                "conversation_log": record["conversation_log"],
+                "prompt": record.get("collector_prompt") or record.get("final_prompt"),
+            }
+
+
+def judge_request(custom_id: str, conversation_log: list) -> dict:
+    """Batch line for one judge call, with the same messages main.call_judge sends to Groq."""
+    import main
+
+    body = {
+        "model": JUDGE_MODEL,
+        "messages": [
+            {"role": "system", "content": main.JUDGE_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(conversation_log, indent=2)},
+        ],
+        "temperature": 0.2,
+        "max_completion_tokens": 256,
+    }
+    if main.JUDGE_STRUCTURED_OUTPUT:
+        body["response_format"] = {"type": "json_object"}
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body}
+
+
+def optimizer_request(custom_id: str, prompt: str, conversation_log: list, feedback: str) -> dict:
+    """Batch line for one optimizer call on a failed conversation."""
+    import main
+
+    full_prompt, max_tokens = main.optimizer_request(prompt, conversation_log, feedback or "Unknown failure")
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": {
+        "model": OPTIMIZER_MODEL,
+        "messages": [{"role": "user", "content": full_prompt}],
+        "temperature": 0.3,
+        "max_completion_tokens": max_tokens,
+    }}
+
+
+def _file_text(client, file_id: str) -> str:
+    content = client.files.content(file_id)
+    # SDK responses expose text as a property or a method depending on version
+    text = content.text
+    return text() if callable(text) else text
+
+
+class BatchRunner:
+    """Submits batch-job files, polls them and collects results by custom_id."""
+
+    def __init__(self, client=None, poll_s: float = 10.0, max_requests: int = BATCH_MAX_REQUESTS):
+        self.client = client or providers.get("groq")
+        self.poll_s = poll_s
+        self.max_requests = max_requests
+        self.stats = {"batches": 0, "requests": 0, "succeeded": 0, "failed": 0}
+
+    def submit(self, requests: list, stage: str) -> list:
+        """Upload the requests in files of at most max_requests lines; returns the batch IDs."""
+        batch_ids = []
+        for start in range(0, len(requests), self.max_requests):
+            chunk = requests[start:start + self.max_requests]
+            payload = "".join(json.dumps(request, separators=(",", ":")) + "\n" for request in chunk)
+            upload = self.client.files.create(file=(f"{stage}-{start}.jsonl", payload.encode("utf-8")),
+                                              purpose="batch")
+            batch = self.client.batches.create(input_file_id=upload.id, endpoint=ENDPOINT,
+                                               completion_window=COMPLETION_WINDOW, metadata={"stage": stage})
+            batch_ids.append(batch.id)
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(chunk)
+            print(f"📦 {stage}: submitted {batch.id} ({len(chunk)} requests)")
+        return batch_ids
+
+    def wait(self, batch_ids: list) -> list:
+        """Poll until every batch reaches a terminal status; returns the final batch objects."""
+        pending, finished = list(batch_ids), []
+        while pending:
+            still_pending = []
+            for batch_id in pending:
+                batch = self.client.batches.retrieve(batch_id)
+                if batch.status in TERMINAL_STATUSES:
+                    print(f"{'✅' if batch.status == 'completed' else '❌'} {batch_id}: {batch.status}")
+                    finished.append(batch)
+                else:
+                    still_pending.append(batch_id)
+            pending = still_pending
+            if pending:
+                time.sleep(self.poll_s)
+        return finished
+
+    def results(self, batches: list) -> dict:
+        """{custom_id: (text, (prompt_tokens, completion_tokens)) or (None, error message)}."""
+        results = {}
+        for batch in batches:
+            if batch.output_file_id:
+                for line in _file_text(self.client, batch.output_file_id).splitlines():
+                    entry = json.loads(line)
+                    response = entry.get("response") or {}
+                    body = response.get("body") or {}
+                    if response.get("status_code") == 200 and body.get("choices"):
+                        usage = body.get("usage") or {}
+                        results[entry["custom_id"]] = (
+                            body["choices"][0]["message"]["content"],
+                            (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)),
+                        )
+                    else:
+                        error = (body.get("error") or {}).get("message") or f"status {response.get('status_code')}"
+                        results[entry["custom_id"]] = (None, error)
+            if batch.error_file_id:
+                for line in _file_text(self.client, batch.error_file_id).splitlines():
+                    entry = json.loads(line)
+                    results[entry["custom_id"]] = (None, (entry.get("error") or {}).get("message", "failed"))
+        self.stats["succeeded"] += sum(1 for text, _ in results.values() if text is not None)
+        self.stats["failed"] += sum(1 for text, _ in results.values() if text is None)
+        return results
+
+    def run(self, requests: list, stage: str) -> dict:
+        """Submit, wait for and collect one stage; requests missing from the output count as failed."""
+        if not requests:
+            return {}
+        results = self.results(self.wait(self.submit(requests, stage)))
+        for request in requests:
+            if request["custom_id"] not in results:
+                results[request["custom_id"]] = (None, "missing from batch output")
+                self.stats["failed"] += 1
+        return results
+
+
+def run_bulk(input_path: str, output_path: str, optimize: bool = True, poll_s: float = 10.0,
+             runner: BatchRunner = None) -> dict:
+    """Judge (and optionally optimize) every conversation in input_path; writes one JSONL result each."""
+    import judges
+    import main
+
+    runner = runner or BatchRunner(poll_s=poll_s)
+    start = time.perf_counter()
+    conversations = list(load_conversations(input_path))
+    records = {}
+    for index, conversation in enumerate(conversations):
+        records[f"judge-{index}"] = {"id": conversation["id"], "passed": None, "feedback": "",
+                                     "prompt_tokens": 0, "completion_tokens": 0}
+
+    judged = runner.run([judge_request(f"judge-{index}", conversation["conversation_log"])
+                         for index, conversation in enumerate(conversations)], "judge")
+    optimize_requests = []
+    for index, conversation in enumerate(conversations):
+        record = records[f"judge-{index}"]
+        text, detail = judged[f"judge-{index}"]
+        if text is None:
+            record["error"] = detail
+            continue
+        verdict = judges.parse_verdict(text)
+        record.update(passed=bool(verdict.get("pass")), feedback=verdict.get("feedback", ""),
+                      parse_error=bool(verdict.get("parse_error")),
+                      prompt_tokens=detail[0], completion_tokens=detail[1])
+        if optimize and not record["passed"] and conversation["prompt"]:
+            optimize_requests.append(optimizer_request(f"optimize-{index}", conversation["prompt"],
+                                                       conversation["conversation_log"], record["feedback"]))
+
+    optimized = runner.run(optimize_requests, "optimize")
+    for custom_id, (text, detail) in optimized.items():
+        index = int(custom_id.split("-", 1)[1])
+        record = records[f"judge-{index}"]
+        if text is None:
+            record["optimizer_error"] = detail
+            continue
+        record["optimized_prompt"] = main.apply_optimizer_output(conversations[index]["prompt"], text)
+        record["prompt_tokens"] += detail[0]
+        record["completion_tokens"] += detail[1]
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    elapsed = time.perf_counter() - start
+    verdicts = [record["passed"] for record in records.values() if record["passed"] is not None]
+    return {
+        **runner.stats,
+        "conversations": len(conversations),
+        "judged": len(verdicts),
+        "passed": sum(verdicts),
+        "optimized": sum(1 for record in records.values() if "optimized_prompt" in record),
+        "prompt_tokens": sum(record["prompt_tokens"] for record in records.values()),
+        "completion_tokens": sum(record["completion_tokens"] for record in records.values()),
+        "elapsed_s": round(elapsed, 3),
+        "conversations_per_s": round(len(conversations) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Judge and optimize archived conversations with batch jobs.")
+    parser.add_argument("input", help="JSONL of run records / conversation logs, or a .rvcl archive")
+    parser.add_argument("--output", default="bulk_results.jsonl")
+    parser.add_argument("--no-optimize", action="store_true", help="Judge only")
+    parser.add_argument("--poll-s", type=float, default=10.0, help="Seconds between batch status polls")
+    args = parser.parse_args()
+
+    summary = run_bulk(args.input, args.output, not args.no_optimize, args.poll_s)
+    print("=" * 60)
+    print("📦 BULK BATCH RUN")
+    print("=" * 60)
+    print(f"{summary['conversations']} conversations: {summary['judged']} judged, {summary['passed']} passed, "
+          f"{summary['optimized']} prompts optimized")
+    print(f"{summary['requests']} requests in {summary['batches']} batch job(s), {summary['failed']} failed; "
+          f"{summary['prompt_tokens'] + summary['completion_tokens']} tokens")
+    print(f"⏱️  {summary['elapsed_s']}s ({summary['conversations_per_s']} conversations/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Record and replay provider calls.
+
+CASSETTE_MODE=record wraps the Groq and Gemini clients so every request and
+its response is appended to a gzip JSONL cassette (CASSETTE_PATH, default
+cassettes/<time>-<pid>.jsonl.gz, one file per process). CASSETTE_MODE=replay
+answers requests from the cassettes matching CASSETTE_PATH (a glob) at CPU
+speed, without constructing the real clients or needing API keys.
+
+Requests are matched on their full content: provider, model, messages or
+prompt, and generation settings. Changing JUDGE_SYSTEM_PROMPT therefore
+changes only the judge requests; those miss the cassette and go to the live
+(or PROVIDER_STUB) model while every unchanged stage is replayed, and a stage
+downstream of a changed output misses in turn. With CASSETTE_STRICT=1 a miss
+raises instead. Identical requests replay their recorded responses in order,
+then keep returning the last one. TTS calls are not recorded.
+
+main.run_scenario and web training runs (app.training_events, from
+/start-training) also record each run's scenario, starting prompt and
+verdict, so recorded runs can be re-driven in parallel and compared; web
+runs are re-driven through app.training_events with their recorded prompts.
+CLI run_training_loop runs are not recorded (they share run_scenario's
+calls but not its headless entry point):
+
+Usage:
+    CASSETTE_MODE=record python main.py --batch scenarios.jsonl
+    CASSETTE_MODE=record python app.py
+    python cassette.py replay 'cassettes/*.jsonl.gz' --workers 8 --output rejudged.jsonl
+    python cassette.py info 'cassettes/*.jsonl.gz'
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+CASSETTE_DIR = "cassettes"
+
+
+class CassetteMiss(KeyError):
+    """A replayed request has no recorded response and CASSETTE_STRICT=1."""
+
+
+def request_key(provider: str, request: dict) -> str:
+    """Stable hash of a request's full content."""
+    canonical = json.dumps([provider, request], sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _read_entries(path: str):
+    """Yield the entries of one cassette, stopping quietly at a truncated tail."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except EOFError:
+            return
+
+
+class Cassette:
+    """Recorded responses keyed by request, plus the runs they came from."""
+
+    def __init__(self, mode: str, path: str, strict: bool = False):
+        self.mode = mode
+        self.strict = strict
+        self.responses = {}
+        self.cursors = {}
+        self.runs = []
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self.lock = threading.Lock()
+        self.file = None
+        if mode == "record":
+            self.path = path or os.path.join(CASSETTE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz")
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = gzip.open(self.path, "at", encoding="utf-8")
+        else:
+            self.path = path or os.path.join(CASSETTE_DIR, "*.jsonl.gz")
+            self.load(sorted(glob.glob(self.path)))
+
+    def load(self, paths: list):
+        for path in paths:
+            for entry in _read_entries(path):
+                if "run" in entry:
+                    self.runs.append(entry["run"])
+                else:
+                    self.responses.setdefault(entry["key"], []).append(entry["response"])
+
+    def _write(self, entry: dict):
+        with self.lock:
+            self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            # Sync-flush so a crashed process leaves a readable cassette
+            self.file.flush()
+            self.stats["recorded"] += 1
+
+    def record(self, key: str, provider: str, model: str, response: dict):
+        self._write({"key": key, "provider": provider, "model": model, "response": response})
+
+    def record_run(self, run: dict):
+        self._write({"run": run})
+
+    def lookup(self, key: str) -> dict:
+        """The next recorded response for key, or None on a miss."""
+        with self.lock:
+            responses = self.responses.get(key)
+            if not responses:
+                self.stats["misses"] += 1
+                if self.strict:
+                    raise CassetteMiss(key)
+                return None
+            index = self.cursors.get(key, 0)
+            self.cursors[key] = index + 1
+            self.stats["hits"] += 1
+            return responses[min(index, len(responses) - 1)]
+
+    def report(self) -> dict:
+        with self.lock:
+            return dict(self.stats, mode=self.mode, path=self.path, requests=len(self.responses), runs=len(self.runs))
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    """Process-wide cassette for CASSETTE_MODE, opened or loaded on first use.
+
+    Settings are read from the environment here rather than at import, so
+    worker processes forked by replay() see the mode it sets.
+    """
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(os.getenv("CASSETTE_MODE", ""), os.getenv("CASSETTE_PATH", ""),
+                                 os.getenv("CASSETTE_STRICT", "0") == "1")
+        return _cassette
+
+
+# Responses rebuilt from a cassette, shaped like the SDK objects the callers read
+
+def _groq_completion(response: dict):
+    usage = response.get("usage")
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=response["text"]))],
+        usage=SimpleNamespace(prompt_tokens=usage[0], completion_tokens=usage[1]) if usage else None,
+    )
+
+
+class _ReplayStream(list):
+    def close(self):
+        pass
+
+
+def _groq_stream(response: dict):
+    chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], x_groq=None)
+              for text in response["chunks"]]
+    usage = response.get("usage")
+    if usage:
+        usage = SimpleNamespace(prompt_tokens=usage[0], completion_tokens=usage[1])
+        chunks.append(SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage)))
+    return _ReplayStream(chunks)
+
+
+def _gemini_response(text: str, usage):
+    return SimpleNamespace(
+        text=text,
+        parts=[text] if text else [],
+        usage_metadata=SimpleNamespace(prompt_token_count=usage[0], candidates_token_count=usage[1]) if usage else None,
+    )
+
+
+def _gemini_stream(response: dict):
+    chunks = response["chunks"] or [""]
+    usage = response.get("usage")
+    return [_gemini_response(text, usage if i == len(chunks) - 1 else None) for i, text in enumerate(chunks)]
+
+
+class _RecordingStream:
+    """Passes a Groq stream through, recording its chunks when exhausted or closed."""
+
+    def __init__(self, stream, on_done):
+        self.stream = stream
+        self.on_done = on_done
+        self.chunks = []
+        self.usage = None
+        self.done = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                if chunk.x_groq and chunk.x_groq.usage:
+                    self.usage = [chunk.x_groq.usage.prompt_tokens, chunk.x_groq.usage.completion_tokens]
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.chunks.append(chunk.choices[0].delta.content)
+                yield chunk
+        finally:
+            self._finish()
+
+    def close(self):
+        self.stream.close()
+        self._finish()
+
+    def _finish(self):
+        if not self.done:
+            self.done = True
+            self.on_done({"chunks": self.chunks, "usage": self.usage})
+
+
+class _Client:
+    """Cassette front for one provider; the real client is only built on a miss or in record mode."""
+
+    def __init__(self, provider: str, factory):
+        self.provider = provider
+        self.factory = factory
+        self.client = None
+        self.lock = threading.Lock()
+
+    def real(self):
+        with self.lock:
+            if self.client is None:
+                self.client = self.factory()
+            return self.client
+
+
+class _GroqCompletions:
+    def __init__(self, front: _Client):
+        self.front = front
+
+    def create(self, **kwargs):
+        cassette = get_cassette()
+        key = request_key("groq", kwargs)
+        model = kwargs.get("model")
+        stream = kwargs.get("stream", False)
+        if cassette.mode == "replay":
+            response = cassette.lookup(key)
+            if response is not None:
+                return _groq_stream(response) if stream else _groq_completion(response)
+        result = self.front.real().chat.completions.create(**kwargs)
+        if cassette.mode != "record":
+            return result
+        if stream:
+            return _RecordingStream(result, lambda response: cassette.record(key, "groq", model, response))
+        usage = [result.usage.prompt_tokens, result.usage.completion_tokens] if result.usage else None
+        cassette.record(key, "groq", model, {"text": result.choices[0].message.content, "usage": usage})
+        return result
+
+
+class _GenerationConfig(dict):
+    """Plain mapping; the real SDK accepts a dict wherever it takes a GenerationConfig."""
+
+    def __init__(self, **kwargs):
+        super().__init__(kwargs)
+
+
+class _GeminiModel:
+    def __init__(self, front: _Client, model_name: str):
+        self.front = front
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        cassette = get_cassette()
+        request = {"model": self.model_name, "contents": contents,
+                   "generation_config": dict(generation_config or {}), "stream": stream}
+        key = request_key("gemini", request)
+        if cassette.mode == "replay":
+            response = cassette.lookup(key)
+            if response is not None:
+                return _gemini_stream(response) if stream else _gemini_response(response["text"], response["usage"])
+        genai = self.front.real()
+        result = genai.GenerativeModel(self.model_name).generate_content(
+            contents, generation_config=generation_config, stream=stream
+        )
+        if cassette.mode != "record":
+            return result
+        if stream:
+            # Drain the stream so it can be recorded whole, then hand the chunks back
+            chunks = list(result)
+            texts = [chunk.text for chunk in chunks if chunk.parts]
+            usage = next((chunk.usage_metadata for chunk in reversed(chunks) if chunk.usage_metadata), None)
+            usage = [usage.prompt_token_count, usage.candidates_token_count] if usage else None
+            cassette.record(key, "gemini", self.model_name, {"chunks": texts, "usage": usage})
+            return chunks
+        metadata = result.usage_metadata
+        usage = [metadata.prompt_token_count, metadata.candidates_token_count] if metadata else None
+        cassette.record(key, "gemini", self.model_name, {"text": result.text, "usage": usage})
+        return result
+
+
+def _groq_client(front: _Client):
+    return SimpleNamespace(chat=SimpleNamespace(completions=_GroqCompletions(front)))
+
+
+def _gemini_client(front: _Client):
+    return SimpleNamespace(
+        GenerativeModel=lambda model_name, **kwargs: _GeminiModel(front, model_name),
+        types=SimpleNamespace(GenerationConfig=_GenerationConfig),
+        configure=lambda **kwargs: front.real().configure(**kwargs),
+    )
+
+
+def wrap_factory(provider: str, factory):
+    """Factory for a cassette front over the provider's real (or stub) client."""
+    build = {"groq": _groq_client, "gemini": _gemini_client}[provider]
+    return lambda: build(_Client(provider, factory))
+
+
+def record_run(run: dict):
+    """Append a finished run's scenario and verdict to the cassette (record mode only)."""
+    if os.getenv("CASSETTE_MODE") == "record":
+        get_cassette().record_run(run)
+
+
+def _replay_web_run(run: dict) -> dict:
+    """Drive a recorded web run's events through app.training_events; returns passed, attempts, feedback."""
+    import app
+
+    result = {"passed": False, "attempts": run["max_attempts"], "feedback": ""}
+    for event in app.training_events(run["scenario"], run["initial_prompt"], run["defaulter_prompt"], None,
+                                     run["max_attempts"], run["num_turns"]):
+        if event["type"] == "verdict":
+            result["feedback"] = event["verdict"].get("feedback", "")
+        elif event["type"] == "success":
+            result.update(passed=True, attempts=event["attempt"])
+    return result
+
+
+def _replay_run(run: dict) -> dict:
+    """Re-drive one recorded run in a worker process and return its new verdict."""
+    import contextlib
+    import io
+
+    cassette = get_cassette()
+    before = dict(cassette.stats)
+    start = time.perf_counter()
+    if run.get("source") == "web":
+        result = _replay_web_run(run)
+    else:
+        import main
+        # Start from the recorded prompt (including a warm start) so the first turns replay
+        checkpoint = {"collector_prompt": run["initial_prompt"], "prompt_version": run["prompt_version"],
+                      "warm_start": run["warm_start"]}
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = main.run_scenario(**run["scenario"], max_attempts=run["max_attempts"],
+                                       num_turns=run["num_turns"], checkpoint=checkpoint)
+    return {
+        "passed": result["passed"],
+        "attempts": result["attempts"],
+        "feedback": result["feedback"],
+        "seconds": round(time.perf_counter() - start, 3),
+        "hits": cassette.stats["hits"] - before["hits"],
+        "misses": cassette.stats["misses"] - before["misses"],
+    }
+
+
+def replay(pattern: str, workers: int = 4, output: str = None) -> dict:
+    """Re-drive every recorded run in the cassettes across a process pool and compare verdicts."""
+    # Workers inherit these; replayed runs must not feed the prompt library, the run log or checkpoints
+    os.environ.update({"CASSETTE_MODE": "replay", "CASSETTE_PATH": pattern, "PROMPT_LIBRARY": "0",
+                       "RUNS_LOG_PATH": os.devnull, "TURN_CHECKPOINTS": "0"})
+    import sweep
+
+    runs = Cassette("replay", pattern).runs
+    summary = {"runs": 0, "errors": 0, "unchanged": 0, "pass_to_fail": 0, "fail_to_pass": 0,
+               "attempts_delta": 0, "hits": 0, "misses": 0}
+    sink = open(output, "w", encoding="utf-8") if output else None
+    start = time.perf_counter()
+    try:
+        for run, result, error in sweep.run_bounded(_replay_run, runs, workers):
+            summary["runs"] += 1
+            record = {"scenario": run["scenario"], "recorded": {"passed": run["passed"], "attempts": run["attempts"]}}
+            if error:
+                summary["errors"] += 1
+                record["error"] = str(error)
+            else:
+                record["replayed"] = result
+                summary["hits"] += result["hits"]
+                summary["misses"] += result["misses"]
+                summary["attempts_delta"] += result["attempts"] - run["attempts"]
+                if result["passed"] == run["passed"]:
+                    summary["unchanged"] += 1
+                else:
+                    summary["pass_to_fail" if run["passed"] else "fail_to_pass"] += 1
+            if sink:
+                sink.write(json.dumps(record) + "\n")
+    finally:
+        if sink:
+            sink.close()
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    calls = summary["hits"] + summary["misses"]
+    summary["replayed_share"] = round(summary["hits"] / calls, 4) if calls else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider call cassettes.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_parser = sub.add_parser("replay", help="Re-run recorded runs, replaying unchanged provider calls")
+    replay_parser.add_argument("cassettes", help="Cassette path or glob")
+    replay_parser.add_argument("--workers", type=int, default=4)
+    replay_parser.add_argument("--output", help="Per-run comparison JSONL")
+    info_parser = sub.add_parser("info", help="Count recorded runs and requests")
+    info_parser.add_argument("cassettes", help="Cassette path or glob")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        cassette = Cassette("replay", args.cassettes)
+        responses = sum(len(entries) for entries in cassette.responses.values())
+        print(f"{len(cassette.runs)} run(s), {responses} response(s) for {len(cassette.responses)} distinct request(s)")
+        return
+
+    # Through the importable module, so pool workers use the same cassette state
+    import cassette
+    summary = cassette.replay(args.cassettes, args.workers, args.output)
+    print("=" * 60)
+    print("📼 CASSETTE REPLAY")
+    print("=" * 60)
+    print(f"{summary['runs']} run(s) in {summary['seconds']}s, {summary['errors']} error(s)")
+    print(f"Verdicts: {summary['unchanged']} unchanged, {summary['pass_to_fail']} PASS→FAIL, "
+          f"{summary['fail_to_pass']} FAIL→PASS; attempts {summary['attempts_delta']:+d} in total")
+    print(f"Provider calls: {summary['hits']} replayed, {summary['misses']} live "
+          f"({summary['replayed_share']:.1%} replayed)")
+
+
+if __name__ == "__main__":
+    main()
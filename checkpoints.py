@@ -0,0 +1,243 @@
+"""
+Turn-level checkpoints for training runs, and resuming from them.
+
+A run that failed in the middle of an attempt (a provider error on turn 4 of
+attempt 3, a killed process) used to start again from attempt 1 and repay
+every LLM call before it. Each web and CLI training run now appends to
+CHECKPOINT_DIR/<run_id>.jsonl as it goes, one short line per step:
+
+    {"type": "start", "config": {...}, "collector_prompt": ..., "defaulter_prompt": ..., ...}
+    {"type": "attempt", "attempt": 1, "prompt": ...}
+    {"type": "turn", "attempt": 1, "role": "collector", "content": ...}
+    {"type": "turn", "attempt": 1, "role": "defaulter", "content": ...}
+    {"type": "verdict", "attempt": 1, "verdict": {...}}
+    {"type": "prompt", "attempt": 1, "prompt": ...}        # optimized prompt for the next attempt
+    {"type": "end", "passed": true, "attempts": 2}
+
+Only the new message is written per turn; both sides' message histories,
+the conversation log, the current prompt and the attempt counter are rebuilt
+from the lines on load. A finished run's file is deleted, so the files left
+are the runs that can be resumed (python main.py --resume, POST
+/resume-training), each only by the side that started it: the CLI and the
+web app build their prompts and run records from different configs.
+TURN_CHECKPOINTS=0 turns checkpointing off.
+
+Runs that are never resumed are removed when a new run starts: files not
+written to for CHECKPOINT_MAX_AGE_H hours are deleted, and of the idle ones
+(untouched for CHECKPOINT_IDLE_MIN minutes) only the newest
+CHECKPOINT_KEEP_RUNS are kept. A run in progress writes a line per step, so
+however many run at once (load tests, the process pool, job queue workers),
+their files are never idle and never removed.
+"""
+
+import json
+import os
+import time
+import uuid
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+TURN_CHECKPOINTS_ENABLED = os.getenv("TURN_CHECKPOINTS", "1") == "1"
+CHECKPOINT_KEEP_RUNS = int(os.getenv("CHECKPOINT_KEEP_RUNS", "20"))
+CHECKPOINT_MAX_AGE_H = float(os.getenv("CHECKPOINT_MAX_AGE_H", "72"))
+CHECKPOINT_IDLE_MIN = float(os.getenv("CHECKPOINT_IDLE_MIN", "10"))
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _path(run_id: str, root: str) -> str:
+    if not run_id or os.path.basename(run_id) != run_id or run_id.startswith("."):
+        raise ValueError(f"invalid run ID {run_id!r}")
+    return os.path.join(root, f"{run_id}.jsonl")
+
+
+def exists(run_id: str, root: str = None) -> bool:
+    """Whether run_id still has a checkpoint to resume (finished runs delete theirs)."""
+    root = root or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR)
+    try:
+        return os.path.exists(_path(run_id, root))
+    except ValueError:
+        return False
+
+
+def cleanup(root: str = None, keep_runs: int = CHECKPOINT_KEEP_RUNS, max_age_h: float = CHECKPOINT_MAX_AGE_H,
+            idle_min: float = CHECKPOINT_IDLE_MIN, exclude: tuple = ()) -> list:
+    """Delete checkpoints older than max_age_h, or idle for idle_min beyond the newest keep_runs idle ones.
+
+    Files written to within idle_min belong to runs still in progress and are never removed.
+    Returns the paths removed.
+    """
+    root = root or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR)
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in os.listdir(root):
+        if name.endswith(".jsonl") and name[:-len(".jsonl")] not in exclude:
+            path = os.path.join(root, name)
+            runs.append((os.path.getmtime(path), path))
+    runs.sort(reverse=True)
+    now = time.time()
+    cutoff, idle_cutoff = now - max_age_h * 3600, now - idle_min * 60
+    idle = [(mtime, path) for mtime, path in runs if mtime < idle_cutoff]
+    removed = []
+    for rank, (mtime, path) in enumerate(idle):
+        if rank >= keep_runs or mtime < cutoff:
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Already removed by a run finishing, or another process's cleanup
+            removed.append(path)
+    return removed
+
+
+class RunCheckpoint:
+    """Append-only step log of one training run."""
+
+    def __init__(self, run_id: str = None, root: str = None):
+        self.run_id = run_id or new_run_id()
+        self.root = root or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR)
+        self.path = _path(self.run_id, self.root)
+        self.enabled = TURN_CHECKPOINTS_ENABLED
+        self.file = None
+
+    def _append(self, record: dict):
+        if not self.enabled:
+            return
+        if self.file is None:
+            os.makedirs(self.root, exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        # Flushed to the OS per step, so a crashed process loses nothing already written
+        self.file.flush()
+
+    def start(self, config: dict, collector_prompt: str, defaulter_prompt: str, max_attempts: int,
+              num_turns: int, source: str):
+        if self.enabled:
+            cleanup(self.root, exclude=(self.run_id,))
+        self._append({"type": "start", "config": config, "collector_prompt": collector_prompt,
+                      "defaulter_prompt": defaulter_prompt, "max_attempts": max_attempts,
+                      "num_turns": num_turns, "source": source})
+
+    def attempt(self, attempt: int, prompt: str):
+        self._append({"type": "attempt", "attempt": attempt, "prompt": prompt})
+
+    def turn(self, attempt: int, role: str, content: str):
+        self._append({"type": "turn", "attempt": attempt, "role": role, "content": content})
+
+    def verdict(self, attempt: int, verdict: dict):
+        self._append({"type": "verdict", "attempt": attempt, "verdict": verdict})
+
+    def prompt(self, attempt: int, prompt: str):
+        self._append({"type": "prompt", "attempt": attempt, "prompt": prompt})
+
+    def finish(self, passed: bool, attempts: int):
+        """Record the outcome; the run no longer needs resuming, so its file is removed."""
+        self._append({"type": "end", "passed": passed, "attempts": attempts})
+        self.close()
+        if self.enabled and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def load(run_id: str, root: str = None) -> dict:
+    """Rebuild a run's state from its checkpoint file.
+
+    Returns {"run_id", "run" (the start record), "attempt", "prompt", "turns",
+    "verdict", "next_prompt", "finished"} for the last attempt written.
+    """
+    root = root or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR)
+    state = {"run_id": run_id, "run": None, "attempt": 0, "prompt": None, "turns": [],
+             "verdict": None, "next_prompt": None, "finished": False}
+    with open(_path(run_id, root), "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn final line from an interrupted write
+            kind = record["type"]
+            if kind == "start":
+                # The CLI's config names the collector's personality "personality", the web's
+                # "collector_personality"; both are filled in so either reader finds it
+                config = record["config"]
+                personality = config.get("collector_personality", config.get("personality"))
+                if personality is not None:
+                    config.setdefault("personality", personality)
+                    config.setdefault("collector_personality", personality)
+                state["run"] = record
+                state["prompt"] = record["collector_prompt"]
+            elif kind == "attempt":
+                state.update(attempt=record["attempt"], prompt=record["prompt"], turns=[],
+                             verdict=None, next_prompt=None)
+            elif kind == "turn":
+                state["turns"].append({"role": record["role"], "content": record["content"]})
+            elif kind == "verdict":
+                state["verdict"] = record["verdict"]
+            elif kind == "prompt":
+                state["next_prompt"] = record["prompt"]
+            elif kind == "end":
+                state["finished"] = True
+    if state["run"] is None:
+        raise ValueError(f"checkpoint {run_id} has no start record")
+    return state
+
+
+def resume_point(state: dict) -> tuple:
+    """Where a loaded run continues: (attempt, prompt, turns already made, verdict or None).
+
+    A verdict is returned when the attempt's conversation was already judged,
+    so the loop only has to act on it (optimize, or finish on a pass).
+    """
+    if state["next_prompt"] is not None:
+        return state["attempt"] + 1, state["next_prompt"], [], None
+    if state["attempt"] == 0:
+        return 1, state["prompt"], [], None
+    return state["attempt"], state["prompt"], list(state["turns"]), state["verdict"]
+
+
+def histories(collector_prompt: str, defaulter_prompt: str, turns: list) -> tuple:
+    """Both sides' chat histories after the given turns: (collector_messages, defaulter_messages)."""
+    collector_messages = [{"role": "system", "content": collector_prompt}]
+    defaulter_messages = [{"role": "system", "content": defaulter_prompt}]
+    for turn in turns:
+        speaker, listener = ((collector_messages, defaulter_messages) if turn["role"] == "collector"
+                             else (defaulter_messages, collector_messages))
+        speaker.append({"role": "assistant", "content": turn["content"]})
+        listener.append({"role": "user", "content": turn["content"]})
+    return collector_messages, defaulter_messages
+
+
+def conversation_log(turns: list, collector_label: str = "collector") -> list:
+    """The judge's conversation log for the given turns (the web UI labels the collector differently)."""
+    return [{"role": collector_label if turn["role"] == "collector" else "customer", "content": turn["content"]}
+            for turn in turns]
+
+
+def pending(root: str = None, source: str = None) -> list:
+    """Resumable runs (started by `source`, if given), newest first.
+
+    Each is {"run_id", "source", "config", "attempt", "turns", "updated"}.
+    """
+    root = root or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR)
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in os.listdir(root):
+        if not name.endswith(".jsonl"):
+            continue
+        run_id = name[:-len(".jsonl")]
+        try:
+            state = load(run_id, root)
+        except (OSError, ValueError, KeyError):
+            continue
+        if state["finished"] or (source and state["run"]["source"] != source):
+            continue
+        runs.append({"run_id": run_id, "source": state["run"]["source"], "config": state["run"]["config"],
+                     "attempt": state["attempt"], "turns": len(state["turns"]),
+                     "updated": os.path.getmtime(os.path.join(root, name))})
+    runs.sort(key=lambda run: run["updated"], reverse=True)
+    return runs
@@ -0,0 +1,467 @@
+"""
+Multi-node scenario sweeps: a coordinator shards runs across worker nodes.
+
+One machine's provider quota and CPU cap how many scenarios a sweep can
+train and judge. Here a coordinator expands the same grid as sweep.py,
+groups the runs into shards of --shard-size and hands them to worker nodes
+over a line-delimited JSON protocol on TCP. Each node runs its shard across
+its own process pool (sweep.run_one) and streams back every finished run
+record, which the coordinator merges into the sweep checkpoint, so
+--resume, sweep_results.json and analytics work exactly as for sweep.py.
+
+- Work stealing: shards are queued per node; a node that runs dry takes
+  unclaimed shards first, then steals half of the longest other queue.
+- Heartbeats: nodes send one every CLUSTER_HEARTBEAT_S seconds. A node that
+  misses CLUSTER_HEARTBEAT_TIMEOUT_S, or whose connection drops, is lost,
+  and the unfinished runs of its shards are queued again (up to
+  MAX_SHARD_RETRIES times). A record that arrives twice is kept once.
+- CLUSTER_TOKEN, if set, must match on every node.
+
+Usage:
+    python cluster.py coordinator --sample 200 --port 7450
+    python cluster.py worker --connect 10.0.0.5:7450 --processes 8
+    python cluster.py local --nodes 3 --processes 2 --sample 40 --kill-after 2   # on localhost
+"""
+
+import argparse
+import json
+import os
+import socket
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sweep
+
+HEARTBEAT_S = float(os.getenv("CLUSTER_HEARTBEAT_S", "2"))
+HEARTBEAT_TIMEOUT_S = float(os.getenv("CLUSTER_HEARTBEAT_TIMEOUT_S", "10"))
+CLUSTER_TOKEN = os.getenv("CLUSTER_TOKEN", "")
+DEFAULT_PORT = 7450
+MAX_SHARD_RETRIES = 3
+WAIT_S = 0.5  # How long an idle node waits before asking again
+
+
+def _send(stream, message: dict):
+    stream.write((json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+def _receive(stream) -> dict:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line)
+
+
+class Coordinator:
+    """Shard bookkeeping: per-node queues, stealing, heartbeats and retries."""
+
+    def __init__(self, tasks: list, shard_size: int, checkpoint_path: str, done: dict = None):
+        self.shards = {}
+        for start in range(0, len(tasks), shard_size):
+            shard_id = f"s{start // shard_size:04d}"
+            self.shards[shard_id] = {
+                "tasks": {task["run_id"]: task for task in tasks[start:start + shard_size]},
+                "status": "queued", "claims": 0, "node": None,
+            }
+        self.unclaimed = deque(self.shards)
+        self.nodes = {}
+        self.records = dict(done or {})
+        self.checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.stats = {"steals": 0, "stolen_shards": 0, "lost_nodes": 0, "retried_shards": 0,
+                      "failed_shards": 0, "duplicate_records": 0, "run_errors": 0}
+        self.start = time.perf_counter()
+        if not self.shards:
+            self.finished.set()
+
+    def handle(self, node: str, message: dict) -> dict:
+        with self.lock:
+            kind = message.get("type")
+            if kind == "hello":
+                return self._hello(node, message)
+            entry = self.nodes.get(node)
+            if entry is None or not entry["alive"]:
+                # Declared lost (e.g. a long pause); it may rejoin with a new hello
+                if kind == "record":
+                    self._record(message)
+                return {"type": "lost"}
+            entry["last_seen"] = time.monotonic()
+            if kind == "heartbeat":
+                return {"type": "ok"}
+            if kind == "next":
+                return self._next(node)
+            if kind == "record":
+                self._record(message)
+                entry["runs"] += 1
+                return {"type": "ok"}
+            if kind == "error":
+                self.shards[message["shard"]]["tasks"].pop(message["run_id"], None)
+                self.stats["run_errors"] += 1
+                print(f"❌ {node}: {message['run_id']}: {message['error']}")
+                return {"type": "ok"}
+            if kind == "shard_done":
+                self._shard_done(node, message["shard"])
+                return {"type": "ok"}
+            if kind == "bye":
+                entry["alive"] = False
+                return {"type": "ok"}
+            return {"type": "error", "error": f"unknown message type {kind!r}"}
+
+    def _hello(self, node: str, message: dict) -> dict:
+        if CLUSTER_TOKEN and message.get("token") != CLUSTER_TOKEN:
+            return {"type": "error", "error": "bad token"}
+        previous = self.nodes.get(node)
+        self.nodes[node] = {
+            "alive": True, "lost": False, "queue": deque(), "running": set(), "last_seen": time.monotonic(),
+            "processes": message.get("processes", 1), "runs": previous["runs"] if previous else 0,
+            "shards": previous["shards"] if previous else 0,
+        }
+        # Unclaimed shards are spread over the live nodes' queues; later nodes steal
+        live = [name for name, entry in self.nodes.items() if entry["alive"]]
+        for index, shard_id in enumerate(self.unclaimed):
+            self.nodes[live[index % len(live)]]["queue"].append(shard_id)
+        self.unclaimed.clear()
+        print(f"🔌 {node} joined ({message.get('processes', 1)} processes, {len(live)} node(s) live)")
+        return {"type": "welcome", "heartbeat_s": HEARTBEAT_S}
+
+    def _steal(self, node: str) -> bool:
+        victims = [(len(entry["queue"]), name) for name, entry in self.nodes.items()
+                   if name != node and entry["alive"] and entry["queue"]]
+        if not victims:
+            return False
+        size, victim = max(victims)
+        # Take the back half, which the victim would have reached last
+        count = max(1, size // 2)
+        stolen = [self.nodes[victim]["queue"].pop() for _ in range(count)]
+        self.nodes[node]["queue"].extend(reversed(stolen))
+        self.stats["steals"] += 1
+        self.stats["stolen_shards"] += count
+        return True
+
+    def _next(self, node: str) -> dict:
+        entry = self.nodes[node]
+        while True:
+            if not entry["queue"]:
+                if self.unclaimed:
+                    entry["queue"].append(self.unclaimed.popleft())
+                elif not self._steal(node):
+                    break
+            shard_id = entry["queue"].popleft()
+            shard = self.shards[shard_id]
+            if not shard["tasks"]:
+                # Every run already came back from an earlier claim
+                shard["status"] = "done"
+                continue
+            shard.update(status="running", node=node, claims=shard["claims"] + 1)
+            entry["running"].add(shard_id)
+            entry["shards"] += 1
+            return {"type": "shard", "shard": shard_id, "tasks": list(shard["tasks"].values())}
+        self._check_finished()
+        return {"type": "done"} if self.finished.is_set() else {"type": "wait", "retry_s": WAIT_S}
+
+    def _record(self, message: dict):
+        record = message["record"]
+        shard = self.shards.get(message.get("shard"))
+        if shard is not None:
+            shard["tasks"].pop(record["run_id"], None)
+        if record["run_id"] in self.records:
+            self.stats["duplicate_records"] += 1
+            return
+        self.records[record["run_id"]] = record
+        self.checkpoint.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.checkpoint.flush()
+        status = "✅ PASS" if record["passed"] else "❌ FAIL"
+        print(f"{status} [{len(self.records)}] {message.get('node', '')} {record['collector_personality']}, "
+              f"${record['debt_amount']:,.0f} debt — {record['attempts']} attempt(s)")
+
+    def _shard_done(self, node: str, shard_id: str):
+        self.nodes[node]["running"].discard(shard_id)
+        shard = self.shards[shard_id]
+        if shard["node"] == node and shard["status"] == "running":
+            # Runs that raised were dropped from the shard; they are retried on --resume, as in sweep.py
+            shard["status"] = "done"
+        self._check_finished()
+
+    def lose(self, node: str, reason: str):
+        """Mark a node lost and queue the unfinished runs of its shards again."""
+        with self.lock:
+            entry = self.nodes.get(node)
+            if entry is None or not entry["alive"]:
+                return
+            entry.update(alive=False, lost=True)
+            self.stats["lost_nodes"] += 1
+            requeued = 0
+            for shard_id in sorted(entry["running"]):
+                shard = self.shards[shard_id]
+                if shard["status"] != "running" or shard["node"] != node:
+                    continue
+                if shard["claims"] >= MAX_SHARD_RETRIES:
+                    shard["status"] = "failed"
+                    self.stats["failed_shards"] += 1
+                    continue
+                shard.update(status="queued", node=None)
+                self.unclaimed.appendleft(shard_id)
+                self.stats["retried_shards"] += 1
+                requeued += 1
+            entry["running"].clear()
+            # Its queued shards go back too, for other nodes to pick up
+            self.unclaimed.extend(entry["queue"])
+            entry["queue"].clear()
+            print(f"💀 {node} lost ({reason}); {requeued} running shard(s) queued again")
+            self._check_finished()
+
+    def reap(self):
+        """Lose nodes whose last message is older than the heartbeat timeout."""
+        now = time.monotonic()
+        with self.lock:
+            stale = [name for name, entry in self.nodes.items()
+                     if entry["alive"] and now - entry["last_seen"] > HEARTBEAT_TIMEOUT_S]
+        for node in stale:
+            self.lose(node, f"no heartbeat for {HEARTBEAT_TIMEOUT_S:.0f}s")
+
+    def _check_finished(self):
+        if all(shard["status"] in ("done", "failed") for shard in self.shards.values()):
+            self.finished.set()
+
+    def close(self):
+        self.checkpoint.close()
+
+    def report(self) -> dict:
+        with self.lock:
+            elapsed = time.perf_counter() - self.start
+            runs = sum(entry["runs"] for entry in self.nodes.values())
+            return {
+                **self.stats,
+                "shards": len(self.shards),
+                "runs": runs,
+                "records": len(self.records),
+                "elapsed_s": round(elapsed, 3),
+                "runs_per_min": round(runs / elapsed * 60, 1) if elapsed else None,
+                "nodes": {name: {"runs": entry["runs"], "shards": entry["shards"], "lost": entry["lost"]}
+                          for name, entry in self.nodes.items()},
+            }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        node = None
+        try:
+            while True:
+                message = _receive(self.rfile)
+                node = message.get("node", node)
+                _send(self.wfile, coordinator.handle(node, message))
+                if message.get("type") == "bye":
+                    return
+        except (ConnectionError, OSError, ValueError):
+            if node:
+                coordinator.lose(node, "connection closed")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(coordinator: Coordinator, host: str = "127.0.0.1", port: int = DEFAULT_PORT, on_listen=None) -> dict:
+    """Run the coordinator until every shard is done or failed; returns its report."""
+    with _Server((host, port), _Handler) as server:
+        server.coordinator = coordinator
+        print(f"🛰️  Coordinator on {server.server_address[0]}:{server.server_address[1]}, "
+              f"{len(coordinator.shards)} shard(s)")
+        if on_listen:
+            on_listen(server.server_address)
+        thread = threading.Thread(target=server.serve_forever, name="cluster-server", daemon=True)
+        thread.start()
+        while not coordinator.finished.wait(HEARTBEAT_S / 2):
+            coordinator.reap()
+        # Give waiting nodes a poll interval to hear "done" before the socket closes
+        time.sleep(WAIT_S * 2)
+        server.shutdown()
+    coordinator.close()
+    return coordinator.report()
+
+
+class WorkerNode:
+    """Connects to a coordinator and runs the shards it is given across a local process pool."""
+
+    def __init__(self, address: tuple, processes: int = 4, name: str = None):
+        self.address = address
+        self.processes = processes
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.lock = threading.Lock()  # One request/response on the connection at a time
+        self.stopped = threading.Event()
+
+    def _call(self, message: dict) -> dict:
+        with self.lock:
+            _send(self.stream, {**message, "node": self.name})
+            return _receive(self.stream)
+
+    def _hello(self):
+        reply = self._call({"type": "hello", "processes": self.processes, "token": CLUSTER_TOKEN})
+        if reply["type"] != "welcome":
+            raise RuntimeError(f"coordinator refused {self.name}: {reply.get('error')}")
+
+    def _heartbeat_loop(self):
+        while not self.stopped.wait(HEARTBEAT_S):
+            try:
+                self._call({"type": "heartbeat"})
+            except (ConnectionError, OSError):
+                return
+
+    def run(self) -> int:
+        """Run shards until the coordinator says the sweep is done; returns the runs completed."""
+        completed = 0
+        with socket.create_connection(self.address) as sock, \
+                ProcessPoolExecutor(max_workers=self.processes) as executor:
+            self.stream = sock.makefile("rwb")
+            self._hello()
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="cluster-heartbeat", daemon=True)
+            heartbeat.start()
+            try:
+                while True:
+                    reply = self._call({"type": "next"})
+                    if reply["type"] == "done":
+                        break
+                    if reply["type"] == "lost":
+                        self._hello()
+                        continue
+                    if reply["type"] == "wait":
+                        time.sleep(reply.get("retry_s", WAIT_S))
+                        continue
+                    completed += self._run_shard(executor, reply["shard"], reply["tasks"])
+                self._call({"type": "bye"})
+            finally:
+                self.stopped.set()
+        return completed
+
+    def _run_shard(self, executor, shard_id: str, tasks: list) -> int:
+        futures = {executor.submit(sweep.run_one, task): task for task in tasks}
+        completed = 0
+        for future in as_completed(futures):
+            task = futures[future]
+            error = future.exception()
+            if error:
+                self._call({"type": "error", "shard": shard_id, "run_id": task["run_id"], "error": repr(error)})
+            else:
+                self._call({"type": "record", "shard": shard_id, "record": future.result()})
+                completed += 1
+        self._call({"type": "shard_done", "shard": shard_id})
+        return completed
+
+
+def _parse_address(value: str) -> tuple:
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _sweep_tasks(args) -> tuple:
+    """(tasks, already-done records) for the sweep the arguments describe, as sweep.py builds them."""
+    grid = sweep.DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid = {**sweep.DEFAULT_GRID, **json.load(f)}
+    sweep.prepare_checkpoint(args.checkpoint, args.resume, args.fresh)
+    scenarios = sweep.sample_grid(grid, args.sample, args.seed) if args.sample else sweep.expand_grid(grid)
+    done = sweep.load_checkpoint(args.checkpoint)
+    tasks = sweep.build_tasks(scenarios, args.repeats, done, args.max_attempts, args.turns)
+    print(f"🧮 Sweep: {len(scenarios)} scenarios × {args.repeats} repeats, {len(done)} already done, "
+          f"{len(tasks)} to run in shards of {args.shard_size}")
+    return tasks, done
+
+
+def _finish(report: dict, coordinator: Coordinator, output: str):
+    columns = sweep.summarize(list(coordinator.records.values()))
+    sweep.write_columnar(columns, output)
+    print("=" * 60)
+    print("🛰️  CLUSTER SWEEP")
+    print("=" * 60)
+    print(f"{report['runs']} runs in {report['elapsed_s']}s ({report['runs_per_min']} runs/min) "
+          f"over {len(report['nodes'])} node(s), {report['shards']} shard(s)")
+    for name, entry in report["nodes"].items():
+        print(f"  {name:<28} {entry['runs']:>5} runs {entry['shards']:>4} shards"
+              f"{'  (lost)' if entry['lost'] else ''}")
+    print(f"🪝 {report['steals']} steal(s) moved {report['stolen_shards']} shard(s); {report['lost_nodes']} node(s) "
+          f"lost, {report['retried_shards']} shard(s) retried, {report['failed_shards']} failed, "
+          f"{report['duplicate_records']} duplicate record(s) dropped, {report['run_errors']} run error(s)")
+    print(f"📊 Wrote {len(columns['runs'])} cells to {output}")
+
+
+def _add_sweep_args(parser):
+    parser.add_argument("--grid", help="JSON file mapping parameter name to list of values")
+    parser.add_argument("--sample", type=int, help="Sample this many cells instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per cell")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--shard-size", type=int, default=4, help="Runs per shard")
+    parser.add_argument("--checkpoint", default=sweep.DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--output", default=sweep.DEFAULT_RESULTS_PATH)
+    parser.add_argument("--resume", action="store_true", help="Keep runs already in the checkpoint file")
+    parser.add_argument("--fresh", action="store_true", help="Delete an existing checkpoint file and start over")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (0.0.0.0 for other machines)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard scenario sweeps across worker nodes.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    _add_sweep_args(sub.add_parser("coordinator", help="Serve a sweep's shards to worker nodes"))
+    worker_parser = sub.add_parser("worker", help="Run shards from a coordinator")
+    worker_parser.add_argument("--connect", default=f"127.0.0.1:{DEFAULT_PORT}", help="Coordinator host:port")
+    worker_parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    worker_parser.add_argument("--name", help="Node name in the coordinator's report")
+    local_parser = sub.add_parser("local", help="Coordinator plus worker node processes on this machine")
+    _add_sweep_args(local_parser)
+    local_parser.add_argument("--nodes", type=int, default=3)
+    local_parser.add_argument("--processes", type=int, default=2, help="Processes per node")
+    local_parser.add_argument("--kill-after", type=float,
+                              help="Kill one node this many seconds in, to exercise lost-shard retry")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        runs = WorkerNode(_parse_address(args.connect), args.processes, args.name).run()
+        print(f"✅ {runs} run(s) completed")
+        return
+
+    tasks, done = _sweep_tasks(args)
+    coordinator = Coordinator(tasks, args.shard_size, args.checkpoint, done)
+    if args.command == "coordinator":
+        _finish(serve(coordinator, args.host, args.port), coordinator, args.output)
+        return
+
+    # Worker nodes are separate processes on localhost, standing in for machines
+    nodes = []
+
+    def start_nodes(address):
+        for index in range(args.nodes):
+            nodes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "worker", "--connect", f"{address[0]}:{address[1]}",
+                 "--processes", str(args.processes), "--name", f"node-{index}"],
+                stdout=subprocess.DEVNULL, start_new_session=True,
+            ))
+        if args.kill_after:
+            # The node's whole process group, pool workers included, as if its machine went down
+            threading.Timer(args.kill_after, os.killpg, (nodes[0].pid, signal.SIGKILL)).start()
+
+    try:
+        report = serve(coordinator, args.host, 0 if args.port == DEFAULT_PORT else args.port, start_nodes)
+    finally:
+        for node in nodes:
+            try:
+                node.wait(timeout=WAIT_S * 4)
+            except subprocess.TimeoutExpired:
+                node.kill()
+    _finish(report, coordinator, args.output)
+
+
+if __name__ == "__main__":
+    main()
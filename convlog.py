@@ -0,0 +1,326 @@
+"""
+Compact binary conversation archive.
+
+Stores many conversation logs in one file: every message's text is appended
+once to a UTF-8 blob, roles are interned to 1-byte codes, and fixed-width
+offset columns point into the blob. Archives are opened with mmap, so
+conversations and turns are decoded only when accessed, and the judge-format
+JSON is rendered only on demand.
+
+File layout (little-endian):
+    header   magic b"RVCL", version u16
+    blob     concatenated UTF-8 message text
+    roles    u8 role code per turn
+    offsets  u64 byte offset per turn into the blob, plus a final end offset
+    convs    u64 first turn index per conversation, plus a final end index
+    table    JSON list of role strings (index = role code)
+    footer   u64 offsets of each section + counts, then magic b"RVCL"
+
+Usage:
+    python convlog.py pack conversations.jsonl archive.rvcl
+    python convlog.py bench --conversations 20000
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+MAGIC = b"RVCL"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+# roles_pos, offsets_pos, convs_pos, table_pos, table_len, num_turns, num_convs, magic
+FOOTER = struct.Struct("<7Q4s")
+
+# Roles seen in app.py and main.py logs get stable low codes
+DEFAULT_ROLES = ["Debt Collector Agent", "customer", "collector"]
+
+
+class Turn:
+    """One message in a conversation."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class ArchiveWriter:
+    """Write conversations to a new archive file.
+
+    Identical conversations are stored once; add() returns the index of the
+    stored copy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.blob_pos = 0
+        self.roles = array("B")
+        self.offsets = array("Q")
+        self.conv_starts = array("Q")
+        self.role_codes = {role: code for code, role in enumerate(DEFAULT_ROLES)}
+        self.seen = {}
+
+    def add(self, conversation_log: list) -> int:
+        """Append one conversation (list of {"role", "content"} dicts)."""
+        digest = hashlib.sha1(
+            json.dumps(conversation_log, separators=(",", ":")).encode("utf-8")
+        ).digest()
+        if digest in self.seen:
+            return self.seen[digest]
+
+        self.conv_starts.append(len(self.roles))
+        for msg in conversation_log:
+            role = msg["role"]
+            if role not in self.role_codes:
+                if len(self.role_codes) >= 256:
+                    raise ValueError("Archive supports at most 256 distinct roles")
+                self.role_codes[role] = len(self.role_codes)
+            data = msg["content"].encode("utf-8")
+            self.roles.append(self.role_codes[role])
+            self.offsets.append(self.blob_pos)
+            self.file.write(data)
+            self.blob_pos += len(data)
+
+        index = len(self.conv_starts) - 1
+        self.seen[digest] = index
+        return index
+
+    def close(self):
+        """Write the column sections and footer."""
+        num_turns = len(self.roles)
+        num_convs = len(self.conv_starts)
+        self.offsets.append(self.blob_pos)
+        self.conv_starts.append(num_turns)
+
+        roles_pos = self.file.tell()
+        self.file.write(self.roles.tobytes())
+        self.file.write(b"\0" * (-self.file.tell() % 8))  # Align the u64 columns
+        offsets_pos = self.file.tell()
+        self.file.write(self.offsets.tobytes())
+        convs_pos = self.file.tell()
+        self.file.write(self.conv_starts.tobytes())
+        table = json.dumps(sorted(self.role_codes, key=self.role_codes.get)).encode("utf-8")
+        table_pos = self.file.tell()
+        self.file.write(table)
+        self.file.write(FOOTER.pack(roles_pos, offsets_pos, convs_pos, table_pos, len(table),
+                                    num_turns, num_convs, MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConversationView:
+    """Lazy, list-like view of one archived conversation."""
+
+    __slots__ = ("archive", "first", "last")
+
+    def __init__(self, archive: "ConversationArchive", first: int, last: int):
+        self.archive = archive
+        self.first = first
+        self.last = last
+
+    def __len__(self):
+        return self.last - self.first
+
+    def __getitem__(self, index: int) -> Turn:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("turn index out of range")
+        return self.archive.turn(self.first + index)
+
+    def __iter__(self):
+        for i in range(self.first, self.last):
+            yield self.archive.turn(i)
+
+    def to_log(self) -> list:
+        """Decode into the in-memory conversation_log format (list of dicts)."""
+        return [turn.to_dict() for turn in self]
+
+    def to_judge_json(self) -> str:
+        """Render the JSON that judge_conversation / optimize_prompt send to the model."""
+        return json.dumps(self.to_log(), indent=2)
+
+
+class ConversationArchive:
+    """Memory-mapped, read-only archive of conversations."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} conversation archive")
+        (roles_pos, offsets_pos, convs_pos, table_pos, table_len,
+         num_turns, num_convs, magic) = FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is truncated (missing footer)")
+
+        view = memoryview(self.mm)
+        self.roles = view[roles_pos:roles_pos + num_turns]
+        self.offsets = view[offsets_pos:offsets_pos + 8 * (num_turns + 1)].cast("Q")
+        self.conv_starts = view[convs_pos:convs_pos + 8 * (num_convs + 1)].cast("Q")
+        self.role_names = json.loads(bytes(view[table_pos:table_pos + table_len]))
+        self.blob_start = HEADER.size
+        self.num_turns = num_turns
+
+    def __len__(self):
+        return len(self.conv_starts) - 1
+
+    def __getitem__(self, index: int) -> ConversationView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("conversation index out of range")
+        return ConversationView(self, self.conv_starts[index], self.conv_starts[index + 1])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def turn(self, index: int) -> Turn:
+        start = self.blob_start + self.offsets[index]
+        end = self.blob_start + self.offsets[index + 1]
+        return Turn(self.role_names[self.roles[index]], self.mm[start:end].decode("utf-8"))
+
+    def close(self):
+        # Release exported memoryviews before closing the map
+        self.roles.release()
+        self.offsets.release()
+        self.conv_starts.release()
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pack_jsonl(src: str, dest: str) -> int:
+    """Pack a JSONL file of conversations into an archive; returns conversations stored."""
+    with open(src, "r", encoding="utf-8") as f, ArchiveWriter(dest) as writer:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            # Accept bare conversation lists or run records with a conversation_log field
+            writer.add(record["conversation_log"] if isinstance(record, dict) else record)
+        return len(writer.conv_starts)
+
+
+def _synthetic_logs(num_conversations: int, turns: int = 11) -> list:
+    """Conversation logs shaped like the web app's (collector first, alternating roles)."""
+    lines = [
+        "I understand this is a difficult time, and I'm sorry to hear about your job.",
+        "I only have $400 in my account and I can't pay the full amount right now.",
+        "Would a plan of $100 per month starting next week work for you?",
+        "Okay, I can manage $100 a month if we can start after my next check.",
+    ]
+    logs = []
+    for c in range(num_conversations):
+        log = []
+        for t in range(turns):
+            role = "Debt Collector Agent" if t % 2 == 0 else "customer"
+            log.append({"role": role, "content": f"{lines[t % len(lines)]} (ref {c}-{t})"})
+        logs.append(log)
+    return logs
+
+
+def benchmark(num_conversations: int = 20000):
+    """Compare memory per turn and load time: JSON dict-of-strings vs. archive."""
+    logs = _synthetic_logs(num_conversations)
+    num_turns = sum(len(log) for log in logs)
+    tmp = tempfile.mkdtemp()
+    json_path = os.path.join(tmp, "logs.json")
+    archive_path = os.path.join(tmp, "logs.rvcl")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(logs, f)
+    with ArchiveWriter(archive_path) as writer:
+        for log in logs:
+            writer.add(log)
+    del logs
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        loaded = json.load(f)
+    json_load_s = time.perf_counter() - start
+    json_bytes = tracemalloc.get_traced_memory()[0]
+    del loaded
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    archive = ConversationArchive(archive_path)
+    archive_open_s = time.perf_counter() - start
+    archive_bytes = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    judge_json = archive[len(archive) // 2].to_judge_json()
+    render_s = time.perf_counter() - start
+    tracemalloc.stop()
+
+    # Fully materialized: every turn decoded into a __slots__ Turn object
+    tracemalloc.start()
+    decoded = [list(conversation) for conversation in archive]
+    decoded_bytes = tracemalloc.get_traced_memory()[0]
+    del decoded
+    tracemalloc.stop()
+    archive.close()
+
+    print("=" * 60)
+    print("📦 CONVERSATION ARCHIVE BENCHMARK")
+    print("=" * 60)
+    print(f"Conversations: {num_conversations:,}  Turns: {num_turns:,}")
+    print(f"File size     JSON: {os.path.getsize(json_path):>12,} B   archive: {os.path.getsize(archive_path):>12,} B")
+    # The archive's text lives in mmap'd page cache, not on the Python heap
+    print(f"Heap/turn     JSON: {json_bytes / num_turns:>12,.1f} B   archive: {archive_bytes / num_turns:>12,.1f} B (mmap)")
+    print(f"Decoded/turn  dict: {json_bytes / num_turns:>12,.1f} B   Turn:    {decoded_bytes / num_turns:>12,.1f} B")
+    print(f"Load time     JSON: {json_load_s * 1000:>12,.1f} ms  archive: {archive_open_s * 1000:>12,.3f} ms")
+    print(f"Judge JSON for one conversation rendered on demand in {render_s * 1000:.3f} ms ({len(judge_json)} chars)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact binary conversation archives.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Pack a JSONL file of conversation logs into an archive")
+    pack.add_argument("src")
+    pack.add_argument("dest")
+    show = sub.add_parser("show", help="Print one conversation in judge JSON format")
+    show.add_argument("archive")
+    show.add_argument("index", type=int)
+    bench = sub.add_parser("bench", help="Benchmark against the dict-of-strings representation")
+    bench.add_argument("--conversations", type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack_jsonl(args.src, args.dest)
+        print(f"📦 Stored {count} conversation(s) in {args.dest}")
+    elif args.command == "show":
+        with ConversationArchive(args.archive) as archive:
+            sys.stdout.write(archive[args.index].to_judge_json() + "\n")
+    else:
+        benchmark(args.conversations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Sequential pass-rate evaluation for a collector prompt.
+
+One judged conversation is a single noisy sample of a prompt's pass rate. This
+runs a fixed candidate prompt (no optimization) against repeated or varied
+defaulter simulations across a process pool and stops as soon as the pass
+rate is confidently above or below a threshold:
+
+    sprt  Wald's sequential probability ratio test of p <= threshold - delta
+          against p >= threshold + delta, with error rates alpha and beta
+    ci    anytime-valid Hoeffding confidence sequence; stops when the interval
+          excludes the threshold (no indifference region, so it is slower
+          than SPRT but makes no assumption about how far off the rate is)
+
+The sample budget defaults to DEFAULT_MAX_SAMPLES for SPRT. For the confidence
+sequence it is derived from delta: the sample count at which the interval's
+half-width shrinks to CI_BUDGET_WIDTH × delta, so a rate delta away from the
+threshold is decided with high probability before the budget runs out. An
+explicit budget too small for the interval ever to get narrower than delta
+is reported as a warning.
+
+Outcomes are fed to the test in submission order, so a decision never depends
+on which simulations happened to finish first. The report compares the
+samples used with the fixed sample size a one-shot binomial test would need
+for the same alpha, beta and delta. Every sample is appended to --output.
+
+Usage:
+    python evaluate.py --prompt-file candidate.txt --threshold 0.7 --workers 8
+    python evaluate.py --threshold 0.6 --method ci --repeat
+    python evaluate.py simulate --true-rate 0.8 --threshold 0.6 --trials 2000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import statistics
+import time
+
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_DELTA = 0.1     # Half-width of the indifference region around the threshold
+DEFAULT_ALPHA = 0.05    # P(deciding "above" when the rate is threshold - delta)
+DEFAULT_BETA = 0.05     # P(deciding "below" when the rate is threshold + delta)
+DEFAULT_MAX_SAMPLES = 200  # SPRT; the confidence sequence's budget is derived from delta
+CI_BUDGET_WIDTH = 0.75     # Interval half-width, as a fraction of delta, the derived CI budget reaches
+METHODS = ("sprt", "ci")
+
+# Defaulter parameters varied between samples (values match the web form)
+VARIED = {
+    "months_overdue": [1, 3, 6, 12],
+    "available_funds": [100, 400, 1000],
+}
+
+
+def _hypotheses(threshold: float, delta: float) -> tuple:
+    p0 = min(max(threshold - delta, 1e-6), 1 - 1e-6)
+    p1 = min(max(threshold + delta, 1e-6), 1 - 1e-6)
+    return p0, p1
+
+
+def fixed_sample_size(threshold: float, delta: float = DEFAULT_DELTA,
+                      alpha: float = DEFAULT_ALPHA, beta: float = DEFAULT_BETA) -> int:
+    """Samples a one-sided fixed-N binomial test needs to separate threshold ± delta."""
+    p0, p1 = _hypotheses(threshold, delta)
+    normal = statistics.NormalDist()
+    z_alpha, z_beta = normal.inv_cdf(1 - alpha), normal.inv_cdf(1 - beta)
+    n = (z_alpha * math.sqrt(p0 * (1 - p0)) + z_beta * math.sqrt(p1 * (1 - p1))) / (p1 - p0)
+    return math.ceil(n * n)
+
+
+def ci_half_width(n: int, alpha: float = DEFAULT_ALPHA, beta: float = DEFAULT_BETA) -> float:
+    """Half-width of the anytime-valid Hoeffding interval after n samples."""
+    alpha_n = 6 * min(alpha, beta) / (math.pi ** 2 * n ** 2)
+    return math.sqrt(math.log(2 / alpha_n) / (2 * n))
+
+
+def ci_sample_budget(delta: float = DEFAULT_DELTA, alpha: float = DEFAULT_ALPHA, beta: float = DEFAULT_BETA,
+                     width: float = CI_BUDGET_WIDTH) -> int:
+    """Fewest samples for which the confidence sequence's half-width is at most width × delta."""
+    target = width * delta
+    # The half-width only shrinks with n: double past the target, then bisect
+    high = 1
+    while ci_half_width(high, alpha, beta) > target:
+        high *= 2
+    low = high // 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if ci_half_width(middle, alpha, beta) > target:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+class SequentialTest:
+    """Pass/fail outcomes in, an "above" / "below" decision out as soon as the evidence allows."""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, delta: float = DEFAULT_DELTA,
+                 alpha: float = DEFAULT_ALPHA, beta: float = DEFAULT_BETA,
+                 method: str = "sprt", max_samples: int = None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method: {method}")
+        if max_samples is None:
+            max_samples = ci_sample_budget(delta, alpha, beta) if method == "ci" else DEFAULT_MAX_SAMPLES
+        self.threshold = threshold
+        self.delta = delta
+        self.alpha = alpha
+        self.beta = beta
+        self.method = method
+        self.max_samples = max_samples
+        self.p0, self.p1 = _hypotheses(threshold, delta)
+        self.upper_llr = math.log((1 - beta) / alpha)
+        self.lower_llr = math.log(beta / (1 - alpha))
+        self.n = 0
+        self.passes = 0
+        self.llr = 0.0
+        self.decision = None
+
+    def interval(self) -> tuple:
+        """Anytime-valid (lower, upper) bound on the pass rate after the samples so far.
+
+        Hoeffding's bound with the error budget spread over every possible
+        stopping point (alpha_n = 6 alpha / (pi^2 n^2)), so checking after
+        each sample does not inflate the error rate.
+        """
+        if not self.n:
+            return 0.0, 1.0
+        width = ci_half_width(self.n, self.alpha, self.beta)
+        rate = self.passes / self.n
+        return max(0.0, rate - width), min(1.0, rate + width)
+
+    def budget_warning(self) -> str:
+        """Why the sample budget is too small for the confidence sequence to resolve delta, or None."""
+        if self.method != "ci":
+            return None
+        width = ci_half_width(self.max_samples, self.alpha, self.beta)
+        if width < self.delta:
+            return None
+        return (f"max_samples={self.max_samples} is too small for the confidence sequence: its interval is still "
+                f"±{width:.1%} wide at the budget, so rates within {width:.1%} of the threshold (delta is "
+                f"{self.delta:.1%}) usually end inconclusive; use ≥ {ci_sample_budget(self.delta, self.alpha, self.beta)} "
+                f"or --method sprt")
+
+    def add(self, passed: bool) -> str:
+        """Add one outcome; returns the decision ("above", "below", "inconclusive") or None to continue."""
+        if self.decision:
+            return self.decision
+        self.n += 1
+        self.passes += bool(passed)
+        if self.method == "sprt":
+            self.llr += math.log(self.p1 / self.p0) if passed else math.log((1 - self.p1) / (1 - self.p0))
+            if self.llr >= self.upper_llr:
+                self.decision = "above"
+            elif self.llr <= self.lower_llr:
+                self.decision = "below"
+        else:
+            lower, upper = self.interval()
+            if lower > self.threshold:
+                self.decision = "above"
+            elif upper < self.threshold:
+                self.decision = "below"
+        if self.decision is None and self.n >= self.max_samples:
+            self.decision = "inconclusive"
+        return self.decision
+
+    def report(self) -> dict:
+        lower, upper = self.interval()
+        fixed_n = fixed_sample_size(self.threshold, self.delta, self.alpha, self.beta)
+        return {
+            "method": self.method,
+            "decision": self.decision,
+            "threshold": self.threshold,
+            "delta": self.delta,
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "max_samples": self.max_samples,
+            "budget_warning": self.budget_warning(),
+            "samples": self.n,
+            "passes": self.passes,
+            "pass_rate": round(self.passes / self.n, 4) if self.n else None,
+            "interval": [round(lower, 4), round(upper, 4)],
+            "llr": round(self.llr, 4) if self.method == "sprt" else None,
+            "fixed_n": fixed_n,
+            "samples_saved": round(1 - self.n / fixed_n, 4) if fixed_n else 0.0,
+        }
+
+
+def sample_scenario(index: int, base: dict, seed: int = 0, repeat: bool = False) -> dict:
+    """Defaulter scenario for sample `index`: the base scenario, or a seeded variation of it."""
+    if repeat:
+        return dict(base)
+    rng = random.Random(f"{seed}:{index}")
+    return {**base, **{key: rng.choice(values) for key, values in VARIED.items()}}
+
+
+def evaluate_one(task: dict) -> dict:
+    """Run and judge one conversation with the candidate prompt in a worker process."""
+    import main  # Imported here so only worker processes build the API clients
+
+    scenario = task["scenario"]
+    defaulter_prompt = main.get_defaulter_prompt(
+        scenario["customer_name"], scenario["debt_amount"], scenario["months_overdue"], scenario["available_funds"]
+    )
+    tokens_before = dict(main.token_usage)
+    start = time.perf_counter()
+    # The CLI functions print every turn; keep worker output quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        conversation_log = main.run_conversation(task["num_turns"], task["prompt"], defaulter_prompt)
+        verdict = main.judge_conversation(conversation_log)
+    return {
+        "index": task["index"],
+        "passed": bool(verdict.get("pass")),
+        "parse_error": bool(verdict.get("parse_error")),
+        "feedback": verdict.get("feedback", ""),
+        **{key: scenario[key] for key in VARIED},
+        "prompt_tokens": main.token_usage["prompt_tokens"] - tokens_before["prompt_tokens"],
+        "completion_tokens": main.token_usage["completion_tokens"] - tokens_before["completion_tokens"],
+        "latency_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def evaluate(prompt: str, scenario: dict, test: SequentialTest, workers: int = 4, num_turns: int = 5,
+             seed: int = 0, repeat: bool = False, output_path: str = None) -> dict:
+    """Sample judged conversations in parallel until `test` reaches a decision; return its report.
+
+    At most `workers` samples are in flight, so a decision wastes at most
+    that many runs that had already started.
+    """
+    import sweep
+
+    tasks = (
+        {"index": index, "prompt": prompt, "num_turns": num_turns,
+         "scenario": sample_scenario(index, scenario, seed, repeat)}
+        for index in range(test.max_samples)
+    )
+    finished, next_index, errors, run = {}, 0, 0, 0
+    tokens = [0, 0]
+    start = time.perf_counter()
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+    results = sweep.run_bounded(evaluate_one, tasks, workers, max_pending=workers)
+    try:
+        for task, record, error in results:
+            if error:
+                # A failed simulation is neither a pass nor a fail, so it is skipped
+                errors += 1
+                finished[task["index"]] = None
+                print(f"❌ sample {task['index']}: {error}")
+            else:
+                run += 1
+                tokens[0] += record["prompt_tokens"]
+                tokens[1] += record["completion_tokens"]
+                finished[record["index"]] = record
+                if output:
+                    output.write(json.dumps(record, separators=(",", ":")) + "\n")
+            while next_index in finished and not test.decision:
+                record = finished.pop(next_index)
+                if record is not None:
+                    test.add(record["passed"])
+                next_index += 1
+            if test.decision:
+                break
+    finally:
+        results.close()
+        if output:
+            output.close()
+    # Only reachable undecided when errors used up the sample budget
+    test.decision = test.decision or "inconclusive"
+    report = test.report()
+    report.update(
+        runs=run,
+        overshoot=run - test.n,
+        errors=errors,
+        prompt_tokens=tokens[0],
+        completion_tokens=tokens[1],
+        elapsed_s=round(time.perf_counter() - start, 3),
+    )
+    return report
+
+
+def simulate(true_rate: float, trials: int = 1000, seed: int = 0, **test_kwargs) -> dict:
+    """Mean samples and decision shares of the test on Bernoulli(true_rate) outcomes."""
+    rng = random.Random(seed)
+    decisions = {"above": 0, "below": 0, "inconclusive": 0}
+    samples = []
+    for _ in range(trials):
+        test = SequentialTest(**test_kwargs)
+        while not test.add(rng.random() < true_rate):
+            pass
+        decisions[test.decision] += 1
+        samples.append(test.n)
+    fixed_n = fixed_sample_size(test.threshold, test.delta, test.alpha, test.beta)
+    return {
+        "true_rate": true_rate,
+        "method": test.method,
+        "mean_samples": round(statistics.fmean(samples), 1),
+        "max_samples": max(samples),
+        "sample_budget": test.max_samples,
+        "budget_warning": test.budget_warning(),
+        "fixed_n": fixed_n,
+        "samples_saved": round(1 - statistics.fmean(samples) / fixed_n, 4),
+        "decisions": {key: round(count / trials, 4) for key, count in decisions.items()},
+    }
+
+
+def _print_report(report: dict):
+    print("=" * 60)
+    print("📐 SEQUENTIAL PASS-RATE EVALUATION")
+    print("=" * 60)
+    icon = {"above": "✅", "below": "❌"}.get(report["decision"], "❔")
+    print(f"{icon} {report['decision'].upper()} threshold {report['threshold']:.0%} "
+          f"(±{report['delta']:.0%}, alpha {report['alpha']}, beta {report['beta']}, {report['method']})")
+    interval = ""
+    if report["method"] == "ci":
+        interval = f", anytime interval [{report['interval'][0]:.1%}, {report['interval'][1]:.1%}]"
+    print(f"Pass rate {report['pass_rate']:.1%} over {report['samples']} samples{interval}")
+    print(f"Samples: {report['samples']} used vs {report['fixed_n']} for a fixed-N test "
+          f"({report['samples_saved']:.0%} saved)")
+    if report["budget_warning"]:
+        print(f"⚠️  {report['budget_warning']}")
+    if "runs" in report:
+        print(f"Runs: {report['runs']} ({report['overshoot']} in flight at the decision, {report['errors']} errors), "
+              f"{report['prompt_tokens'] + report['completion_tokens']} tokens, {report['elapsed_s']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decide whether a collector prompt's pass rate clears a threshold.")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "simulate"])
+    parser.add_argument("--prompt-file", help="Candidate collector prompt (default: the generated prompt)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--delta", type=float, default=DEFAULT_DELTA)
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    parser.add_argument("--beta", type=float, default=DEFAULT_BETA)
+    parser.add_argument("--method", choices=METHODS, default="sprt")
+    parser.add_argument("--max-samples", type=int,
+                        help=f"Sample budget (default: {DEFAULT_MAX_SAMPLES} for sprt, derived from --delta for ci)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", action="store_true", help="Rerun one scenario instead of varying the defaulter")
+    parser.add_argument("--output", help="Append every sample to this JSONL file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--true-rate", type=float, default=0.8, help="simulate: pass rate of the simulated prompt")
+    parser.add_argument("--trials", type=int, default=1000, help="simulate: number of simulated evaluations")
+    args = parser.parse_args()
+
+    test_kwargs = {"threshold": args.threshold, "delta": args.delta, "alpha": args.alpha, "beta": args.beta,
+                   "method": args.method, "max_samples": args.max_samples}
+    if args.command == "simulate":
+        report = simulate(args.true_rate, args.trials, args.seed, **test_kwargs)
+        print(json.dumps(report, indent=2))
+        if report["budget_warning"]:
+            print(f"⚠️  {report['budget_warning']}")
+        return
+
+    import main as cli
+    scenario = {
+        "company_name": cli.DEFAULT_COMPANY_NAME,
+        "customer_name": cli.DEFAULT_CUSTOMER_NAME,
+        "debt_amount": cli.DEFAULT_DEBT_AMOUNT,
+        "months_overdue": cli.DEFAULT_MONTHS_OVERDUE,
+        "available_funds": cli.DEFAULT_CUSTOMER_FUNDS,
+    }
+    if args.prompt_file:
+        with open(args.prompt_file, "r", encoding="utf-8") as f:
+            prompt = f.read()
+    else:
+        prompt = cli.get_debt_collector_prompt(scenario["company_name"], scenario["customer_name"],
+                                               scenario["debt_amount"], cli.DEFAULT_COLLECTOR_PERSONALITY)
+
+    report = evaluate(prompt, scenario, SequentialTest(**test_kwargs), args.workers, args.turns,
+                      args.seed, args.repeat, args.output)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Output-length governor for collector and defaulter turns.
+
+The role prompts ask for 1-2 (collector) and 2-3 (defaulter) sentences of
+plain spoken dialogue, but every turn was allowed 256 completion tokens, and
+replies that ramble, add "(sighing)" stage directions, "[Your Name]"
+placeholders or "I'm ready to start the call" meta-statements both cost
+generation time and fail the judge, which costs a whole extra attempt.
+
+With OUTPUT_GOVERNOR=1 each turn is requested with a learned token budget
+and stop sequences that end the reply at a turn or paragraph boundary, and
+the streamed reply is cleaned as it arrives: artifacts are removed and the
+reply is cut at the role's sentence limit. The budget is the p95 token cost
+of recent cleaned replies for the role, plus headroom, learned from the
+samples appended to GOVERNOR_LOG_PATH, so it carries over between runs. Only
+the last WINDOW samples per role matter, so once the log passes COMPACT_LINES
+it is rewritten with just those. The stream is closed as soon as the reply
+reaches its sentence limit, so the rest is never generated.
+
+Usage:
+    python governor.py bench                # governed vs ungoverned runs on the stub provider
+    python governor.py bench --runs 40 --artifact-rate 0.3
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+
+
+def _parse_limits(spec: str) -> dict:
+    """Parse "collector=2,defaulter=3" into {"collector": 2, "defaulter": 3}."""
+    limits = {}
+    for part in spec.split(","):
+        role, _, value = part.partition("=")
+        if role.strip() and value.strip():
+            limits[role.strip()] = int(value)
+    return limits
+
+
+# Sentence limits match the role prompts
+MAX_SENTENCES = _parse_limits(os.getenv("GOVERNOR_SENTENCES", "collector=2,defaulter=3"))
+GOVERNOR_LOG_PATH = os.getenv("GOVERNOR_LOG_PATH", "governor.jsonl")
+DEFAULT_BUDGET = 256   # The old fixed max_completion_tokens, used until a role has history
+MIN_BUDGET = 48
+WINDOW = 200           # Recent samples per role the budget is learned from
+MIN_SAMPLES = 20
+COMPACT_LINES = 10 * WINDOW  # Log lines before it is compacted back to WINDOW samples per role
+HEADROOM = 1.3         # Budget = p95 of cleaned replies x HEADROOM
+
+# Generation stops where the model starts a new paragraph or speaks for the other side
+STOP_SEQUENCES = ["\n\n", "\nCustomer:", "\nAgent:", "\nDebt Collector:"]
+
+# Artifacts removed wherever they appear: stage directions and placeholders
+INLINE_ARTIFACTS = [
+    # (sighing), (long pause); only short alphabetic asides, so "(about $100/month)" is dialogue
+    re.compile(r"\((?:[a-z]+ ?){1,3}\)", re.IGNORECASE),
+    re.compile(r"\*[^*]+\*"),           # *sighs*
+    re.compile(r"\[[^\[\]]*\]"),        # [Your Name], [Company Name]
+]
+# Sentences dropped whole: statements about the role-play, not lines in it ("I'll start paying
+# next week" and "I'll do my best to pay" are dialogue and kept)
+META_SENTENCES = re.compile(
+    r"^(?:I'?m ready to\b|I'?ll (?:now )?(?:play|act as|respond as|stay in character)\b|"
+    r"I'?ll (?:now )?(?:begin|start) (?:the|this|our) (?:call|conversation|role-?play|scenario)\b|"
+    r"Here(?:'s| is) (?:my|the) (?:response|reply)\b|As (?:an? |the )?(?:AI|assistant|language model)\b)",
+    re.IGNORECASE,
+)
+SPEAKER_LABEL = re.compile(r"^\s*(?:Debt Collector|Collector|Agent|Customer|Defaulter|Assistant)\b[^:\n]{0,20}:\s+",
+                           re.IGNORECASE)
+_OPENERS = "([*"
+_CLOSERS = {"(": ")", "[": "]", "*": "*"}
+
+
+class ReplyCleaner:
+    """Incremental cleaner for one streamed reply.
+
+    feed() buffers text up to each sentence boundary (. ! ? followed by
+    whitespace, or a newline; never inside an open bracket or *action*),
+    cleans the finished sentence and keeps it. Once max_sentences are kept,
+    `done` is set and the rest is ignored.
+    """
+
+    def __init__(self, max_sentences: int = None):
+        self.max_sentences = max_sentences
+        self.sentences = []
+        self.buffer = ""
+        self.open = []          # Unclosed ( [ * in the buffer
+        self.at_boundary = False  # Buffer ends in . ! ? (a sentence end if whitespace follows)
+        self.artifacts = 0
+        self.dropped_chars = 0
+        self.done = False
+        self.capped = False     # Text arrived after the sentence limit and was dropped
+
+    def feed(self, text: str):
+        if self.done:
+            self.dropped_chars += len(text)
+            self.capped = self.capped or bool(text.strip())
+            return
+        for i, char in enumerate(text):
+            ends = not self.open and (char == "\n" or (self.at_boundary and char.isspace()))
+            self.at_boundary = False
+            if ends:
+                self._end_sentence()
+                if self.done:
+                    self.dropped_chars += len(text) - i
+                    self.capped = bool(text[i:].strip())
+                    return
+                continue
+            self.buffer += char
+            if self.open and char == _CLOSERS[self.open[-1]]:
+                self.open.pop()
+            elif char in _OPENERS:
+                self.open.append(char)
+            elif not self.open and char in ".!?":
+                self.at_boundary = True
+
+    def _end_sentence(self):
+        raw, self.buffer = self.buffer, ""
+        sentence = raw
+        if not self.sentences:
+            sentence = SPEAKER_LABEL.sub("", sentence, count=1)
+        for pattern in INLINE_ARTIFACTS:
+            sentence, count = pattern.subn("", sentence)
+            self.artifacts += count
+        sentence = re.sub(r"[ \t]{2,}", " ", sentence).strip()
+        if sentence and META_SENTENCES.match(sentence):
+            self.artifacts += 1
+            sentence = ""
+        # A sentence that was only an artifact, or only punctuation, is dropped
+        if not re.search(r"\w", sentence):
+            self.dropped_chars += len(raw)
+            return
+        self.dropped_chars += len(raw) - len(sentence)
+        self.sentences.append(sentence)
+        if self.max_sentences and len(self.sentences) >= self.max_sentences:
+            self.done = True
+
+    def finish(self, truncated: bool = False) -> str:
+        """The cleaned reply; a trailing fragment cut off by the token budget is dropped if anything else is kept."""
+        if self.buffer and not self.done:
+            if truncated and self.sentences:
+                self.dropped_chars += len(self.buffer)
+                self.buffer = ""
+            else:
+                self.open = []
+                self._end_sentence()
+        return " ".join(self.sentences)
+
+
+class Governor:
+    """Per-role token budgets learned from cleaned reply lengths, plus stream cleaning."""
+
+    def __init__(self, log_path: str = None, max_sentences: dict = None):
+        self.log_path = GOVERNOR_LOG_PATH if log_path is None else log_path
+        self.max_sentences = dict(MAX_SENTENCES if max_sentences is None else max_sentences)
+        self.samples = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.log_lines = 0
+        self._load()
+
+    def _read_log(self) -> list:
+        entries = []
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Torn final line from an interrupted write
+        return entries
+
+    def _load(self):
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        entries = self._read_log()
+        for entry in entries:
+            self.samples.setdefault(entry["role"], deque(maxlen=WINDOW)).append(entry["tokens"])
+        self.log_lines = len(entries)
+        if self.log_lines > COMPACT_LINES:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only the last WINDOW samples per role.
+
+        Re-read from disk so samples appended by other processes are kept; one
+        appended between the read and the replace is lost, which only drops a
+        sample from a rolling estimate.
+        """
+        entries = self._read_log()
+        keep, seen = [], {}
+        for entry in reversed(entries):
+            seen[entry["role"]] = seen.get(entry["role"], 0) + 1
+            if seen[entry["role"]] <= WINDOW:
+                keep.append(entry)
+        directory = os.path.dirname(os.path.abspath(self.log_path))
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as f:
+            for entry in reversed(keep):
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(f.name, self.log_path)
+        self.log_lines = len(keep)
+
+    def budget(self, role: str) -> int:
+        """max_completion_tokens for the next reply in role."""
+        with self.lock:
+            samples = sorted(self.samples.get(role, ()))
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_BUDGET
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        return max(MIN_BUDGET, min(DEFAULT_BUDGET, math.ceil(p95 * HEADROOM)))
+
+    def request_options(self, role: str) -> dict:
+        """Extra chat-completion arguments for a governed reply."""
+        return {"max_completion_tokens": self.budget(role), "stop": STOP_SEQUENCES}
+
+    def consume(self, role: str, stream, budget: int, prompt_chars: int = 0) -> tuple:
+        """Read a streamed Groq reply; returns (cleaned text, (prompt_tokens, completion_tokens) or None).
+
+        Reading stops and the stream is closed once the reply reaches the
+        role's sentence limit. Groq sends usage only with the last chunk, so
+        for a reply stopped early the tokens are estimated (4 characters per
+        token, prompt_chars for the request).
+        """
+        cleaner = ReplyCleaner(self.max_sentences.get(role))
+        usage, finish_reason, raw_chars = None, None, 0
+        try:
+            for chunk in stream:
+                if chunk.x_groq and chunk.x_groq.usage:
+                    usage = (chunk.x_groq.usage.prompt_tokens, chunk.x_groq.usage.completion_tokens)
+                if chunk.choices:
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        raw_chars += len(content)
+                        cleaner.feed(content)
+                if cleaner.done:
+                    break
+        finally:
+            stream.close()
+        stopped_early = cleaner.done and finish_reason is None
+        if usage is None and stopped_early:
+            usage = (max(1, prompt_chars // 4), max(1, raw_chars // 4))
+        text = cleaner.finish(truncated=finish_reason == "length")
+        self.record(role, text, raw_chars, usage, cleaner, budget, finish_reason == "length", stopped_early)
+        return text, usage
+
+    def record(self, role: str, text: str, raw_chars: int, usage, cleaner: ReplyCleaner, budget: int,
+               truncated: bool, stopped_early: bool = False):
+        completion_tokens = usage[1] if usage else max(1, raw_chars // 4)
+        # Tokens the kept text cost, which is what the budget has to cover
+        kept_tokens = round(completion_tokens * len(text) / raw_chars) if raw_chars else 0
+        with self.lock:
+            self.samples.setdefault(role, deque(maxlen=WINDOW)).append(kept_tokens)
+            stats = self.stats.setdefault(role, {
+                "calls": 0, "completion_tokens": 0, "kept_tokens": 0, "budget_tokens": 0,
+                "artifacts": 0, "cleaned_replies": 0, "sentence_capped": 0, "budget_truncated": 0,
+                "stopped_early": 0,
+            })
+            stats["calls"] += 1
+            stats["completion_tokens"] += completion_tokens
+            stats["kept_tokens"] += kept_tokens
+            stats["budget_tokens"] += budget
+            stats["artifacts"] += cleaner.artifacts
+            stats["cleaned_replies"] += 1 if cleaner.dropped_chars else 0
+            stats["sentence_capped"] += 1 if cleaner.capped else 0
+            stats["budget_truncated"] += 1 if truncated else 0
+            stats["stopped_early"] += 1 if stopped_early else 0
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"role": role, "tokens": kept_tokens}, separators=(",", ":")) + "\n")
+                self.log_lines += 1
+                if self.log_lines > COMPACT_LINES:
+                    self._compact()
+
+    def report(self) -> dict:
+        """Per role: current budget, tokens generated vs kept, and how often replies were cleaned or cut."""
+        with self.lock:
+            stats = {role: dict(entry) for role, entry in self.stats.items()}
+        report = {}
+        for role, entry in stats.items():
+            calls = entry["calls"]
+            report[role] = {
+                **entry,
+                "budget": self.budget(role),
+                "max_sentences": self.max_sentences.get(role),
+                "mean_completion_tokens": round(entry["completion_tokens"] / calls, 1),
+                # Reserved per call below the old fixed 256-token cap
+                "budget_tokens_saved": DEFAULT_BUDGET * calls - entry["budget_tokens"],
+                # Generated tokens kept out of the conversation history (and every later prompt)
+                "discarded_tokens": entry["completion_tokens"] - entry["kept_tokens"],
+            }
+        return report
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> Governor:
+    """Process-wide governor, loaded from GOVERNOR_LOG_PATH (read from the environment) on first use."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = Governor(os.getenv("GOVERNOR_LOG_PATH", GOVERNOR_LOG_PATH))
+        return _governor
+
+
+def bench(runs: int, num_turns: int = 5, max_attempts: int = 3) -> dict:
+    """The same scenarios run ungoverned and governed against the stub provider."""
+    import contextlib
+    import io
+    import governor
+    import main
+
+    results = {}
+    for name, enabled in (("ungoverned", False), ("governed", True)):
+        main.OUTPUT_GOVERNOR_ENABLED = enabled
+        totals = {"runs": 0, "passed": 0, "attempts": 0, "prompt_tokens": 0, "completion_tokens": 0, "turns": 0}
+        for index in range(runs):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = main.run_scenario(
+                    personality="polite but persistent", company_name=main.DEFAULT_COMPANY_NAME,
+                    customer_name=main.DEFAULT_CUSTOMER_NAME, debt_amount=1000 + 100 * index,
+                    months_overdue=main.DEFAULT_MONTHS_OVERDUE, available_funds=main.DEFAULT_CUSTOMER_FUNDS,
+                    max_attempts=max_attempts, num_turns=num_turns,
+                )
+            totals["runs"] += 1
+            totals["passed"] += result["passed"]
+            totals["attempts"] += result["attempts"]
+            totals["prompt_tokens"] += result["prompt_tokens"]
+            totals["completion_tokens"] += result["completion_tokens"]
+            totals["turns"] += len(result["turn_latencies_s"])
+        results[name] = {
+            "pass_rate": round(totals["passed"] / runs, 3),
+            "mean_attempts": round(totals["attempts"] / runs, 3),
+            "mean_tokens": round((totals["prompt_tokens"] + totals["completion_tokens"]) / runs, 1),
+            "completion_tokens_per_turn": round(totals["completion_tokens"] / max(1, totals["turns"]), 1),
+        }
+    # main.py uses the imported module, not this script's __main__
+    results["governor"] = governor.get_governor().report()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output-length governor utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="Governed vs ungoverned runs against the local stub provider")
+    bench_parser.add_argument("--runs", type=int, default=40)
+    bench_parser.add_argument("--turns", type=int, default=5)
+    bench_parser.add_argument("--artifact-rate", type=float, default=0.1,
+                              help="Share of stub replies that ramble or carry stage directions/placeholders")
+    args = parser.parse_args()
+
+    # Must be set before main is imported
+    scratch = tempfile.mkdtemp(prefix="governor-bench-")
+    os.environ.update({
+        "PROVIDER_STUB": "1",
+        "STUB_LATENCY_MS": "0",
+        "STUB_ARTIFACT_RATE": str(args.artifact_rate),
+        "PROMPT_LIBRARY": "0",
+        "GOVERNOR_LOG_PATH": os.path.join(scratch, "governor.jsonl"),
+    })
+
+    results = bench(args.runs, args.turns)
+    print("=" * 60)
+    print("✂️  OUTPUT GOVERNOR BENCHMARK")
+    print("=" * 60)
+    print(f"{args.runs} runs, {args.artifact_rate:.0%} of stub replies overlong or with artifacts")
+    print(f"\n{'':<12}{'pass':>7}{'attempts':>10}{'tokens/run':>12}{'out/turn':>10}")
+    for name in ("ungoverned", "governed"):
+        row = results[name]
+        print(f"{name:<12}{row['pass_rate']:>7.0%}{row['mean_attempts']:>10}{row['mean_tokens']:>12}"
+              f"{row['completion_tokens_per_turn']:>10}")
+    before, after = results["ungoverned"], results["governed"]
+    print(f"\nSaved {1 - after['mean_tokens'] / before['mean_tokens']:.1%} of tokens per run and "
+          f"{before['mean_attempts'] - after['mean_attempts']:.2f} attempts per run")
+    for role, entry in results["governor"].items():
+        print(f"  {role:<10} budget {entry['budget']} tokens, {entry['artifacts']} artifacts removed, "
+              f"{entry['sentence_capped']} replies capped, {entry['discarded_tokens']} tokens discarded")
+
+
+if __name__ == "__main__":
+    main()
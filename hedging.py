@@ -0,0 +1,269 @@
+"""
+Hedged chat completions for collector and defaulter turns.
+
+Every turn waits on the one before it, so a single slow completion stalls the
+whole conversation (and the streamed page). With HEDGE_REQUESTS=1 a turn that
+has not returned by its deadline, the p90 of that role's recent latencies, is
+sent a second time: to the same model, or to the alternate named for it in
+HEDGE_MODELS ("slow-model=fast-model,..."). The first response wins; the other
+request is cancelled if it has not started yet, otherwise its response is
+discarded when it arrives and its tokens are counted as hedging overhead.
+
+The primary request's latency is recorded even when it loses, which gives the
+turn latency without hedging to compare against, so the report shows the p99
+improvement (over turns made after warm-up, with a deadline in force) next to
+the extra requests and tokens it cost.
+
+Usage:
+    python hedging.py bench                   # stub provider with a slow tail
+    python hedging.py bench --turns 500 --tail-ms 2000 --tail-rate 0.03
+"""
+
+import argparse
+import functools
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+WINDOW = 200           # Recent primary latencies per role used for the deadline
+REPORT_WINDOW = 1000   # Recent turns per role kept for the report
+MIN_SAMPLES = 20       # No hedging until a role has this many latencies
+DEADLINE_PERCENTILE = 0.9
+MIN_DEADLINE_S = 0.05
+
+
+def _parse_models(spec: str) -> dict:
+    """Parse "model=alternate,..." into {model: alternate}."""
+    alternates = {}
+    for part in spec.split(","):
+        model, _, alternate = part.partition("=")
+        if model.strip() and alternate.strip():
+            alternates[model.strip()] = alternate.strip()
+    return alternates
+
+
+HEDGE_MODELS = _parse_models(os.getenv("HEDGE_MODELS", ""))
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _tokens(usage) -> int:
+    return sum(usage) if usage else 0
+
+
+class Hedger:
+    """Runs completions with a second, hedging request once a p90 deadline passes."""
+
+    def __init__(self, alternates: dict = None, max_threads: int = 32):
+        self.alternates = dict(HEDGE_MODELS if alternates is None else alternates)
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="hedge")
+        self.primary_latencies = {}
+        self.report_latencies = {}  # role -> deque of (without hedging, with hedging)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def _role_stats(self, role: str) -> dict:
+        return self.stats.setdefault(role, {
+            "calls": 0, "hedged": 0, "hedge_wins": 0, "cancelled": 0,
+            "tokens": 0, "wasted_tokens": 0,
+        })
+
+    def deadline(self, role: str) -> float:
+        """Seconds to wait before hedging a call in role, or None while still warming up."""
+        with self.lock:
+            samples = list(self.primary_latencies.get(role, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return max(MIN_DEADLINE_S, _percentile(samples, DEADLINE_PERCENTILE))
+
+    def _primary_done(self, role: str, start: float, pair: list, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.primary_latencies.setdefault(role, deque(maxlen=WINDOW)).append(latency)
+            pair[0] = latency
+            if pair[1]:
+                self.report_latencies.setdefault(role, deque(maxlen=REPORT_WINDOW)).append(tuple(pair))
+
+    def _turn_done(self, role: str, latency: float, pair: list):
+        if pair[1] is False:
+            return
+        with self.lock:
+            pair[1] = latency
+            if pair[0] is not None:
+                self.report_latencies.setdefault(role, deque(maxlen=REPORT_WINDOW)).append(tuple(pair))
+
+    def _loser_done(self, role: str, future):
+        with self.lock:
+            if future.cancelled():
+                self._role_stats(role)["cancelled"] += 1
+            elif future.exception() is None:
+                self._role_stats(role)["wasted_tokens"] += _tokens(future.result()[1])
+
+    def call(self, role: str, fn, model: str) -> tuple:
+        """Return fn(model) -> (result, usage), hedged with fn(alternate) past the role's deadline.
+
+        If one request fails the other is still awaited; if both fail the
+        primary's exception is raised.
+        """
+        fn = tracing.wrap(fn)
+        deadline = self.deadline(role)
+        # Warm-up turns can't be hedged, so they stay out of the p99 comparison
+        pair = [None, None] if deadline is not None else [None, False]
+        start = time.perf_counter()
+        primary = self.executor.submit(fn, model)
+        primary.add_done_callback(functools.partial(self._primary_done, role, start, pair))
+        done, _ = wait([primary], timeout=deadline)
+        if done or deadline is None:
+            result, usage = primary.result()
+            self._turn_done(role, time.perf_counter() - start, pair)
+            with self.lock:
+                stats = self._role_stats(role)
+                stats["calls"] += 1
+                stats["tokens"] += _tokens(usage)
+            return result, usage
+
+        hedge = self.executor.submit(fn, self.alternates.get(model, model))
+        pending, winner = {primary, hedge}, None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Prefer the primary if both finished in the same instant
+            for future in sorted(done, key=lambda f: f is not primary):
+                if future.exception() is None:
+                    winner = future
+                    break
+        if winner is None:
+            raise primary.exception()
+        self._turn_done(role, time.perf_counter() - start, pair)
+        for future in (primary, hedge):
+            if future is not winner:
+                future.cancel()
+                future.add_done_callback(functools.partial(self._loser_done, role))
+        result, usage = winner.result()
+        with self.lock:
+            stats = self._role_stats(role)
+            stats["calls"] += 1
+            stats["hedged"] += 1
+            stats["hedge_wins"] += winner is hedge
+            stats["tokens"] += _tokens(usage)
+        return result, usage
+
+    def report(self) -> dict:
+        """Per role: hedge rate, p99 turn latency with and without hedging, and overhead."""
+        report = {}
+        with self.lock:
+            for role, stats in self.stats.items():
+                pairs = list(self.report_latencies.get(role, ()))
+                entry = dict(stats)
+                entry["extra_request_rate"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+                entry["extra_token_rate"] = round(stats["wasted_tokens"] / stats["tokens"], 4) if stats["tokens"] else 0.0
+                entry["deadline_s"] = None
+                samples = self.primary_latencies.get(role, ())
+                if len(samples) >= MIN_SAMPLES:
+                    entry["deadline_s"] = round(max(MIN_DEADLINE_S, _percentile(samples, DEADLINE_PERCENTILE)), 3)
+                if pairs:
+                    unhedged = _percentile([p[0] for p in pairs], 0.99)
+                    hedged = _percentile([p[1] for p in pairs], 0.99)
+                    entry["p99_unhedged_s"] = round(unhedged, 3)
+                    entry["p99_s"] = round(hedged, 3)
+                    entry["p99_improvement"] = round(1 - hedged / unhedged, 4) if unhedged else 0.0
+                report[role] = entry
+        return report
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    """Process-wide hedger, configured from HEDGE_MODELS on first use."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
+
+
+def bench(turns: int) -> dict:
+    """The same turn latencies measured plain and hedged against the stub provider."""
+    import app
+
+    messages = [{"role": "system", "content": "You are a debt collector."},
+                {"role": "user", "content": "Hello?"}]
+
+    def call(model):
+        return app._chat(model, messages)
+
+    plain = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        call(app.DEBT_COLLECTOR_MODEL)
+        plain.append(time.perf_counter() - start)
+
+    hedger = Hedger()
+    hedged = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        hedger.call("collector", call, app.DEBT_COLLECTOR_MODEL)
+        hedged.append(time.perf_counter() - start)
+    hedger.executor.shutdown(wait=True)
+
+    results = {}
+    for name, latencies in (("plain", plain), ("hedged", hedged)):
+        results[name] = {f"p{int(q * 100)}_s": round(_percentile(latencies, q), 3) for q in (0.5, 0.9, 0.99)}
+    results["p99_improvement"] = round(1 - results["hedged"]["p99_s"] / results["plain"]["p99_s"], 4)
+    # Same turns, primary alone vs first response: free of run-to-run noise in the tail
+    results["hedger"] = hedger.report()["collector"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request hedging utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="Plain vs hedged turn latency against the local stub provider")
+    bench_parser.add_argument("--turns", type=int, default=500)
+    bench_parser.add_argument("--latency-ms", type=float, default=30, help="Stub latency per call")
+    bench_parser.add_argument("--tail-ms", type=float, default=1000, help="Extra latency of a slow call")
+    bench_parser.add_argument("--tail-rate", type=float, default=0.03, help="Share of calls that are slow")
+    args = parser.parse_args()
+
+    # Must be set before app is imported
+    scratch = tempfile.mkdtemp(prefix="hedging-bench-")
+    os.environ.update({
+        "PROVIDER_STUB": "1",
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_TAIL_MS": str(args.tail_ms),
+        "STUB_TAIL_RATE": str(args.tail_rate),
+        "PROMPT_LIBRARY": "0",
+        "RUNS_LOG_PATH": os.path.join(scratch, "runs.jsonl"),
+    })
+
+    results = bench(args.turns)
+    print("=" * 60)
+    print("🪁 REQUEST HEDGING BENCHMARK")
+    print("=" * 60)
+    print(f"{args.turns} turns, stub latency {args.latency_ms:g} ms, "
+          f"{args.tail_rate:.0%} of calls +{args.tail_ms:g} ms")
+    print(f"\n{'':<8}{'p50':>8}{'p90':>8}{'p99':>8}")
+    for name in ("plain", "hedged"):
+        row = results[name]
+        print(f"{name:<8}{row['p50_s']:>8}{row['p90_s']:>8}{row['p99_s']:>8}")
+    hedger = results["hedger"]
+    print(f"\np99 improvement: {results['p99_improvement']:.1%} vs the plain run, "
+          f"{hedger['p99_improvement']:.1%} on the same turns ({hedger['p99_unhedged_s']}s -> {hedger['p99_s']}s)")
+    print(f"Overhead: {hedger['hedged']} extra request(s) ({hedger['extra_request_rate']:.1%}), "
+          f"{hedger['wasted_tokens']} wasted tokens ({hedger['extra_token_rate']:.1%}), "
+          f"{hedger['hedge_wins']} won by the hedge, deadline {hedger['deadline_s']}s")
+
+
+if __name__ == "__main__":
+    main()
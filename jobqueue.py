@@ -0,0 +1,412 @@
+"""
+Durable SQLite job queue for training runs, plus a local worker daemon.
+
+A job is one scenario run with a priority. CLI jobs (the keys
+main.run_scenario takes) run through main.py; jobs from the web app's POST
+/jobs run through app.training_events, with the web prompts, models and
+turn checkpoints, as a run from /start-training would. Workers claim the highest-priority queued job under a lease and
+checkpoint after every attempt, renewing the lease as they go. If a worker
+crashes, its job is claimed again (immediately on daemon restart, otherwise
+once the lease expires) and resumes after the last checkpointed attempt.
+
+Interactive jobs (priority >= PRIORITY_INTERACTIVE, e.g. from POST /jobs)
+always sort ahead of background work, the daemon keeps --reserved slots
+free for them, and --provider-cap limits concurrent calls per provider
+across all worker processes so a large sweep cannot use up a provider's
+rate limit.
+
+Usage:
+    python jobqueue.py enqueue scenarios.jsonl --priority 0
+    python jobqueue.py worker --concurrency 4 --reserved 1 --provider-cap groq=4 --provider-cap gemini=2
+    python jobqueue.py status
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+PRIORITY_INTERACTIVE = 10  # Web-submitted jobs
+PRIORITY_BACKGROUND = 0    # Sweeps and bulk enqueues
+# Seconds a claim stays valid without a checkpoint; one attempt must fit in it
+LEASE_SECONDS = 600
+# A job whose worker died this many times is marked failed instead of retried
+MAX_CLAIMS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    scenario TEXT NOT NULL,
+    max_attempts INTEGER NOT NULL,
+    num_turns INTEGER NOT NULL,
+    source TEXT,
+    checkpoint TEXT,
+    result TEXT,
+    error TEXT,
+    claims INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created_at);
+"""
+
+JSON_COLUMNS = ("scenario", "checkpoint", "result")
+
+
+def _job(row) -> dict:
+    job = dict(row)
+    for column in JSON_COLUMNS:
+        if job.get(column) is not None:
+            job[column] = json.loads(job[column])
+    return job
+
+
+class JobQueue:
+    """Jobs table in a SQLite file; safe to share between processes."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _db(self):
+        # Autocommit; claims take the write lock explicitly with BEGIN IMMEDIATE
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def enqueue(self, scenario: dict, priority: int = PRIORITY_BACKGROUND, max_attempts: int = 3,
+                num_turns: int = 5, source: str = "cli") -> str:
+        """Add a job; returns its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO jobs (id, priority, scenario, max_attempts, num_turns, source, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, priority, json.dumps(scenario), max_attempts, num_turns, source, now, now),
+            )
+        return job_id
+
+    def claim(self, worker: str, min_priority: int = None, lease: float = LEASE_SECONDS) -> dict:
+        """Lease the next job (highest priority, then oldest), including expired claims; None if idle."""
+        with self._db() as db:
+            while True:
+                now = time.time()
+                db.execute("BEGIN IMMEDIATE")
+                query = "SELECT * FROM jobs WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?))"
+                params = (now,)
+                if min_priority is not None:
+                    query += " AND priority >= ?"
+                    params += (min_priority,)
+                row = db.execute(query + " ORDER BY priority DESC, created_at LIMIT 1", params).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                if row["claims"] >= MAX_CLAIMS:
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                        (f"Abandoned after {row['claims']} crashed claims", now, row["id"]),
+                    )
+                    db.execute("COMMIT")
+                    continue
+                db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, claims = claims + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (worker, now + lease, now, row["id"]),
+                )
+                db.execute("COMMIT")
+                job = _job(row)
+                job.update(status="running", worker=worker, claims=row["claims"] + 1)
+                return job
+
+    def checkpoint(self, job_id: str, worker: str, state: dict, lease: float = LEASE_SECONDS) -> bool:
+        """Save a job's progress and renew its lease; False if the worker no longer holds it."""
+        now = time.time()
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET checkpoint = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(state), now + lease, now, job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, time.time(), job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, worker: str, crashed: bool = True):
+        """Put a running job back in the queue; it keeps its checkpoint.
+
+        A clean shutdown (crashed=False) does not count against MAX_CLAIMS.
+        """
+        with self._db() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, claims = claims - ?, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (0 if crashed else 1, time.time(), job_id, worker),
+            )
+
+    def release_dead(self, host: str) -> int:
+        """Requeue running jobs held by worker daemons on this host that are no longer alive."""
+        released = 0
+        with self._db() as db:
+            rows = db.execute("SELECT id, worker FROM jobs WHERE status = 'running' AND worker LIKE ?",
+                              (f"{host}:%",)).fetchall()
+        for row in rows:
+            pid = int(row["worker"].rsplit(":", 1)[1])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.release(row["id"], row["worker"])
+                released += 1
+            except PermissionError:
+                pass  # Alive, owned by another user
+        return released
+
+    def get(self, job_id: str) -> dict:
+        with self._db() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        """Most recent jobs first, without their checkpoint and result payloads."""
+        query = ("SELECT id, priority, status, scenario, max_attempts, source, error, claims, worker, "
+                 "created_at, updated_at FROM jobs")
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._db() as db:
+            rows = db.execute(query + " ORDER BY created_at DESC LIMIT ?", params + (limit,)).fetchall()
+        return [_job(row) for row in rows]
+
+    def counts(self) -> dict:
+        with self._db() as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def _init_worker(caps: dict):
+    import providers
+    providers.set_limits(caps)
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+def _append_run_record(job: dict, result: dict):
+    """Add a finished job to the run log read by /stats and analytics.py."""
+    scenario = dict(job["scenario"])
+    record = {
+        "run_id": job["id"],
+        "source": "job",
+        "collector_personality": scenario.pop("personality", None),
+        **scenario,
+        **{key: value for key, value in result.items() if key not in ("final_prompt", "feedback")},
+    }
+    with open(os.getenv("RUNS_LOG_PATH", "runs.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def _run_web_job(job: dict, on_attempt) -> dict:
+    """Run (or resume from its turn checkpoint) a job queued from the web app, as /start-training would."""
+    import app
+    import checkpoints
+
+    resume = checkpoints.load(job["id"]) if checkpoints.exists(job["id"]) else None
+    if resume:
+        run = resume["run"]
+        run_args = (run["config"], run["collector_prompt"], run["defaulter_prompt"], None,
+                    run["max_attempts"], run["num_turns"])
+    else:
+        config = dict(job["scenario"])
+        # Queued before web jobs were run by the web app
+        config.setdefault("collector_personality", config.pop("personality", None))
+        collector_prompt, defaulter_prompt, warm_similarity = app.initial_prompts(config)
+        run_args = (config, collector_prompt, defaulter_prompt, warm_similarity, job["max_attempts"], job["num_turns"])
+
+    result = {"passed": False, "attempts": run_args[4], "feedback": "", "final_prompt": run_args[1]}
+    # The web run appends its own run record and checkpoints every turn under the job's ID
+    for event in app.training_events(*run_args, run_id=job["id"], resume=resume):
+        if event["type"] == "attempt":
+            on_attempt({"attempt": event["attempt"] - 1, "run_id": job["id"]})
+        elif event["type"] == "verdict":
+            result["feedback"] = event["verdict"].get("feedback", "")
+        elif event["type"] == "prompt":
+            result["final_prompt"] = event["prompt"]
+        elif event["type"] == "success":
+            result.update(passed=True, attempts=event["attempt"], final_prompt=event["final_prompt"])
+    return result
+
+
+def _run_job(db_path: str, job: dict, worker: str) -> str:
+    """Worker process: run (or resume) one job, checkpointing after each attempt."""
+    queue = JobQueue(db_path)
+
+    def on_attempt(state):
+        if not queue.checkpoint(job["id"], worker, state):
+            raise _LeaseLost()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if job["source"] == "web":
+                result = _run_web_job(job, on_attempt)
+            else:
+                import main
+                result = main.run_scenario(
+                    **job["scenario"], max_attempts=job["max_attempts"], num_turns=job["num_turns"],
+                    checkpoint=job["checkpoint"], on_attempt=on_attempt,
+                )
+    except _LeaseLost:
+        return "lost"
+    except Exception as e:
+        queue.fail(job["id"], worker, f"{type(e).__name__}: {e}")
+        return "failed"
+    if not queue.complete(job["id"], worker, result):
+        return "lost"
+    if job["source"] != "web":
+        _append_run_record(job, result)
+    return "passed" if result["passed"] else "done"
+
+
+def run_worker(db_path: str = DEFAULT_DB_PATH, concurrency: int = 4, reserved: int = 0, caps: dict = None,
+               poll: float = 1.0, once: bool = False):
+    """Claim and run jobs until interrupted (or, with once, until the queue is empty)."""
+    queue = JobQueue(db_path)
+    host = socket.gethostname()
+    worker = f"{host}:{os.getpid()}"
+    released = queue.release_dead(host)
+    if released:
+        print(f"♻️  Requeued {released} job(s) left running by a dead worker", file=sys.stderr)
+
+    context = multiprocessing.get_context("spawn")
+    semaphores = {name: context.BoundedSemaphore(cap) for name, cap in (caps or {}).items()}
+
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=concurrency, mp_context=context,
+                                   initializer=_init_worker, initargs=(semaphores,))
+
+    executor = new_executor()
+    running = {}
+    try:
+        while True:
+            while len(running) < concurrency:
+                # The last `reserved` slots only take interactive jobs
+                interactive_only = len(running) >= concurrency - reserved
+                job = queue.claim(worker, min_priority=PRIORITY_INTERACTIVE if interactive_only else None)
+                if job is None:
+                    break
+                resumed = f" (resuming after attempt {job['checkpoint']['attempt']})" if job["checkpoint"] else ""
+                print(f"▶️  {job['id']} priority {job['priority']}{resumed}", file=sys.stderr)
+                running[executor.submit(_run_job, db_path, job, worker)] = job
+            if not running:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in finished:
+                job = running.pop(future)
+                try:
+                    print(f"⏹️  {job['id']} {future.result()}", file=sys.stderr)
+                except BrokenProcessPool:
+                    # A worker process died; its job resumes from the last checkpoint
+                    print(f"💥 {job['id']} worker crashed, requeued", file=sys.stderr)
+                    queue.release(job["id"], worker)
+                    broken = True
+            if broken:
+                # A broken pool fails every job in it; requeue them all on a fresh pool
+                for job in running.values():
+                    queue.release(job["id"], worker)
+                running.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = new_executor()
+    finally:
+        for job in running.values():
+            queue.release(job["id"], worker, crashed=False)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable training job queue.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    enqueue = sub.add_parser("enqueue", help="Queue scenarios from a JSONL file (main.py --batch format)")
+    enqueue.add_argument("input", help='Scenarios JSONL, or "-" for stdin')
+    enqueue.add_argument("--priority", type=int, default=PRIORITY_BACKGROUND)
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+    enqueue.add_argument("--turns", type=int, default=5)
+    worker = sub.add_parser("worker", help="Run the worker daemon")
+    worker.add_argument("--concurrency", type=int, default=4, help="Jobs run in parallel (one process each)")
+    worker.add_argument("--reserved", type=int, default=0, help="Slots kept free for interactive jobs")
+    worker.add_argument("--provider-cap", action="append", default=[], metavar="NAME=N",
+                        help="Max concurrent calls to a provider across all workers (repeatable)")
+    worker.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    sub.add_parser("status", help="Job counts by status and the most recent jobs")
+    args = parser.parse_args()
+
+    import providers
+    queue = JobQueue(args.db)
+    if args.command == "enqueue":
+        import main as training
+        source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+        count = 0
+        for item in training._read_scenarios(source):
+            scenario = dict(item["config"])
+            max_attempts = scenario.pop("max_attempts", args.max_attempts)
+            num_turns = scenario.pop("num_turns", args.turns)
+            queue.enqueue(scenario, args.priority, max_attempts, num_turns)
+            count += 1
+        print(f"Queued {count} job(s) at priority {args.priority}")
+    elif args.command == "worker":
+        caps = providers.parse_limits(",".join(args.provider_cap)) or providers.parse_limits(
+            os.getenv("PROVIDER_CONCURRENCY", ""))
+        try:
+            run_worker(args.db, args.concurrency, args.reserved, caps, once=args.once)
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(json.dumps(queue.counts()))
+        for job in queue.list(limit=20):
+            print(f"{job['id']}  {job['status']:<8} priority {job['priority']:>3}  {job['source'] or ''}  "
+                  f"{job['error'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Judge helpers shared by app.py and main.py.
+
+parse_verdict() turns raw judge output into a verdict dict (strict JSON first,
+then a tolerant field scanner), parse_verdict_stream() does the same over a
+streamed response and stops reading once every field has arrived, and
+judge_ensemble() fans a conversation out to several judges in parallel,
+calling a further judge only when the ones so far disagree or fail, so the
+calls a quorum makes unnecessary are never made.
+
+Usage:
+    python judges.py check                  # stub run of both apps' judge ensembles
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Process-wide ensemble counters, reported by /stats and the CLI
+ensemble_stats = {
+    "runs": 0,
+    "early_consensus": 0,
+    "calls_total": 0,
+    "calls_skipped": 0,
+    "judge_errors": 0,
+    "no_quorum": 0,
+}
+_stats_lock = threading.Lock()
+
+# Verdict parsing counters; retry_attempts counts training attempts spent only
+# because the previous verdict could not be parsed
+parse_stats = {
+    "verdicts": 0,
+    "strict": 0,
+    "tolerant": 0,
+    "failed": 0,
+    "retry_attempts": 0,
+}
+
+# JSON schema for provider structured-output / response-format modes
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "pass": {"type": "boolean"},
+        "feedback": {"type": "string"},
+        "hang_up_detected": {"type": "boolean"},
+    },
+    "required": ["pass", "feedback", "hang_up_detected"],
+}
+
+# Field scanners for the tolerant parser: accept single or double quotes (or
+# none) around keys, Python-style True/False, and text around the object
+_BOOL_FIELD = r"""["']?{name}["']?\s*[:=]\s*["']?(true|false)\b"""
+_FIELD_PATTERNS = {
+    "pass": re.compile(_BOOL_FIELD.format(name="pass"), re.IGNORECASE),
+    "hang_up_detected": re.compile(_BOOL_FIELD.format(name="hang_up_detected"), re.IGNORECASE),
+    "feedback": re.compile(r"""["']?feedback["']?\s*[:=]\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)')""",
+                           re.IGNORECASE | re.DOTALL),
+}
+
+
+class VerdictParser:
+    """Incremental, tolerant verdict parser for streamed judge output.
+
+    Feed text chunks as they arrive; each field is extracted as soon as its
+    value is complete, and `complete` turns True once all three are known.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk; returns True once every verdict field has been found."""
+        self.buffer += chunk
+        for name, pattern in _FIELD_PATTERNS.items():
+            if name in self.fields:
+                continue
+            match = pattern.search(self.buffer)
+            if not match:
+                continue
+            if name == "feedback":
+                raw = match.group(1) if match.group(1) is not None else match.group(2).replace("\\'", "'")
+                try:
+                    self.fields[name] = json.loads(f'"{raw}"')
+                except json.JSONDecodeError:
+                    self.fields[name] = raw
+            else:
+                self.fields[name] = match.group(1).lower() == "true"
+        return self.complete
+
+    @property
+    def complete(self) -> bool:
+        return len(self.fields) == len(_FIELD_PATTERNS)
+
+    def result(self) -> dict:
+        """Verdict from whatever was parsed; None if `pass` never appeared."""
+        if "pass" not in self.fields:
+            return None
+        return {
+            "pass": self.fields["pass"],
+            "feedback": self.fields.get("feedback", "No feedback"),
+            "hang_up_detected": self.fields.get("hang_up_detected", False),
+        }
+
+
+def _count_parse(outcome: str):
+    with _stats_lock:
+        parse_stats["verdicts"] += 1
+        parse_stats[outcome] += 1
+
+
+def _parse_failure(response: str) -> dict:
+    _count_parse("failed")
+    return {
+        "pass": False,
+        "feedback": f"Judge response parsing error: {response[:100]}",
+        "hang_up_detected": False,
+        "parse_error": True
+    }
+
+
+def _strict_parse(response: str) -> dict:
+    """Strict JSON parse of the outermost object; None if it is not a verdict."""
+    try:
+        start = response.find('{')
+        end = response.rfind('}') + 1
+        if start != -1 and end > start:
+            verdict = json.loads(response[start:end])
+        else:
+            verdict = json.loads(response)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(verdict, dict) or not isinstance(verdict.get("pass"), bool):
+        return None
+    return verdict
+
+
+def _strict_prefix(buffer: str, verdict: dict) -> bool:
+    """Whether a stream stopped early was well-formed JSON so far, with the same fields.
+
+    The stream is closed once every field is in, often before the closing
+    brace, so the text is also tried with the object closed.
+    """
+    for candidate in (buffer, buffer.rstrip().rstrip(",") + "}"):
+        strict = _strict_parse(candidate)
+        if strict is not None:
+            return all(strict.get(name) == value for name, value in verdict.items())
+    return False
+
+
+def parse_verdict(response: str) -> dict:
+    """Parse the judge's JSON verdict, falling back to the tolerant scanner.
+
+    Output that neither parser can read fails closed with `parse_error` set.
+    """
+    verdict = _strict_parse(response)
+    if verdict is not None:
+        _count_parse("strict")
+        return verdict
+    parser = VerdictParser()
+    parser.feed(response)
+    verdict = parser.result()
+    if verdict is not None:
+        _count_parse("tolerant")
+        return verdict
+    return _parse_failure(response)
+
+
+def parse_verdict_stream(chunks) -> dict:
+    """Parse a streamed judge response, closing the stream once all fields are in."""
+    parser = VerdictParser()
+    try:
+        for chunk in chunks:
+            if parser.feed(chunk):
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    if parser.complete:
+        verdict = parser.result()
+        _count_parse("strict" if _strict_prefix(parser.buffer, verdict) else "tolerant")
+        return verdict
+    # Stream ended early or fields were missing: try strict JSON on the full text
+    return parse_verdict(parser.buffer)
+
+
+def record_parse_retry():
+    """Count a training attempt that only happened because the last verdict was unparseable."""
+    with _stats_lock:
+        parse_stats["retry_attempts"] += 1
+
+
+def parse_report() -> dict:
+    """Snapshot of verdict parsing counters."""
+    with _stats_lock:
+        report = dict(parse_stats)
+    report["failure_rate"] = round(report["failed"] / report["verdicts"], 4) if report["verdicts"] else 0.0
+    return report
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            ensemble_stats[key] += value
+
+
+def judge_ensemble(judge_fns: list, conversation_log: list, quorum: int) -> dict:
+    """Run judges in parallel, starting only as many as can still decide, until `quorum` agree.
+
+    Each judge_fn takes the conversation log and returns a verdict dict. Only
+    `quorum` judges start at first; another starts each time a disagreement or
+    error leaves the leading side short of a quorum with too few calls in
+    flight to reach it. So a decision is never left waiting on a call, and the
+    judges it made unnecessary are never called (or billed). The returned
+    verdict is the first one on the winning side, plus:
+        confidence  share of received votes that agree with the decision
+        votes       {"pass": n, "fail": n} received before the decision
+        judges      number of judges in the ensemble
+        early       True if the decision was made without calling every judge
+    When no judge returned a readable verdict it also has `parse_error` set.
+    """
+    quorum = max(1, min(quorum, len(judge_fns)))
+    votes = {True: [], False: []}
+    errors = 0
+    decided = None
+    remaining = list(judge_fns)
+    in_flight = set()
+
+    executor = ThreadPoolExecutor(max_workers=len(judge_fns))
+    try:
+        while True:
+            # Enough calls in flight for the leading side to still reach a quorum
+            needed = quorum - max(len(votes[True]), len(votes[False]))
+            while remaining and len(in_flight) < needed:
+                in_flight.add(executor.submit(remaining.pop(0), conversation_log))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    verdict = future.result()
+                except Exception as e:
+                    print(f"⚠️  Ensemble judge error: {e}")
+                    errors += 1
+                    continue
+                if verdict.get("parse_error"):
+                    errors += 1  # An unreadable verdict is not a FAIL vote
+                    continue
+                votes[bool(verdict.get("pass"))].append(verdict)
+            if len(votes[True]) >= quorum or len(votes[False]) >= quorum:
+                decided = len(votes[True]) >= quorum
+                break
+    finally:
+        # Nothing is in flight after a decision; on an error, running calls are not waited on
+        executor.shutdown(wait=False)
+    skipped = len(remaining)
+
+    if decided is None:
+        # No quorum: majority of what came back, ties and total failure count as FAIL
+        decided = len(votes[True]) > len(votes[False])
+        _count(no_quorum=1)
+
+    received = len(votes[True]) + len(votes[False])
+    if votes[decided]:
+        verdict = dict(votes[decided][0])
+    else:
+        verdict = {"pass": False, "feedback": "All ensemble judges failed.", "hang_up_detected": False}
+    if not received:
+        verdict["parse_error"] = True  # So the attempt counts as a parse retry, as with a single judge
+    verdict.update({
+        "pass": decided,
+        "confidence": round(len(votes[decided]) / received, 3) if received else 0.0,
+        "votes": {"pass": len(votes[True]), "fail": len(votes[False])},
+        "judges": len(judge_fns),
+        "early": skipped > 0,
+    })
+
+    _count(runs=1, early_consensus=int(skipped > 0), calls_total=len(judge_fns),
+           calls_skipped=skipped, judge_errors=errors)
+    return verdict
+
+
+def ensemble_report() -> dict:
+    """Snapshot of ensemble counters with derived rates."""
+    with _stats_lock:
+        report = dict(ensemble_stats)
+    runs = report["runs"]
+    report["early_consensus_rate"] = round(report["early_consensus"] / runs, 4) if runs else 0.0
+    report["calls_saved_rate"] = (
+        round(report["calls_skipped"] / report["calls_total"], 4) if report["calls_total"] else 0.0
+    )
+    return report
+
+
+def check_ensemble(runs: int = 20) -> list:
+    """Judge stub conversations through main.py's and app.py's ensembles; returns the problems found.
+
+    Every judge call must receive the conversation JSON and a float
+    temperature, and every ensemble verdict must rest on readable votes.
+    """
+    import contextlib
+    import io
+    import app
+    import main
+
+    problems = []
+    for name, module in (("main", main), ("app", app)):
+        module.JUDGE_ENSEMBLE_ENABLED = True
+        call_judge = module.call_judge
+        received = []
+
+        def recording_call_judge(provider, model, conversation_json, temperature=0.2, **kwargs):
+            received.append((provider, model, conversation_json, temperature))
+            return call_judge(provider, model, conversation_json, temperature, **kwargs)
+
+        module.call_judge = recording_call_judge
+        try:
+            for index in range(runs):
+                log = [{"role": "collector", "content": f"Hello, this is about your balance of ${1000 + index}."},
+                       {"role": "customer", "content": "I can pay $200 on Friday."}]
+                received.clear()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    verdict = module.judge_conversation(log)
+                expected = json.dumps(log, indent=2)
+                for provider, model, conversation_json, temperature in received:
+                    if conversation_json != expected:
+                        problems.append(f"{name}: {provider}/{model} was sent {conversation_json!r:.60} "
+                                        "instead of the transcript")
+                    if not isinstance(temperature, float):
+                        problems.append(f"{name}: {provider}/{model} was sent temperature {temperature!r:.60}")
+                if verdict.get("parse_error") or not sum(verdict["votes"].values()):
+                    problems.append(f"{name}: no readable judge verdict ({verdict['feedback']})")
+        finally:
+            module.call_judge = call_judge
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Judge helpers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check_parser = sub.add_parser("check", help="Run both apps' judge ensembles against the local stub provider")
+    check_parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    # Must be set before main and app are imported
+    os.environ.update({"PROVIDER_STUB": "1", "STUB_LATENCY_MS": "0"})
+    problems = check_ensemble(args.runs)
+    # main.py and app.py count into the imported module, not this script's __main__
+    import judges
+    report = judges.ensemble_report()
+    print(f"{report['runs']} ensemble verdicts, {report['calls_skipped']}/{report['calls_total']} judge calls "
+          f"skipped, {report['judge_errors']} judge errors")
+    for problem in sorted(set(problems)):
+        print(f"  ❌ {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("✅ Every judge received the transcript")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Load test for the Flask endpoints against the stub provider.
+
+Starts app.py in a threaded server process with PROVIDER_STUB=1 (or targets
+a running one with --url) and, for --duration seconds, drives:
+
+- --runs concurrent /start-training streams, each a full training loop,
+  recording time to first byte, total time and stalls (the longest gap
+  between two streamed fragments);
+- --viewers concurrent clients that POST /view-transcript and then fetch
+  every /audio/<id> clip it lists.
+
+The report gives throughput and latency percentiles per endpoint, stream
+stalls, audio clips missing by the time they were fetched, and the server's
+RSS and audio_storage (from /stats), sampled every STATS_INTERVAL_S during
+the run: a new attempt clears audio_storage, so its end-of-run size says
+nothing and the peak is reported instead. --save-baseline writes
+it to loadtest_baseline.json; --check compares a run against that file and
+exits non-zero on a regression beyond --tolerance.
+
+Usage:
+    python loadtest.py                           # 20 s, 4 training streams, 8 viewers
+    python loadtest.py --runs 8 --viewers 32 --duration 60 --latency-ms 100
+    python loadtest.py --check                   # compare with loadtest_baseline.json
+    python loadtest.py --save-baseline
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+BASELINE_PATH = "loadtest_baseline.json"
+STALL_THRESHOLD_S = 1.0  # Stream gaps longer than this count as stalls
+STATS_INTERVAL_S = 0.5   # How often /stats and RSS are sampled for their peaks
+PERCENTILES = (50, 90, 99)
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Varied per training stream so prompts (and the stub's replies) differ
+PERSONALITIES = ["aggressive and firm", "polite but persistent", "empathetic and understanding",
+                 "professional and neutral", "friendly but assertive"]
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_kb(pid: int) -> int:
+    """Resident set size of a local process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def serve(port: int):
+    """Run app.py on a threaded WSGI server, as `flask run` would, without the debug reloader."""
+    from werkzeug.serving import make_server
+    import app
+
+    make_server("127.0.0.1", port, app.app, threaded=True).serve_forever()
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by every client thread."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.streams = []  # {"ttfb_s", "total_s", "max_gap_s", "bytes"}
+        self.missing_audio = 0
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float = None, error: str = None):
+        with self.lock:
+            if error:
+                self.errors.setdefault(endpoint, []).append(error)
+            else:
+                self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def report(self, elapsed: float) -> dict:
+        with self.lock:
+            endpoints = {}
+            for endpoint in sorted(set(self.latencies) | set(self.errors)):
+                latencies = self.latencies.get(endpoint, [])
+                endpoints[endpoint] = {
+                    "requests": len(latencies),
+                    "errors": len(self.errors.get(endpoint, [])),
+                    "per_s": round(len(latencies) / elapsed, 2),
+                    **{f"p{q}_s": round(_percentile(latencies, q), 4) if latencies else None for q in PERCENTILES},
+                }
+            gaps = [stream["max_gap_s"] for stream in self.streams]
+            ttfbs = [stream["ttfb_s"] for stream in self.streams]
+            streams = {
+                "completed": len(self.streams),
+                **{f"ttfb_p{q}_s": round(_percentile(ttfbs, q), 4) if ttfbs else None for q in PERCENTILES},
+                **{f"max_gap_p{q}_s": round(_percentile(gaps, q), 4) if gaps else None for q in PERCENTILES},
+                "worst_gap_s": round(max(gaps), 4) if gaps else None,
+                "stalls": sum(1 for gap in gaps if gap > STALL_THRESHOLD_S),
+            }
+            sample_errors = sorted({error for errors in self.errors.values() for error in errors})[:5]
+            return {"endpoints": endpoints, "streams": streams, "missing_audio": self.missing_audio,
+                    "sample_errors": sample_errors}
+
+
+class LoadTest:
+    def __init__(self, url: str, recorder: Recorder, deadline: float, timeout: float = 60.0):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.deadline = deadline
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: dict = None, headers: dict = None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        payload = urlencode(body) if body is not None else None
+        headers = dict(headers or {})
+        if payload is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        connection.request(method, path, payload, headers)
+        return connection, connection.getresponse()
+
+    def stats(self) -> dict:
+        connection, response = self._request("GET", "/stats")
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def training_stream(self, index: int) -> bool:
+        """One /start-training stream read fragment by fragment; returns True if the run passed."""
+        form = {"collector_personality": PERSONALITIES[index % len(PERSONALITIES)],
+                "debt_amount": 1000 + 100 * (index % 50)}
+        start = time.perf_counter()
+        try:
+            connection, response = self._request("POST", "/start-training", form)
+        except OSError as e:
+            self.recorder.add("/start-training", error=repr(e))
+            return False
+        try:
+            if response.status != 200:
+                self.recorder.add("/start-training", error=f"HTTP {response.status}")
+                return False
+            ttfb, last, max_gap, size, body = None, start, 0.0, 0, []
+            while True:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                now = time.perf_counter()
+                if ttfb is None:
+                    ttfb = now - start
+                else:
+                    max_gap = max(max_gap, now - last)
+                last = now
+                size += len(chunk)
+                body.append(chunk)
+            total = time.perf_counter() - start
+        except OSError as e:
+            self.recorder.add("/start-training", error=repr(e))
+            return False
+        finally:
+            connection.close()
+        self.recorder.add("/start-training", total)
+        with self.recorder.lock:
+            self.recorder.streams.append({"ttfb_s": ttfb or total, "total_s": total, "max_gap_s": max_gap,
+                                          "bytes": size})
+        return b"success-banner" in b"".join(body)
+
+    def view_transcript(self) -> list:
+        """POST /view-transcript; returns the audio IDs it lists."""
+        start = time.perf_counter()
+        try:
+            connection, response = self._request("POST", "/view-transcript",
+                                                 headers={"X-Audio-Codecs": "opus,mp3"})
+            html = response.read().decode("utf-8", "replace")
+            connection.close()
+        except OSError as e:
+            self.recorder.add("/view-transcript", error=repr(e))
+            return []
+        if response.status != 200:
+            self.recorder.add("/view-transcript", error=f"HTTP {response.status}")
+            return []
+        self.recorder.add("/view-transcript", time.perf_counter() - start)
+        match = re.search(r'data-audio-ids="([^"]*)"', html)
+        return [audio_id for audio_id in match.group(1).split(",") if audio_id] if match else []
+
+    def fetch_audio(self, audio_id: str):
+        start = time.perf_counter()
+        try:
+            connection, response = self._request("GET", f"/audio/{audio_id}")
+            response.read()
+            connection.close()
+        except OSError as e:
+            self.recorder.add("/audio/<id>", error=repr(e))
+            return
+        if response.status == 404:
+            # Cleared by a training attempt that started after the transcript was rendered
+            with self.recorder.lock:
+                self.recorder.missing_audio += 1
+        elif response.status != 200:
+            self.recorder.add("/audio/<id>", error=f"HTTP {response.status}")
+        else:
+            self.recorder.add("/audio/<id>", time.perf_counter() - start)
+
+    def trainer(self, first_index: int, step: int):
+        index = first_index
+        while time.monotonic() < self.deadline:
+            self.training_stream(index)
+            index += step
+
+    def viewer(self):
+        while time.monotonic() < self.deadline:
+            audio_ids = self.view_transcript()
+            for audio_id in audio_ids:
+                self.fetch_audio(audio_id)
+            if not audio_ids:
+                time.sleep(0.05)
+
+    def sampler(self, peaks: dict, server_pid: int = None):
+        """Until the deadline, keep the largest audio_storage and RSS seen in peaks."""
+        while time.monotonic() < self.deadline:
+            try:
+                storage = self.stats().get("audio_storage", {})
+            except (OSError, ValueError):
+                storage = {}
+            peaks["audio_storage_clips"] = max(peaks["audio_storage_clips"], storage.get("clips", 0))
+            peaks["audio_storage_bytes"] = max(peaks["audio_storage_bytes"], storage.get("bytes", 0))
+            rss = _rss_kb(server_pid) if server_pid else None
+            if rss is not None:
+                peaks["rss_kb"] = max(peaks["rss_kb"] or 0, rss)
+            time.sleep(STATS_INTERVAL_S)
+
+
+def run(url: str, runs: int, viewers: int, duration: float, server_pid: int = None) -> dict:
+    """Drive the server at url for `duration` seconds; returns the report."""
+    recorder = Recorder()
+    warmup = LoadTest(url, recorder, time.monotonic() + 120)
+    # Viewers need a successful conversation to render
+    for index in range(20):
+        if warmup.training_stream(index):
+            break
+    recorder = Recorder()
+    rss_before = _rss_kb(server_pid) if server_pid else None
+    peaks = {"audio_storage_clips": 0, "audio_storage_bytes": 0, "rss_kb": rss_before}
+
+    start = time.perf_counter()
+    test = LoadTest(url, recorder, time.monotonic() + duration)
+    threads = [threading.Thread(target=test.trainer, args=(index, runs), daemon=True) for index in range(runs)]
+    threads += [threading.Thread(target=test.viewer, daemon=True) for _ in range(viewers)]
+    threads.append(threading.Thread(target=test.sampler, args=(peaks, server_pid), daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    rss_after = _rss_kb(server_pid) if server_pid else None
+    return {
+        "config": {"runs": runs, "viewers": viewers, "duration_s": duration,
+                   "latency_ms": float(os.getenv("STUB_LATENCY_MS", "50"))},
+        "elapsed_s": round(elapsed, 3),
+        **recorder.report(elapsed),
+        "memory": {
+            "rss_start_kb": rss_before,
+            "rss_end_kb": rss_after,
+            "rss_growth_kb": rss_after - rss_before if rss_before and rss_after else None,
+            "rss_peak_kb": peaks["rss_kb"],
+            "audio_storage_peak_clips": peaks["audio_storage_clips"],
+            "audio_storage_peak_bytes": peaks["audio_storage_bytes"],
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of report against baseline beyond tolerance (a fraction), as messages."""
+    problems = []
+    if report["config"] != baseline["config"]:
+        problems.append(f"config {report['config']} differs from the baseline's {baseline['config']}")
+        return problems
+    for endpoint, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(endpoint)
+        if current is None:
+            problems.append(f"{endpoint}: no successful requests")
+            continue
+        if current["per_s"] < base["per_s"] * (1 - tolerance):
+            problems.append(f"{endpoint}: throughput {current['per_s']}/s vs {base['per_s']}/s baseline")
+        if base["p99_s"] and current["p99_s"] > base["p99_s"] * (1 + tolerance):
+            problems.append(f"{endpoint}: p99 {current['p99_s']}s vs {base['p99_s']}s baseline")
+        if current["errors"] > base["errors"]:
+            problems.append(f"{endpoint}: {current['errors']} errors vs {base['errors']} baseline")
+    base_gap, gap = baseline["streams"]["max_gap_p99_s"], report["streams"]["max_gap_p99_s"]
+    if base_gap and gap and gap > base_gap * (1 + tolerance):
+        problems.append(f"stream stall p99 {gap}s vs {base_gap}s baseline")
+    base_growth, growth = baseline["memory"]["rss_growth_kb"], report["memory"]["rss_growth_kb"]
+    # Small absolute growth is allocator noise
+    if base_growth is not None and growth is not None and growth > max(base_growth * (1 + tolerance), 8192):
+        problems.append(f"RSS grew {growth} kB vs {base_growth} kB baseline")
+    base_peak, peak = baseline["memory"].get("audio_storage_peak_bytes"), report["memory"]["audio_storage_peak_bytes"]
+    if base_peak is not None and peak > base_peak * (1 + tolerance):
+        problems.append(f"audio_storage peaked at {peak:,} bytes vs {base_peak:,} bytes baseline")
+    return problems
+
+
+def print_report(report: dict):
+    print("=" * 60)
+    print("🏋️  LOAD TEST")
+    print("=" * 60)
+    config = report["config"]
+    print(f"{config['runs']} training streams + {config['viewers']} viewers for {report['elapsed_s']}s "
+          f"({config['latency_ms']:.0f} ms stub latency)")
+    print(f"\n{'endpoint':<18}{'reqs':>7}{'err':>5}{'req/s':>8}{'p50':>9}{'p90':>9}{'p99':>9}")
+    for endpoint, entry in report["endpoints"].items():
+        cells = "".join(f"{entry[f'p{q}_s'] * 1000:>7.0f}ms" if entry[f"p{q}_s"] is not None else f"{'-':>9}"
+                        for q in PERCENTILES)
+        print(f"{endpoint:<18}{entry['requests']:>7}{entry['errors']:>5}{entry['per_s']:>8}{cells}")
+    streams = report["streams"]
+    if streams["completed"]:
+        print(f"\nStreams: first byte p50 {streams['ttfb_p50_s'] * 1000:.0f} ms / p99 "
+              f"{streams['ttfb_p99_s'] * 1000:.0f} ms; longest gap p50 {streams['max_gap_p50_s']}s, "
+              f"p99 {streams['max_gap_p99_s']}s, worst {streams['worst_gap_s']}s; "
+              f"{streams['stalls']} stream(s) stalled > {STALL_THRESHOLD_S:.0f}s")
+    print(f"Audio clips gone before they were fetched: {report['missing_audio']}")
+    memory = report["memory"]
+    if memory["rss_growth_kb"] is not None:
+        print(f"Server RSS {memory['rss_start_kb'] / 1024:.1f} -> {memory['rss_end_kb'] / 1024:.1f} MB "
+              f"(peak {memory['rss_peak_kb'] / 1024:.1f} MB)")
+    print(f"audio_storage peak {memory['audio_storage_peak_clips']} clips, "
+          f"{memory['audio_storage_peak_bytes']:,} bytes")
+    for error in report["sample_errors"]:
+        print(f"  ⚠️  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Flask endpoints against the stub provider.")
+    parser.add_argument("--runs", type=int, default=4, help="Concurrent /start-training streams")
+    parser.add_argument("--viewers", type=int, default=8, help="Concurrent /view-transcript + /audio clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to drive load")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub latency per provider call")
+    parser.add_argument("--url", help="Target a running server instead of starting one (no RSS figures)")
+    parser.add_argument("--output", help="Also write the report as JSON")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the report to {BASELINE_PATH}")
+    parser.add_argument("--check", action="store_true", help=f"Fail on regressions against {BASELINE_PATH}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression, as a fraction")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # Internal: the server process
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    os.environ["STUB_LATENCY_MS"] = str(args.latency_ms)
+    server = None
+    url = args.url
+    if url is None:
+        port = _free_port()
+        # Streams cut off at the deadline leave resumable checkpoints; keep them out of the working directory
+        scratch = tempfile.mkdtemp(prefix="loadtest-")
+        env = {**os.environ, "PROVIDER_STUB": "1", "PROMPT_LIBRARY": "0",
+               "RUNS_LOG_PATH": os.devnull, "GOVERNOR_LOG_PATH": os.devnull,
+               "CHECKPOINT_DIR": os.path.join(scratch, "checkpoints")}
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                                  cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+    try:
+        report = run(url, args.runs, args.viewers, args.duration, server.pid if server else None)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    baseline_path = os.path.join(HERE, BASELINE_PATH)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline written to {BASELINE_PATH}")
+    if args.check:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print(f"\n❌ Regressions against {BASELINE_PATH}:")
+            for problem in problems:
+                print(f"  - {problem}")
+            raise SystemExit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {BASELINE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
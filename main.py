@@ -1,26 +1,21 @@
-from groq import Groq
 from dotenv import load_dotenv
 import json
 import os
-import google.generativeai as genai
 import uuid
-from elevenlabs.client import ElevenLabs
 import time
+import hashlib
+import threading
+import checkpoints
+import judges
+import prompt_deltas
+import providers
+import tracing
+import tts_formats
 
 load_dotenv()
 
-client = Groq()
-
-# Initialize Gemini client
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if gemini_api_key:
-    genai.configure(api_key=gemini_api_key)
-
-# Initialize ElevenLabs client for TTS
-elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
-elevenlabs_client = None
-if elevenlabs_api_key:
-    elevenlabs_client = ElevenLabs(api_key=elevenlabs_api_key)
+# Groq, Gemini and ElevenLabs clients are imported and built lazily on first
+# use via providers.get(), so CLI startup doesn't pay for unused SDKs
 
 # Voice IDs for different speakers
 COLLECTOR_VOICE_ID = "bIHbv24MWmeRgasZH58o"  # Roger
@@ -31,6 +26,42 @@ DEBT_COLLECTOR_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 DEFAULTER_MODEL = "openai/gpt-oss-120b"
 JUDGE_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
+# Judge ensemble: judges run in parallel and the verdict returns once JUDGE_QUORUM agree.
+# Each entry is (provider, model, temperature); repeat an entry to add more samples.
+JUDGE_ENSEMBLE_ENABLED = os.getenv("JUDGE_ENSEMBLE", "0") == "1"
+JUDGE_ENSEMBLE = [
+    ("gemini", "gemini-2.0-flash-exp", 0.2),
+    ("groq", JUDGE_MODEL, 0.2),
+    ("groq", DEFAULTER_MODEL, 0.2),
+]
+JUDGE_QUORUM = int(os.getenv("JUDGE_QUORUM", "2"))
+
+# Ask judges for schema-constrained JSON where the provider supports it
+JUDGE_STRUCTURED_OUTPUT = os.getenv("JUDGE_STRUCTURED_OUTPUT", "1") == "1"
+
+# Start scenario runs from the closest previously passing prompt (prompt_library.py)
+PROMPT_LIBRARY_ENABLED = os.getenv("PROMPT_LIBRARY", "0") == "1"
+
+# "full" asks the optimizer for a rewritten prompt; "rules" asks only for new
+# rules to append, which cuts optimizer output tokens and latency
+OPTIMIZER_MODE = os.getenv("OPTIMIZER_MODE", "full")
+
+# Pick collector/defaulter/judge/optimizer models per call from router.py pools
+# using live latency, error rates and token prices instead of the constants above
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER", "0") == "1"
+
+# Re-send collector/defaulter turns that run past their p90 latency (hedging.py)
+HEDGE_REQUESTS_ENABLED = os.getenv("HEDGE_REQUESTS", "0") == "1"
+
+# Learned per-role token budgets, stop sequences and streamed reply cleaning (governor.py)
+OUTPUT_GOVERNOR_ENABLED = os.getenv("OUTPUT_GOVERNOR", "0") == "1"
+
+# Serve the collector's first turn from background-generated openers (openers.py)
+OPENER_POOL_ENABLED = os.getenv("OPENER_POOL", "0") == "1"
+
+# "record" captures provider calls and finished runs to cassettes, "replay" serves them (cassette.py)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")
+
 # Default configurations (can be overridden by user input)
 DEFAULT_COLLECTOR_PERSONALITY = "aggressive and firm"
 DEFAULT_CUSTOMER_NAME = "Alex"
@@ -135,24 +166,168 @@ If Judge said: "Agent was rude and used capital letters"
 Now fix this one:
 """
 
-def get_response(model: str, messages: list) -> str:
-    """Get a response from the specified model."""
-    completion = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.8,
-        max_completion_tokens=256,
-        top_p=1,
-        stream=False
-    )
-    return completion.choices[0].message.content
+OPTIMIZER_RULES_PROMPT = """
+You are a Senior Prompt Engineer and Debt Collection Compliance Trainer.
+
+A debt collector's conversation FAILED a compliance check. Do NOT rewrite its system prompt. Instead, write the smallest set of new rules that, appended to the current prompt, would have prevented this exact failure.
+
+You will receive:
+1. The current system prompt used by the collector
+2. The full conversation that failed
+3. The Judge's exact feedback (one short sentence)
+
+Rules you write must:
+- Target the specific mistake the Judge identified
+- Keep the collector firm and goal-oriented, but 100% compliant and professional
+- Not repeat rules the current prompt already contains
+- Be one short sentence each; 1-3 rules in total
+
+Output ONLY the new rules, one per line starting with "- ", inside <add_rules> tags. No explanations.
 
-def run_conversation(num_turns: int = 5):
-    """Run a conversation between debt collector and defaulter."""
+Now fix this one:
+"""
+
+# Token usage accumulated across all model calls in this process
+token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+_usage_lock = threading.Lock()
+# Wall-clock seconds of each collector/defaulter turn since the last run_scenario()
+turn_latencies = []
+# Turns answered per role and model since the last run_scenario() attempt (the router or a hedge may pick another)
+turn_models = {}
+
+def record_usage(prompt_tokens: int, completion_tokens: int, model: str = None):
+    """Add one call's token counts, and their cost at `model`'s prices, to the process-wide usage totals."""
+    cost = 0.0
+    if model:
+        import router  # Prices live with the model router
+        cost = router.token_cost(model, prompt_tokens, completion_tokens)
+    # Ensemble judges add from several threads
+    with _usage_lock:
+        token_usage["prompt_tokens"] += prompt_tokens or 0
+        token_usage["completion_tokens"] += completion_tokens or 0
+        token_usage["cost_usd"] += cost
+
+def count_model(models: dict, role: str, model: str):
+    """Count one turn of `role` answered by `model` in a {role: {model: turns}} dict."""
+    role_models = models.setdefault(role, {})
+    role_models[model] = role_models.get(model, 0) + 1
+
+def primary_model(models: dict, role: str, default: str) -> str:
+    """The model that answered most of a role's turns in a run; `default` if the role made none."""
+    role_models = models.get(role)
+    return max(role_models, key=role_models.get) if role_models else default
+
+def _tracked(fn) -> tuple:
+    """Call fn() and return (result, (prompt_tokens, completion_tokens) it added to token_usage)."""
+    before = dict(token_usage)
+    result = fn()
+    return result, (token_usage["prompt_tokens"] - before["prompt_tokens"],
+                    token_usage["completion_tokens"] - before["completion_tokens"])
+
+def get_response(model: str, messages: list, role: str = None) -> str:
+    """Get a response from the specified model (the router's pick for `role` with MODEL_ROUTER=1)."""
+    with tracing.span("turn", role=role, model=model):
+        if role and MODEL_ROUTER_ENABLED:
+            import router
+            response, _ = router.get_router().call(role, lambda provider, routed: _complete(routed, messages, role))
+            return response
+        return _complete(model, messages, role)[0]
+
+def get_opener(model: str, messages: list) -> str:
+    """The collector's first turn: a pooled opener for its system prompt with OPENER_POOL=1, else a live one."""
+    if OPENER_POOL_ENABLED:
+        import openers
+        start = time.perf_counter()
+        with tracing.span("turn", role="collector", model=model, opener="pool"):
+            pooled = openers.get_pool().take(model, messages[0]["content"], _opener_completion)
+        if pooled:
+            turn_latencies.append(round(time.perf_counter() - start, 3))
+            count_model(turn_models, "collector", model)
+            if pooled[1]:
+                record_usage(*pooled[1], model)
+            return pooled[0]
+    return get_response(model, messages, role="collector")
+
+def prefill_openers(collector_prompt: str):
+    """Start generating pooled openers for a new collector prompt (OPENER_POOL=1)."""
+    if OPENER_POOL_ENABLED:
+        import openers
+        openers.get_pool().prefill(DEBT_COLLECTOR_MODEL, collector_prompt, _opener_completion)
+
+def _opener_completion(model: str, messages: list) -> tuple:
+    # Generated off the critical path, so neither routed nor hedged
+    return _chat(model, messages, "collector")
+
+def _complete(model: str, messages: list, role: str = None) -> tuple:
+    """One chat completion, hedged for `role` with HEDGE_REQUESTS=1; records the winner's latency and tokens."""
+    start = time.perf_counter()
+    if role and HEDGE_REQUESTS_ENABLED:
+        import hedging
+        (text, model), usage = hedging.get_hedger().call(
+            role, lambda hedge_model: _chat_as(hedge_model, messages, role), model
+        )
+    else:
+        text, usage = _chat(model, messages, role)
+    turn_latencies.append(round(time.perf_counter() - start, 3))
+    if role:
+        count_model(turn_models, role, model)
+    if usage:
+        record_usage(*usage, model)
+    return text, usage
+
+def _chat_as(model: str, messages: list, role: str = None) -> tuple:
+    """_chat with the answering model returned beside the text: ((text, model), usage)."""
+    text, usage = _chat(model, messages, role)
+    return (text, model), usage
+
+def _chat(model: str, messages: list, role: str = None) -> tuple:
+    """One Groq chat completion; returns (text, (prompt_tokens, completion_tokens) or None).
+
+    With OUTPUT_GOVERNOR=1, `role` replies are streamed under the governor's
+    token budget and stop sequences and come back cleaned.
+    """
+    if role and OUTPUT_GOVERNOR_ENABLED:
+        import governor
+        gov = governor.get_governor()
+        options = gov.request_options(role)
+        with tracing.span("groq.chat", model=model, governed=True), providers.limit("groq"):
+            stream = providers.get("groq").chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.8,
+                top_p=1,
+                stream=True,
+                **options
+            )
+            return gov.consume(role, stream, options["max_completion_tokens"],
+                               sum(len(message["content"]) for message in messages))
+    with tracing.span("groq.chat", model=model), providers.limit("groq"):
+        completion = providers.get("groq").chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.8,
+            max_completion_tokens=256,
+            top_p=1,
+            stream=False
+        )
+    if not completion.usage:
+        return completion.choices[0].message.content, None
+    return completion.choices[0].message.content, (completion.usage.prompt_tokens, completion.usage.completion_tokens)
+
+def run_conversation(num_turns: int = 5, collector_system: str = None, defaulter_system: str = None,
+                     turns: list = None, on_turn=None):
+    """Run a conversation between debt collector and defaulter.
+
+    turns are {"role": "collector"|"defaulter", "content"} messages already
+    made (from a checkpoint); the conversation continues after them.
+    on_turn(role, content) is called after every new message.
+    """
+    turns = list(turns or [])
     
-    # Initialize conversation histories
-    collector_messages = [{"role": "system", "content": DEBT_COLLECTOR_SYSTEM}]
-    defaulter_messages = [{"role": "system", "content": DEFAULTER_SYSTEM}]
+    # Initialize conversation histories (defaults to the global scenario prompts)
+    collector_messages, defaulter_messages = checkpoints.histories(
+        collector_system or DEBT_COLLECTOR_SYSTEM, defaulter_system or DEFAULTER_SYSTEM, turns
+    )
     
     # Conversation log for the judge (simplified format)
     conversation_log = []
@@ -161,43 +336,34 @@ def run_conversation(num_turns: int = 5):
     print("DEBT COLLECTION CONVERSATION SIMULATION")
     print("=" * 60)
     print()
-    
-    # Debt collector starts the conversation
-    collector_response = get_response(DEBT_COLLECTOR_MODEL, collector_messages)
-    print(f"🏦 DEBT COLLECTOR: {collector_response}")
-    print()
-    
-    # Log for judge
-    conversation_log.append({"role": "collector", "content": collector_response})
-    
-    # Add collector's message to both histories
-    collector_messages.append({"role": "assistant", "content": collector_response})
-    defaulter_messages.append({"role": "user", "content": collector_response})
-    
-    for turn in range(num_turns):
-        # Defaulter responds
-        defaulter_response = get_response(DEFAULTER_MODEL, defaulter_messages)
-        print(f"👤 DEFAULTER: {defaulter_response}")
+    if turns:
+        print(f"↩️  Resuming after {len(turns)} checkpointed message(s)")
         print()
+    
+    # The collector opens, then each turn is a defaulter reply and a collector reply
+    for index in range(1 + 2 * num_turns):
+        if index < len(turns):
+            role, response = turns[index]["role"], turns[index]["content"]
+        elif index % 2 == 0:
+            role = "collector"
+            # Debt collector starts the conversation
+            response = (get_opener(DEBT_COLLECTOR_MODEL, collector_messages) if index == 0
+                        else get_response(DEBT_COLLECTOR_MODEL, collector_messages, role="collector"))
+            collector_messages.append({"role": "assistant", "content": response})
+            defaulter_messages.append({"role": "user", "content": response})
+        else:
+            role = "defaulter"
+            response = get_response(DEFAULTER_MODEL, defaulter_messages, role="defaulter")
+            defaulter_messages.append({"role": "assistant", "content": response})
+            collector_messages.append({"role": "user", "content": response})
+        if index >= len(turns) and on_turn:
+            on_turn(role, response)
         
-        # Log for judge
-        conversation_log.append({"role": "customer", "content": defaulter_response})
-        
-        # Update histories
-        defaulter_messages.append({"role": "assistant", "content": defaulter_response})
-        collector_messages.append({"role": "user", "content": defaulter_response})
-        
-        # Debt collector responds
-        collector_response = get_response(DEBT_COLLECTOR_MODEL, collector_messages)
-        print(f"🏦 DEBT COLLECTOR: {collector_response}")
+        print(f"🏦 DEBT COLLECTOR: {response}" if role == "collector" else f"👤 DEFAULTER: {response}")
         print()
         
         # Log for judge
-        conversation_log.append({"role": "collector", "content": collector_response})
-        
-        # Update histories
-        collector_messages.append({"role": "assistant", "content": collector_response})
-        defaulter_messages.append({"role": "user", "content": collector_response})
+        conversation_log.append({"role": "collector" if role == "collector" else "customer", "content": response})
     
     print("=" * 60)
     print("END OF CONVERSATION")
@@ -205,64 +371,140 @@ def run_conversation(num_turns: int = 5):
     
     return conversation_log
 
-def judge_conversation(conversation_log: list) -> dict:
-    """Judge the conversation for compliance using Gemini API."""
-    
-    # Format conversation for the judge
-    conversation_json = json.dumps(conversation_log, indent=2)
-    
-    # Combine system prompt and conversation for Gemini
-    full_prompt = f"{JUDGE_SYSTEM_PROMPT}\n\n{conversation_json}"
-    
-    try:
-        # Use Gemini 2.0 Flash for judging
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response_obj = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=256,
+def call_judge(provider: str, model: str, conversation_json: str, temperature: float = 0.2):
+    """Stream one judge model's raw output as text chunks.
+
+    With JUDGE_STRUCTURED_OUTPUT the provider is asked for schema-constrained
+    JSON (Gemini response schema, streamed; Groq JSON response format, which
+    Groq only supports on non-streamed calls).
+    """
+    with tracing.span(f"{provider}.judge", model=model), providers.limit(provider):
+        if provider == "gemini":
+            genai = providers.get("gemini")
+            config = {"temperature": temperature, "max_output_tokens": 256}
+            if JUDGE_STRUCTURED_OUTPUT:
+                config.update(response_mime_type="application/json", response_schema=judges.VERDICT_SCHEMA)
+            response_obj = genai.GenerativeModel(model).generate_content(
+                f"{JUDGE_SYSTEM_PROMPT}\n\n{conversation_json}",
+                generation_config=genai.types.GenerationConfig(**config),
+                stream=True
             )
-        )
-        response = response_obj.text
-    except Exception as e:
-        print(f"⚠️  Gemini API error: {e}. Falling back to Groq for Judge.")
-        # Fallback to Groq if Gemini fails
+            usage_metadata = None
+            try:
+                for chunk in response_obj:
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.parts:
+                        yield chunk.text
+            finally:
+                if usage_metadata:
+                    record_usage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count, model)
+            return
+
         judge_messages = [
             {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
             {"role": "user", "content": conversation_json}
         ]
-        completion = client.chat.completions.create(
-            model=JUDGE_MODEL,
+        if JUDGE_STRUCTURED_OUTPUT:
+            # Groq's JSON mode does not stream: one blocking call, handed to the parser as a single chunk
+            completion = providers.get("groq").chat.completions.create(
+                model=model,
+                messages=judge_messages,
+                temperature=temperature,
+                max_completion_tokens=256,
+                top_p=1,
+                stream=False,
+                response_format={"type": "json_object"}
+            )
+            if completion.usage:
+                record_usage(completion.usage.prompt_tokens, completion.usage.completion_tokens, model)
+            yield completion.choices[0].message.content or ""
+            return
+    
+        stream = providers.get("groq").chat.completions.create(
+            model=model,
             messages=judge_messages,
-            temperature=0.2,
+            temperature=temperature,
             max_completion_tokens=256,
             top_p=1,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.x_groq and chunk.x_groq.usage:
+                    record_usage(chunk.x_groq.usage.prompt_tokens, chunk.x_groq.usage.completion_tokens, model)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Stop the HTTP stream if the parser already has every field
+            stream.close()
+
+
+def judge_conversation(conversation_log: list) -> dict:
+    """Judge the conversation for compliance using Gemini API (or the judge ensemble)."""
+    with tracing.span("judge"):
+
+        # Format conversation for the judge
+        conversation_json = json.dumps(conversation_log, indent=2)
+
+        if JUDGE_ENSEMBLE_ENABLED:
+            # Fan out to every judge and stop at the first quorum
+            judge_fns = [
+                tracing.wrap(lambda log, provider=provider, model=model, temperature=temperature:
+                             judges.parse_verdict_stream(call_judge(provider, model, conversation_json, temperature)))
+                for provider, model, temperature in JUDGE_ENSEMBLE
+            ]
+            return judges.judge_ensemble(judge_fns, conversation_log, JUDGE_QUORUM)
+
+        if MODEL_ROUTER_ENABLED:
+            # An unreadable verdict counts as a failed call and moves on to the next judge model
+            import router
+            verdict, _ = router.get_router().call(
+                "judge",
+                lambda provider, model: _tracked(
+                    lambda: judges.parse_verdict_stream(call_judge(provider, model, conversation_json))
+                ),
+                ok=lambda verdict: not verdict.get("parse_error"),
+            )
+            return verdict
+
+        try:
+            # Use Gemini 2.0 Flash for judging, parsing fields as they stream in
+            return judges.parse_verdict_stream(call_judge("gemini", "gemini-2.0-flash-exp", conversation_json))
+        except Exception as e:
+            print(f"⚠️  Gemini API error: {e}. Falling back to Groq for Judge.")
+            tracing.annotate(fallback=f"{type(e).__name__}: {e}")
+            # Fallback to Groq if Gemini fails
+            return judges.parse_verdict_stream(call_judge("groq", JUDGE_MODEL, conversation_json))
+
+def _optimizer_completion(provider: str, model: str, full_prompt: str, max_tokens: int) -> tuple:
+    """One optimizer call on Gemini or Groq; returns ((text, model), (prompt_tokens, completion_tokens) or None)."""
+    if provider == "gemini":
+        genai = providers.get("gemini")
+        with tracing.span("gemini.optimize", model=model), providers.limit("gemini"):
+            response_obj = genai.GenerativeModel(model).generate_content(
+                full_prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.3,
+                    max_output_tokens=max_tokens,
+                )
+            )
+        usage_metadata = response_obj.usage_metadata
+        usage = (usage_metadata.prompt_token_count, usage_metadata.candidates_token_count) if usage_metadata else None
+        return (response_obj.text, model), usage
+    with tracing.span("groq.optimize", model=model), providers.limit("groq"):
+        completion = providers.get("groq").chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": full_prompt}],
+            temperature=0.3,
+            max_completion_tokens=max_tokens,
+            top_p=1,
             stream=False
         )
-        response = completion.choices[0].message.content
-    
-    # Parse JSON response
-    try:
-        # Try to extract JSON from response
-        start = response.find('{')
-        end = response.rfind('}') + 1
-        if start != -1 and end > start:
-            verdict = json.loads(response[start:end])
-        else:
-            verdict = json.loads(response)
-    except json.JSONDecodeError:
-        verdict = {
-            "pass": False,
-            "feedback": f"Judge response parsing error: {response[:100]}",
-            "hang_up_detected": False
-        }
-    
-    return verdict
+    usage = (completion.usage.prompt_tokens, completion.usage.completion_tokens) if completion.usage else None
+    return (completion.choices[0].message.content, model), usage
 
-def optimize_prompt(current_prompt: str, conversation_log: list, judge_feedback: str) -> str:
-    """Optimize the debt collector's prompt based on Judge feedback using Gemini."""
-    
+def optimizer_request(current_prompt: str, conversation_log: list, judge_feedback: str) -> tuple:
+    """(full optimizer prompt, max output tokens) for one failed conversation in OPTIMIZER_MODE."""
     # Format the input for the optimizer
     conversation_json = json.dumps(conversation_log, indent=2)
     
@@ -277,43 +519,64 @@ Judge's Feedback:
 {judge_feedback}
 """
     
-    full_prompt = f"{OPTIMIZER_SYSTEM_PROMPT}\n{optimizer_input}"
+    rules_mode = OPTIMIZER_MODE == "rules"
+    system_prompt = OPTIMIZER_RULES_PROMPT if rules_mode else OPTIMIZER_SYSTEM_PROMPT
+    full_prompt = f"{system_prompt}\n{optimizer_input}"
     
-    try:
-        # Use Gemini 2.0 Flash for optimization
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response_obj = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=1024,
-            )
-        )
-        response = response_obj.text
-        
-        # Extract the new prompt from <new_prompt> tags
-        start_tag = "<new_prompt>"
-        end_tag = "</new_prompt>"
-        start_idx = response.find(start_tag)
-        end_idx = response.find(end_tag)
+    max_tokens = 256 if rules_mode else 1024
+    return full_prompt, max_tokens
+
+def apply_optimizer_output(current_prompt: str, response: str) -> str:
+    """The improved prompt from the optimizer's raw output in OPTIMIZER_MODE."""
+    if OPTIMIZER_MODE == "rules":
+        # Append the targeted rules instead of replacing the whole prompt
+        return prompt_deltas.add_rules(current_prompt, prompt_deltas.extract_rules(response))
+    
+    # Extract the new prompt from <new_prompt> tags
+    start_tag = "<new_prompt>"
+    end_tag = "</new_prompt>"
+    start_idx = response.find(start_tag)
+    end_idx = response.find(end_tag)
+    
+    if start_idx != -1 and end_idx != -1:
+        new_prompt = response[start_idx + len(start_tag):end_idx].strip()
+        return new_prompt
+    else:
+        # If tags not found, return the whole response as prompt
+        print("⚠️  Could not find <new_prompt> tags, using full response")
+        return response.strip()
+
+def optimize_prompt(current_prompt: str, conversation_log: list, judge_feedback: str) -> str:
+    """Optimize the debt collector's prompt based on Judge feedback using Gemini."""
+    with tracing.span("optimize", mode=OPTIMIZER_MODE):
+        full_prompt, max_tokens = optimizer_request(current_prompt, conversation_log, judge_feedback)
+
+        try:
+            if MODEL_ROUTER_ENABLED:
+                import router
+                (response, model), usage = router.get_router().call(
+                    "optimizer", lambda provider, model: _optimizer_completion(provider, model, full_prompt, max_tokens)
+                )
+            else:
+                # Use Gemini 2.0 Flash for optimization
+                (response, model), usage = _optimizer_completion(
+                    "gemini", "gemini-2.0-flash-exp", full_prompt, max_tokens
+                )
+            if usage:
+                record_usage(*usage, model)
+                prompt_deltas.record_optimizer_output("rules" if OPTIMIZER_MODE == "rules" else "full", usage[1])
         
-        if start_idx != -1 and end_idx != -1:
-            new_prompt = response[start_idx + len(start_tag):end_idx].strip()
-            return new_prompt
-        else:
-            # If tags not found, return the whole response as prompt
-            print("⚠️  Could not find <new_prompt> tags, using full response")
-            return response.strip()
+            return apply_optimizer_output(current_prompt, response)
             
-    except Exception as e:
-        print(f"⚠️  Optimizer error: {e}. Keeping current prompt.")
-        return current_prompt
+        except Exception as e:
+            print(f"⚠️  Optimizer error: {e}. Keeping current prompt.")
+            return current_prompt
 
-def run_with_judge(num_turns: int = 5):
-    """Run conversation and then judge it."""
+def run_with_judge(num_turns: int = 5, turns: list = None, on_turn=None):
+    """Run conversation (continuing after any checkpointed turns) and then judge it."""
     
     # Run the conversation
-    conversation_log = run_conversation(num_turns)
+    conversation_log = run_conversation(num_turns, turns=turns, on_turn=on_turn)
     
     # Judge the conversation
     print()
@@ -329,69 +592,237 @@ def run_with_judge(num_turns: int = 5):
     print(f"Verdict: {status}")
     print(f"Feedback: {verdict.get('feedback', 'No feedback provided')}")
     print(f"Hang-up Detected: {'Yes' if verdict.get('hang_up_detected') else 'No'}")
+    if "confidence" in verdict:
+        votes = verdict["votes"]
+        print(f"Confidence: {verdict['confidence']:.0%} ({votes['pass']} pass / {votes['fail']} fail "
+              f"of {verdict['judges']} judges{', early consensus' if verdict['early'] else ''})")
     print()
     print("=" * 60)
     
     return verdict, conversation_log
 
-def run_training_loop(max_attempts: int = 3, num_turns: int = 5):
-    """Run the full training loop: Conversation → Judge → Optimize → Repeat until PASS."""
-    global DEBT_COLLECTOR_SYSTEM
+def run_training_loop(max_attempts: int = 3, num_turns: int = 5, config: dict = None, resume: dict = None):
+    """Run the full training loop: Conversation → Judge → Optimize → Repeat until PASS.
+
+    Every message, verdict and optimized prompt is checkpointed (checkpoints.py);
+    resume is a loaded checkpoint to continue from, with the attempt limits and
+    prompts of the original run.
+    """
+    global DEBT_COLLECTOR_SYSTEM, DEFAULTER_SYSTEM
     
     print("\n" + "#" * 60)
     print("🚀 STARTING TRAINING LOOP")
     print("#" * 60)
     
-    for attempt in range(1, max_attempts + 1):
-        print(f"\n{'='*60}")
-        print(f"📍 ATTEMPT {attempt}")
-        print(f"{'='*60}\n")
-        
-        # Run conversation and get judge verdict
-        verdict, conversation_log = run_with_judge(num_turns)
-        
-        # Check if passed
-        if verdict.get("pass"):
-            print("\n" + "#" * 60)
-            print("🎉 SUCCESS! Agent passed compliance check!")
-            print(f"✅ Took {attempt} attempt(s) to pass")
-            print("#" * 60)
-            print("\n📋 FINAL OPTIMIZED PROMPT:")
-            print("-" * 40)
-            print(DEBT_COLLECTOR_SYSTEM)
-            print("-" * 40)
-            
-            # Generate TTS for the successful conversation
-            audio_files = generate_tts_for_conversation(conversation_log)
-            
-            # Play the transcript with audio
-            if audio_files:
-                play_transcript_with_audio(conversation_log, audio_files)
-            
-            return True, attempt, DEBT_COLLECTOR_SYSTEM
-        
-        # If failed and not last attempt, optimize
-        if attempt < max_attempts:
-            print("\n" + "=" * 60)
-            print("🔧 OPTIMIZER: Improving prompt based on feedback...")
-            print("=" * 60)
-            
-            feedback = verdict.get('feedback', 'Unknown failure')
-            new_prompt = optimize_prompt(DEBT_COLLECTOR_SYSTEM, conversation_log, feedback)
-            
-            print("\n📝 NEW OPTIMIZED PROMPT:")
-            print("-" * 40)
-            print(new_prompt)
-            print("-" * 40)
-            
-            # Update the global prompt for next attempt
-            DEBT_COLLECTOR_SYSTEM = new_prompt
+    if resume:
+        run = resume["run"]
+        checkpoint = checkpoints.RunCheckpoint(resume["run_id"])
+        max_attempts, num_turns = run["max_attempts"], run["num_turns"]
+        DEFAULTER_SYSTEM = run["defaulter_prompt"]
+        first_attempt, DEBT_COLLECTOR_SYSTEM, turns, verdict = checkpoints.resume_point(resume)
+        # The attempt record is already written unless the run stopped between attempts
+        started_attempt = resume["attempt"]
+        print(f"↩️  Resuming run {checkpoint.run_id} at attempt {first_attempt} after {len(turns)} message(s)")
+    else:
+        checkpoint = checkpoints.RunCheckpoint()
+        checkpoint.start(config or {}, DEBT_COLLECTOR_SYSTEM, DEFAULTER_SYSTEM, max_attempts, num_turns, "cli")
+        first_attempt, turns, verdict, started_attempt = 1, [], None, 0
+    
+    prompt_history = prompt_deltas.PromptHistory(DEBT_COLLECTOR_SYSTEM)
+    
+    try:
+        for attempt in range(first_attempt, max_attempts + 1):
+            with tracing.span("attempt", attempt=attempt):
+                print(f"\n{'='*60}")
+                print(f"📍 ATTEMPT {attempt}")
+                print(f"{'='*60}\n")
+                if attempt != started_attempt:
+                    checkpoint.attempt(attempt, DEBT_COLLECTOR_SYSTEM)
+
+                # Run conversation and get judge verdict (a resumed attempt may already have one)
+                if verdict is None:
+                    verdict, conversation_log = run_with_judge(
+                        num_turns, turns, on_turn=lambda role, content: checkpoint.turn(attempt, role, content)
+                    )
+                    checkpoint.verdict(attempt, verdict)
+                else:
+                    conversation_log = checkpoints.conversation_log(turns)
+                    print(f"⚖️  Checkpointed verdict: {'✅ PASS' if verdict.get('pass') else '❌ FAIL'}")
+                    print(f"Feedback: {verdict.get('feedback', 'No feedback provided')}")
+                turns, attempt_verdict, verdict = [], verdict, None
+
+                # Check if passed
+                if attempt_verdict.get("pass"):
+                    checkpoint.finish(True, attempt)
+                    print("\n" + "#" * 60)
+                    print("🎉 SUCCESS! Agent passed compliance check!")
+                    print(f"✅ Took {attempt} attempt(s) to pass")
+                    print("#" * 60)
+                    print("\n📋 FINAL OPTIMIZED PROMPT:")
+                    print("-" * 40)
+                    print(DEBT_COLLECTOR_SYSTEM)
+                    print("-" * 40)
+                
+                    # Generate TTS for the successful conversation
+                    audio_files = generate_tts_for_conversation(conversation_log)
+                
+                    # Play the transcript with audio
+                    if audio_files:
+                        play_transcript_with_audio(conversation_log, audio_files)
+                
+                    return True, attempt, DEBT_COLLECTOR_SYSTEM
+
+                # If failed and not last attempt, optimize
+                if attempt < max_attempts:
+                    if attempt_verdict.get("parse_error"):
+                        judges.record_parse_retry()
+                    print("\n" + "=" * 60)
+                    print("🔧 OPTIMIZER: Improving prompt based on feedback...")
+                    print("=" * 60)
+                
+                    feedback = attempt_verdict.get('feedback', 'Unknown failure')
+                    new_prompt = optimize_prompt(DEBT_COLLECTOR_SYSTEM, conversation_log, feedback)
+                    checkpoint.prompt(attempt, new_prompt)
+                
+                    print(f"\n📝 PROMPT CHANGES (v{len(prompt_history)}):")
+                    print("-" * 40)
+                    print(prompt_deltas.render_diff_text(prompt_history.latest, new_prompt))
+                    print("-" * 40)
+                    prompt_history.add(new_prompt)
+                
+                    # Update the global prompt for next attempt
+                    DEBT_COLLECTOR_SYSTEM = new_prompt
+                    prefill_openers(new_prompt)
+    except BaseException:
+        checkpoint.close()
+        if checkpoints.exists(checkpoint.run_id, checkpoint.root):
+            print(f"\n💾 Run checkpointed; continue it with: python main.py --resume {checkpoint.run_id}")
+        raise
     
+    checkpoint.finish(False, max_attempts)
     print("\n" + "#" * 60)
     print(f"❌ FAILED: Agent did not pass after {max_attempts} attempts")
     print("#" * 60)
     return False, max_attempts, DEBT_COLLECTOR_SYSTEM
 
+def run_scenario(personality: str, company_name: str, customer_name: str, debt_amount: float,
+                 months_overdue: int, available_funds: float, max_attempts: int = 3, num_turns: int = 5,
+                 checkpoint: dict = None, on_attempt=None) -> dict:
+    """Run the training loop for one scenario without touching globals, TTS or playback.
+
+    Takes the same keys that get_user_inputs() returns and reports the verdict,
+    attempts used, token usage and wall-clock latency of the whole run.
+    on_attempt(state) is called after every attempt; passing that state back
+    as `checkpoint` resumes the run after its last completed attempt.
+    """
+    collector_prompt = get_debt_collector_prompt(company_name, customer_name, debt_amount, personality)
+    defaulter_prompt = get_defaulter_prompt(customer_name, debt_amount, months_overdue, available_funds)
+    
+    # Warm start from the closest previously passing prompt of the same scenario, if one is similar enough
+    library = None
+    warm_start = False
+    if PROMPT_LIBRARY_ENABLED:
+        import prompt_library
+        library = prompt_library.get_library()
+        if checkpoint is None:
+            library_prompt, _ = library.warm_start("cli", personality, company_name, customer_name, debt_amount,
+                                                   months_overdue, available_funds)
+            if library_prompt:
+                collector_prompt = library_prompt
+                warm_start = True
+    
+    state = {
+        "attempt": 0,
+        "passed": False,
+        "feedback": "",
+        "collector_prompt": collector_prompt,
+        "prompt_version": hashlib.sha1(collector_prompt.encode("utf-8")).hexdigest()[:12],
+        "warm_start": warm_start,
+        "parse_retry_attempts": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "latency_s": 0.0,
+        "turn_latencies_s": [],
+        "models": {},
+    }
+    if checkpoint:
+        state.update(checkpoint)
+    initial_prompt = state["collector_prompt"] if state["attempt"] == 0 else None
+    
+    while not state["passed"] and state["attempt"] < max_attempts:
+        attempt = state["attempt"] + 1
+        with tracing.span("attempt", attempt=attempt):
+            tokens_before = dict(token_usage)
+            turn_latencies.clear()
+            turn_models.clear()
+            start = time.perf_counter()
+
+            conversation_log = run_conversation(num_turns, state["collector_prompt"], defaulter_prompt)
+            verdict = judge_conversation(conversation_log)
+            state["feedback"] = verdict.get("feedback", "")
+            state["passed"] = bool(verdict.get("pass"))
+            if not state["passed"] and attempt < max_attempts:
+                if verdict.get("parse_error"):
+                    judges.record_parse_retry()
+                    state["parse_retry_attempts"] += 1
+                state["collector_prompt"] = optimize_prompt(
+                    state["collector_prompt"], conversation_log, state["feedback"] or "Unknown failure"
+                )
+                prefill_openers(state["collector_prompt"])
+
+            state["attempt"] = attempt
+            state["prompt_tokens"] += token_usage["prompt_tokens"] - tokens_before["prompt_tokens"]
+            state["completion_tokens"] += token_usage["completion_tokens"] - tokens_before["completion_tokens"]
+            state["cost_usd"] = round(state["cost_usd"] + token_usage["cost_usd"] - tokens_before["cost_usd"], 6)
+            state["latency_s"] = round(state["latency_s"] + time.perf_counter() - start, 3)
+            state["turn_latencies_s"] = state["turn_latencies_s"] + list(turn_latencies)
+            models = {role: dict(counts) for role, counts in state["models"].items()}
+            for role, counts in turn_models.items():
+                for model, turns in counts.items():
+                    models.setdefault(role, {})[model] = models.get(role, {}).get(model, 0) + turns
+            state["models"] = models
+        if on_attempt:
+            on_attempt(dict(state))
+    
+    if library:
+        library.record("cli", personality, company_name, customer_name, debt_amount, months_overdue, available_funds,
+                       state["passed"], state["attempt"], state["collector_prompt"], state["warm_start"])
+    
+    if CASSETTE_MODE == "record" and initial_prompt is not None:
+        import cassette
+        cassette.record_run({
+            "scenario": {"personality": personality, "company_name": company_name, "customer_name": customer_name,
+                         "debt_amount": debt_amount, "months_overdue": months_overdue,
+                         "available_funds": available_funds},
+            "max_attempts": max_attempts,
+            "num_turns": num_turns,
+            "initial_prompt": initial_prompt,
+            "prompt_version": state["prompt_version"],
+            "warm_start": state["warm_start"],
+            "passed": state["passed"],
+            "attempts": state["attempt"],
+        })
+    
+    return {
+        "passed": state["passed"],
+        "attempts": state["attempt"],
+        "warm_start": state["warm_start"],
+        "feedback": state["feedback"],
+        "final_prompt": state["collector_prompt"],
+        "prompt_version": state["prompt_version"],
+        "collector_model": primary_model(state["models"], "collector", DEBT_COLLECTOR_MODEL),
+        "defaulter_model": primary_model(state["models"], "defaulter", DEFAULTER_MODEL),
+        "models": state["models"],
+        "output_governor": "on" if OUTPUT_GOVERNOR_ENABLED else "off",
+        "prompt_tokens": state["prompt_tokens"],
+        "completion_tokens": state["completion_tokens"],
+        "cost_usd": state["cost_usd"],
+        "parse_retry_attempts": state["parse_retry_attempts"],
+        "latency_s": state["latency_s"],
+        "turn_latencies_s": state["turn_latencies_s"],
+    }
+
 def get_user_inputs():
     """Get scenario configuration from user."""
     global DEBT_COLLECTOR_SYSTEM, DEFAULTER_SYSTEM
@@ -447,7 +878,12 @@ def get_user_inputs():
 
 
 def generate_tts_for_conversation(conversation_log: list) -> list:
-    """Generate TTS audio for all messages in the conversation."""
+    """Generate TTS audio for all messages into a run-scoped spool; returns its manifest entries.
+
+    Clips are written by the spool's background thread, so synthesis of the
+    next message never waits on the disk.
+    """
+    elevenlabs_client = providers.get("elevenlabs")
     if not elevenlabs_client:
         print("⚠️  ElevenLabs client not available. Skipping TTS.")
         return []
@@ -456,7 +892,10 @@ def generate_tts_for_conversation(conversation_log: list) -> list:
     print("🔊 GENERATING AUDIO FOR TRANSCRIPT")
     print("=" * 60)
     
-    audio_files = []
+    import audio_spool
+    spool = audio_spool.AudioSpool()
+    if spool.removed:
+        print(f"🧹 Removed {len(spool.removed)} old spool run(s)")
     
     for idx, msg in enumerate(conversation_log):
         speaker = "🏦 DEBT COLLECTOR" if msg["role"] == "collector" else "👤 DEFAULTER"
@@ -467,32 +906,34 @@ def generate_tts_for_conversation(conversation_log: list) -> list:
             print(f"    Text: {msg['content'][:60]}...")
             
             # Generate audio
-            audio_generator = elevenlabs_client.text_to_speech.convert(
-                voice_id=voice_id,
-                text=msg["content"],
-                model_id="eleven_multilingual_v2",
-                output_format="mp3_44100_128"
-            )
-            
-            # Collect audio bytes
-            audio_bytes = b"".join(audio_generator)
-            
-            # Save to file
-            filename = f"audio_{idx:02d}_{msg['role']}.mp3"
-            with open(filename, 'wb') as f:
-                f.write(audio_bytes)
+            with tracing.span("elevenlabs.tts", voice_id=voice_id, chars=len(msg["content"])):
+                audio_generator = elevenlabs_client.text_to_speech.convert(
+                    voice_id=voice_id,
+                    text=msg["content"],
+                    model_id="eleven_multilingual_v2",
+                    output_format=tts_formats.CLI_OUTPUT_FORMAT
+                )
+                
+                # Collect audio bytes
+                audio_bytes = b"".join(audio_generator)
             
-            audio_files.append((filename, speaker, msg["content"]))
-            print(f"    ✅ Saved: {filename} ({len(audio_bytes)} bytes)")
+            # Hand off to the spool writer
+            filename = spool.put(idx, msg["role"], speaker, msg["content"], audio_bytes,
+                                 tts_formats.CLI_OUTPUT_FORMAT)
+            print(f"    ✅ Spooled: {filename} ({len(audio_bytes)} bytes)")
             
         except Exception as e:
             print(f"    ❌ Error: {e}")
     
-    return audio_files
+    entries = spool.close()
+    for error in spool.errors:
+        print(f"    ❌ Write error: {error}")
+    print(f"\n💾 {len(entries)} clip(s) in {spool.path}")
+    return entries
 
 
 def play_transcript_with_audio(conversation_log: list, audio_files: list):
-    """Display transcript and play audio files."""
+    """Display transcript and play the spooled clips through a single player process."""
     if not audio_files:
         print("\n⚠️  No audio files to play.")
         return
@@ -501,33 +942,180 @@ def play_transcript_with_audio(conversation_log: list, audio_files: list):
     print("🎧 PLAYING TRANSCRIPT WITH AUDIO")
     print("=" * 60)
     
-    for idx, (filename, speaker, content) in enumerate(audio_files):
-        print(f"\n[{idx + 1}/{len(audio_files)}] {speaker}")
-        print(f"    {content}")
-        print(f"    🎵 Playing: {filename}")
-        
-        # Try to play the audio file
+    def show(entry):
+        print(f"\n[{entry['index'] + 1}/{len(conversation_log)}] {entry['speaker']}")
+        print(f"    {entry['text']}")
+    
+    import audio_spool
+    if not audio_spool.play(audio_files, on_clip=show):
+        for entry in audio_files:
+            show(entry)
+        print(f"\n    ⚠️  Could not play audio (ffplay or mpg123 not found)")
+        print(f"    💾 Audio saved in: {os.path.dirname(audio_files[0]['file'])}")
+
+
+def _read_scenarios(stream):
+    """Yield scenario configs from a JSONL stream one line at a time, filling in defaults."""
+    import sys
+    defaults = {
+        "personality": DEFAULT_COLLECTOR_PERSONALITY,
+        "company_name": DEFAULT_COMPANY_NAME,
+        "customer_name": DEFAULT_CUSTOMER_NAME,
+        "debt_amount": DEFAULT_DEBT_AMOUNT,
+        "months_overdue": DEFAULT_MONTHS_OVERDUE,
+        "available_funds": DEFAULT_CUSTOMER_FUNDS,
+    }
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
         try:
-            import subprocess
-            # Try using ffplay (part of ffmpeg)
-            subprocess.run(['ffplay', '-nodisp', '-autoexit', filename], 
-                         capture_output=True, timeout=30)
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            try:
-                # Fallback: try using mpg123
-                subprocess.run(['mpg123', filename], 
-                             capture_output=True, timeout=30)
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                print(f"    ⚠️  Could not play audio (ffplay or mpg123 not found)")
-                print(f"    💾 Audio file saved as: {filename}")
-        
-        # Small delay between messages
-        time.sleep(0.5)
+            scenario = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"⚠️  Skipping line {line_no}: {e}", file=sys.stderr)
+            continue
+        yield {"id": scenario.pop("id", line_no), "config": {**defaults, **scenario}}
+
+
+def _run_batch_item(item: dict) -> dict:
+    """Run one batch scenario in a worker process with its console output discarded."""
+    import contextlib
+    import io
+    config = dict(item["config"])
+    max_attempts = config.pop("max_attempts", item["max_attempts"])
+    num_turns = config.pop("num_turns", item["num_turns"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        if item.get("trace") is None:
+            return run_scenario(**config, max_attempts=max_attempts, num_turns=num_turns)
+        with tracing.trace("run", profile=item["trace"]["profile"], source="batch", scenario=item["id"]):
+            return run_scenario(**config, max_attempts=max_attempts, num_turns=num_turns)
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 4, max_attempts: int = 3, num_turns: int = 5,
+              trace: dict = None) -> dict:
+    """Run scenarios from a JSONL file (or "-" for stdin) and write one JSONL result per run.
+
+    Scenarios are read lazily and at most a few per worker are in flight, so
+    memory stays constant however long the input is. Each result is written
+    as soon as its run finishes (completion order, not input order). With
+    `trace` ({"profile": [...]}) every run writes its own trace files.
+    """
+    import sys
+    import sweep
+    
+    source = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8")
+    sink = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    counts = {"runs": 0, "passed": 0, "errors": 0}
+    start = time.perf_counter()
+    
+    items = (
+        {**scenario, "max_attempts": max_attempts, "num_turns": num_turns, "trace": trace}
+        for scenario in _read_scenarios(source)
+    )
+    try:
+        for item, result, error in sweep.run_bounded(_run_batch_item, items, workers):
+            counts["runs"] += 1
+            record = {"id": item["id"], "config": item["config"]}
+            if error:
+                counts["errors"] += 1
+                record["error"] = str(error)
+            else:
+                counts["passed"] += int(result["passed"])
+                record.update(result)
+            sink.write(json.dumps(record) + "\n")
+            sink.flush()
+            status = "❌ ERROR" if error else ("✅ PASS" if result["passed"] else "❌ FAIL")
+            print(f"{status} [{counts['runs']}] scenario {item['id']}", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    
+    counts["elapsed_s"] = round(time.perf_counter() - start, 3)
+    print(f"🏁 {counts['runs']} run(s), {counts['passed']} passed, {counts['errors']} error(s) "
+          f"in {counts['elapsed_s']}s", file=sys.stderr)
+    return counts
 
 
 if __name__ == "__main__":
-    # Get user configuration
-    config = get_user_inputs()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Debt collection training loop (interactive by default).")
+    parser.add_argument("--batch", metavar="JSONL",
+                        help="Run scenarios from a JSONL file ('-' for stdin) without prompts, TTS or playback")
+    parser.add_argument("--output", default="-", help="Batch results JSONL file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel runs in batch mode")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--trace", action="store_true",
+                        help="Write a span trace and collapsed-stack flamegraph per run (tracing.py)")
+    parser.add_argument("--profile", action="append", choices=["cpu", "memory"], default=[],
+                        help="Also profile runs with cProfile (cpu) or tracemalloc (memory); implies --trace")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="RUN_ID",
+                        help="Continue a checkpointed run (default: the most recent one) instead of starting one")
+    args = parser.parse_args()
+    trace = {"profile": args.profile} if args.trace or args.profile else None
+    
+    if args.batch:
+        run_batch(args.batch, args.output, args.workers, args.max_attempts, args.turns, trace)
+        raise SystemExit(0)
+    
+    resume = None
+    if args.resume:
+        run_id = args.resume
+        if run_id == "latest":
+            runs = checkpoints.pending(source="cli")
+            if not runs:
+                raise SystemExit(f"No checkpointed CLI runs to resume in {checkpoints.CHECKPOINT_DIR}/")
+            run_id = runs[0]["run_id"]
+        try:
+            resume = checkpoints.load(run_id)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Cannot resume run {run_id}: {e}")
+        if resume["run"]["source"] != "cli":
+            raise SystemExit(f"Run {run_id} was started by the {resume['run']['source']} app; resume it there")
+        config = resume["run"]["config"]
+        prefill_openers(checkpoints.resume_point(resume)[1])
+    else:
+        # Openers for the default scenario generate while the user answers the prompts
+        prefill_openers(DEBT_COLLECTOR_SYSTEM)
+        
+        # Get user configuration
+        config = get_user_inputs()
     
     # Run the training loop with up to 3 attempts
-    run_training_loop(max_attempts=3, num_turns=5)
\ No newline at end of file
+    if trace is None:
+        run_training_loop(max_attempts=args.max_attempts, num_turns=args.turns, config=config, resume=resume)
+    else:
+        with tracing.trace("run", profile=trace["profile"], source="cli", **config) as run_trace:
+            run_training_loop(max_attempts=args.max_attempts, num_turns=args.turns, config=config, resume=resume)
+        print(f"\n🔬 Trace {run_trace.trace_id}: " + ", ".join(run_trace.files.values()))
+    
+    parsing = judges.parse_report()
+    print(f"\n🧾 Judge parsing: {parsing['strict']} strict, {parsing['tolerant']} tolerant, "
+          f"{parsing['failed']} failed; {parsing['retry_attempts']} extra attempt(s) caused by parse failures")
+    
+    deltas = prompt_deltas.report()
+    if deltas["prompt_versions"]["versions"]:
+        print(f"\n🧬 Prompt deltas: {deltas['prompt_versions']['delta_bytes']} bytes stored for "
+              f"{deltas['prompt_versions']['versions']} version(s) vs {deltas['prompt_versions']['full_bytes']} "
+              f"as full copies ({deltas['prompt_versions']['bytes_saved']} saved)")
+    
+    if HEDGE_REQUESTS_ENABLED:
+        import hedging
+        for role, report in hedging.get_hedger().report().items():
+            if "p99_s" in report:
+                print(f"\n🪁 Hedging ({role}): p99 {report['p99_s']}s vs {report['p99_unhedged_s']}s unhedged "
+                      f"({report['p99_improvement']:.1%} better) for {report['hedged']} extra request(s) "
+                      f"({report['extra_request_rate']:.1%}) and {report['wasted_tokens']} wasted tokens")
+    
+    if OPENER_POOL_ENABLED:
+        import openers
+        report = openers.get_pool().report()
+        print(f"\n🧊 Opener pool: {report['hit_rate']:.0%} hit rate over {report['requests']} attempt(s), "
+              f"{report['saved_s']}s first-turn latency saved, {report['unused_tokens']} tokens on unserved openers")
+    
+    if JUDGE_ENSEMBLE_ENABLED:
+        report = judges.ensemble_report()
+        print(f"\n⚖️  Judge ensemble: {report['early_consensus']}/{report['runs']} verdicts reached early consensus, "
+              f"{report['calls_skipped']}/{report['calls_total']} judge calls skipped")
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Pre-generated collector openers.
+
+The collector's first turn depends only on its system prompt, yet every
+attempt generated it serially before the defaulter could start. With
+OPENER_POOL=1 openers are generated in background threads and pooled per
+(model, prompt hash): prefill() starts one as soon as a prompt is created or
+optimized, for the attempt about to use it, and take() serves one, waiting
+on an in-flight generation if none is ready yet. Most prompts are used by a
+single attempt and then optimized away, so a miss generates nothing; only a
+prompt asked for again (repeated runs in sweeps and evaluations, the default
+prompt) is kept topped up to OPENER_POOL_SIZE. Each variant is served once,
+so repeated runs of a prompt still see independent openers.
+
+Pooled openers skip model routing and hedging, which only matter on the
+critical path. The report gives the hit rate, the first-turn latency saved
+(generation time minus any wait) and the tokens spent on openers never served.
+
+Usage:
+    python openers.py bench                 # pooled vs live openers on the stub provider
+    python openers.py bench --runs 20 --latency-ms 300
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+OPENER_POOL_SIZE = int(os.getenv("OPENER_POOL_SIZE", "3"))
+OPENER_POOL_THREADS = int(os.getenv("OPENER_POOL_THREADS", "4"))
+MAX_PROMPTS = int(os.getenv("OPENER_POOL_MAX_PROMPTS", "64"))  # Least recently used prompts are dropped
+
+
+def prompt_key(model: str, system_prompt: str) -> str:
+    return hashlib.sha1(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def _generate(generate, model: str, system_prompt: str) -> tuple:
+    start = time.perf_counter()
+    text, usage = generate(model, [{"role": "system", "content": system_prompt}])
+    return text, usage, time.perf_counter() - start
+
+
+def _tokens(usage) -> int:
+    return sum(usage) if usage else 0
+
+
+class OpenerPool:
+    """Background-generated first turns, kept per (model, system prompt)."""
+
+    def __init__(self, size: int = OPENER_POOL_SIZE, max_prompts: int = MAX_PROMPTS,
+                 threads: int = OPENER_POOL_THREADS):
+        self.size = size
+        self.max_prompts = max_prompts
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="opener")
+        self.pools = OrderedDict()  # prompt key -> deque of futures, oldest first
+        self.taken = {}  # prompt key -> times an opener was asked for
+        # Reentrant: a future that is already done runs its callback inside add_done_callback
+        self.lock = threading.RLock()
+        self.stats = {
+            "requests": 0, "hits": 0, "inflight_hits": 0, "misses": 0,
+            "generated": 0, "errors": 0, "evicted": 0,
+            "generated_tokens": 0, "served_tokens": 0, "saved_s": 0.0, "waited_s": 0.0,
+        }
+
+    def _top_up(self, key: str, model: str, system_prompt: str, generate, size: int) -> list:
+        """Submit generations until the prompt has `size` openers; returns futures evicted to make room."""
+        futures = self.pools.setdefault(key, deque())
+        self.pools.move_to_end(key)
+        while len(futures) < size:
+            future = self.executor.submit(_generate, generate, model, system_prompt)
+            future.add_done_callback(self._generated)
+            futures.append(future)
+        evicted = []
+        while len(self.pools) > self.max_prompts:
+            old_key, old = self.pools.popitem(last=False)
+            self.taken.pop(old_key, None)
+            evicted.extend(old)
+        return evicted
+
+    def _generated(self, future):
+        with self.lock:
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.stats["errors"] += 1
+                return
+            self.stats["generated"] += 1
+            self.stats["generated_tokens"] += _tokens(future.result()[1])
+
+    def _evict(self, futures: list):
+        for future in futures:
+            future.cancel()  # Running generations finish and are counted as unused
+        if futures:
+            with self.lock:
+                self.stats["evicted"] += len(futures)
+
+    def prefill(self, model: str, system_prompt: str, generate):
+        """Start generating an opener for a prompt about to be used; generate(model, messages) returns (text, usage)."""
+        key = prompt_key(model, system_prompt)
+        with self.lock:
+            evicted = self._top_up(key, model, system_prompt, generate, 1)
+        self._evict(evicted)
+
+    def take(self, model: str, system_prompt: str, generate) -> tuple:
+        """A pooled (text, usage) opener for the prompt, or None on a miss.
+
+        A prompt asked for before is topped back up to `size` openers either way.
+        """
+        key = prompt_key(model, system_prompt)
+        with self.lock:
+            self.stats["requests"] += 1
+            taken_before = self.taken.get(key, 0)
+            self.taken[key] = taken_before + 1
+            futures = self.pools.get(key, deque())
+            # Failed generations are dropped; a ready opener beats waiting on one in flight
+            for failed in [f for f in futures if f.done() and (f.cancelled() or f.exception() is not None)]:
+                futures.remove(failed)
+            future = next((f for f in futures if f.done()), futures[0] if futures else None)
+            if future is not None:
+                futures.remove(future)
+            ready = future is not None and future.done()
+            if future is None:
+                self.stats["misses"] += 1
+            # Only a prompt that is being reused gets openers generated ahead of time
+            evicted = self._top_up(key, model, system_prompt, generate, self.size if taken_before else 0)
+        self._evict(evicted)
+        if future is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            text, usage, generation_s = future.result()
+        except Exception:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.stats["hits" if ready else "inflight_hits"] += 1
+            self.stats["served_tokens"] += _tokens(usage)
+            self.stats["saved_s"] += max(0.0, generation_s - waited)
+            self.stats["waited_s"] += waited
+        return text, usage
+
+    def report(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            ready = sum(1 for futures in self.pools.values() for f in futures if f.done())
+            prompts = len(self.pools)
+        served = stats["hits"] + stats["inflight_hits"]
+        return {
+            **stats,
+            "saved_s": round(stats["saved_s"], 3),
+            "waited_s": round(stats["waited_s"], 3),
+            "hit_rate": round(served / stats["requests"], 4) if stats["requests"] else 0.0,
+            "mean_saved_first_turn_s": round(stats["saved_s"] / served, 3) if served else 0.0,
+            # Tokens spent on openers generated but not (yet) served
+            "unused_tokens": stats["generated_tokens"] - stats["served_tokens"],
+            "prompts": prompts,
+            "ready": ready,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> OpenerPool:
+    """Process-wide opener pool (each worker process of a sweep or evaluation has its own)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OpenerPool()
+        return _pool
+
+
+def bench(runs: int, num_turns: int = 3, max_attempts: int = 2) -> dict:
+    """The same scenario run repeatedly with live and pooled openers against the stub provider."""
+    import contextlib
+    import io
+    import main
+    import openers
+
+    results = {}
+    for name, enabled in (("live", False), ("pooled", True)):
+        main.OPENER_POOL_ENABLED = enabled
+        first_turns, run_latencies = [], []
+        for _ in range(runs):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = main.run_scenario(
+                    personality=main.DEFAULT_COLLECTOR_PERSONALITY, company_name=main.DEFAULT_COMPANY_NAME,
+                    customer_name=main.DEFAULT_CUSTOMER_NAME, debt_amount=main.DEFAULT_DEBT_AMOUNT,
+                    months_overdue=main.DEFAULT_MONTHS_OVERDUE, available_funds=main.DEFAULT_CUSTOMER_FUNDS,
+                    max_attempts=max_attempts, num_turns=num_turns,
+                )
+            # Each attempt is the opener plus num_turns defaulter/collector pairs
+            turns = result["turn_latencies_s"]
+            first_turns.extend(turns[::1 + 2 * num_turns])
+            run_latencies.append(result["latency_s"])
+        results[name] = {
+            "mean_first_turn_s": round(sum(first_turns) / len(first_turns), 4),
+            "mean_run_s": round(sum(run_latencies) / len(run_latencies), 4),
+        }
+    # main.py uses the imported module, not this script's __main__
+    results["pool"] = openers.get_pool().report()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collector opener pool utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="Pooled vs live openers against the local stub provider")
+    bench_parser.add_argument("--runs", type=int, default=20)
+    bench_parser.add_argument("--turns", type=int, default=3)
+    bench_parser.add_argument("--latency-ms", type=float, default=200, help="Simulated latency per stub call")
+    args = parser.parse_args()
+
+    # Must be set before main is imported
+    os.environ.update({
+        "PROVIDER_STUB": "1",
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "PROMPT_LIBRARY": "0",
+    })
+
+    results = bench(args.runs, args.turns)
+    live, pooled, pool = results["live"], results["pooled"], results["pool"]
+    print("=" * 60)
+    print("🧊 OPENER POOL BENCHMARK")
+    print("=" * 60)
+    print(f"{args.runs} runs of one scenario, {args.latency_ms:.0f} ms per stub call")
+    print(f"First turn:  {live['mean_first_turn_s'] * 1000:.0f} ms live -> "
+          f"{pooled['mean_first_turn_s'] * 1000:.0f} ms pooled")
+    print(f"Whole run:   {live['mean_run_s']:.3f}s live -> {pooled['mean_run_s']:.3f}s pooled")
+    print(f"Pool: {pool['hit_rate']:.0%} hit rate ({pool['hits']} ready, {pool['inflight_hits']} in flight, "
+          f"{pool['misses']} misses), {pool['saved_s']:.2f}s first-turn latency saved, "
+          f"{pool['unused_tokens']} tokens on unserved openers")
+
+
+if __name__ == "__main__":
+    main()
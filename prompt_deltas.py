@@ -0,0 +1,177 @@
+"""
+Prompt version history stored as a delta chain.
+
+Each optimizer round produces a new collector prompt that usually shares most
+of its lines with the previous one. PromptHistory keeps the base prompt in
+full and every later version as a line-level delta against its predecessor,
+and render_diff_html() renders only the changed lines for the web UI.
+
+Process-wide counters compare full-copy bytes with delta bytes, and optimizer
+output tokens for full rewrites vs. rule additions.
+"""
+
+import html
+import json
+import threading
+from difflib import SequenceMatcher
+
+# Heading the rule-addition optimizer mode appends new rules under
+ADDED_RULES_HEADING = "**Additional Compliance Rules:**"
+
+delta_stats = {
+    "versions": 0,
+    "full_bytes": 0,
+    "delta_bytes": 0,
+}
+optimizer_stats = {
+    "full": {"calls": 0, "output_tokens": 0},
+    "rules": {"calls": 0, "output_tokens": 0},
+}
+_stats_lock = threading.Lock()
+
+
+def make_delta(old: str, new: str) -> list:
+    """Line-level delta turning old into new: ["=", n] keep, ["-", n] drop, ["+", text] insert."""
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", "".join(b[j1:j2])])
+    return ops
+
+
+def apply_delta(old: str, ops: list) -> str:
+    """Rebuild the newer text from the older text and a delta."""
+    a = old.splitlines(keepends=True)
+    out = []
+    i = 0
+    for op, arg in ops:
+        if op == "=":
+            out.extend(a[i:i + arg])
+            i += arg
+        elif op == "-":
+            i += arg
+        else:
+            out.append(arg)
+    return "".join(out)
+
+
+class PromptHistory:
+    """Prompt versions stored as a base plus a chain of deltas."""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.deltas = []
+        self._latest = base
+
+    def __len__(self):
+        return len(self.deltas) + 1
+
+    @property
+    def latest(self) -> str:
+        return self._latest
+
+    def add(self, prompt: str) -> list:
+        """Store a new version; returns its delta against the previous version."""
+        ops = make_delta(self._latest, prompt)
+        self.deltas.append(ops)
+        self._latest = prompt
+        with _stats_lock:
+            delta_stats["versions"] += 1
+            delta_stats["full_bytes"] += len(prompt.encode("utf-8"))
+            delta_stats["delta_bytes"] += len(json.dumps(ops, separators=(",", ":")).encode("utf-8"))
+        return ops
+
+    def get(self, version: int) -> str:
+        """Reconstruct a version (0 = base) by replaying the delta chain."""
+        prompt = self.base
+        for ops in self.deltas[:version]:
+            prompt = apply_delta(prompt, ops)
+        return prompt
+
+
+def render_diff_html(old: str, new: str) -> str:
+    """Changed lines only, as HTML spans (unchanged runs collapse to a count)."""
+    a = old.splitlines()
+    b = new.splitlines()
+    parts = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            parts.append(f'<span class="diff-same">… {i2 - i1} unchanged line(s)</span>')
+            continue
+        for line in a[i1:i2]:
+            parts.append(f'<span class="diff-del">- {html.escape(line)}</span>')
+        for line in b[j1:j2]:
+            parts.append(f'<span class="diff-add">+ {html.escape(line)}</span>')
+    return "\n".join(parts)
+
+
+def render_diff_text(old: str, new: str) -> str:
+    """Changed lines only, as plain text for the CLI."""
+    a = old.splitlines()
+    b = new.splitlines()
+    lines = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            lines.append(f"  … {i2 - i1} unchanged line(s)")
+            continue
+        lines.extend(f"- {line}" for line in a[i1:i2])
+        lines.extend(f"+ {line}" for line in b[j1:j2])
+    return "\n".join(lines)
+
+
+def extract_rules(response: str) -> list:
+    """Rule lines from an optimizer response in rule-addition mode."""
+    start_tag = "<add_rules>"
+    end_tag = "</add_rules>"
+    start_idx = response.find(start_tag)
+    end_idx = response.find(end_tag)
+    if start_idx != -1 and end_idx != -1:
+        response = response[start_idx + len(start_tag):end_idx]
+    rules = []
+    for line in response.splitlines():
+        line = line.strip().lstrip("-*• ").strip()
+        if line:
+            rules.append(line)
+    return rules
+
+
+def add_rules(prompt: str, rules: list) -> str:
+    """Append new rules (skipping ones already present) under the added-rules heading."""
+    new_rules = [rule for rule in rules if rule not in prompt]
+    if not new_rules:
+        return prompt
+    if ADDED_RULES_HEADING not in prompt:
+        prompt = prompt.rstrip() + f"\n\n{ADDED_RULES_HEADING}\n"
+    elif not prompt.endswith("\n"):
+        prompt += "\n"
+    return prompt + "".join(f"- {rule}\n" for rule in new_rules)
+
+
+def record_optimizer_output(mode: str, output_tokens: int):
+    """Count one optimizer call's output tokens for the given mode ("full" or "rules")."""
+    with _stats_lock:
+        optimizer_stats[mode]["calls"] += 1
+        optimizer_stats[mode]["output_tokens"] += output_tokens or 0
+
+
+def report() -> dict:
+    """Bytes saved by delta storage and optimizer output tokens per call by mode."""
+    with _stats_lock:
+        deltas = dict(delta_stats)
+        optimizer = {mode: dict(stats) for mode, stats in optimizer_stats.items()}
+    deltas["bytes_saved"] = deltas["full_bytes"] - deltas["delta_bytes"]
+    for stats in optimizer.values():
+        stats["mean_output_tokens"] = round(stats["output_tokens"] / stats["calls"], 1) if stats["calls"] else None
+    full, rules = optimizer["full"]["mean_output_tokens"], optimizer["rules"]["mean_output_tokens"]
+    return {
+        "prompt_versions": deltas,
+        "optimizer": optimizer,
+        "optimizer_output_token_reduction": round(1 - rules / full, 4) if full and rules is not None else None,
+    }
@@ -0,0 +1,224 @@
+"""
+Library of passing collector prompts for warm-starting new scenarios.
+
+Every finished training run is appended to a JSONL library file. Runs that
+passed contribute their final prompt, indexed by a scenario feature vector
+(personality one-hot, debt/funds ratio, months overdue). New runs look up the
+nearest passing prompt with a vectorized cosine similarity and start from it
+instead of the aggressive template, and the library reports mean
+attempts-to-pass for warm vs. cold starts.
+
+Passing prompts spell out the company, the customer's name and the amounts
+(and the optimizer adds figures derived from them), so a prompt is only a
+candidate for a scenario with the same personality, company, customer, debt
+and available funds; similarity then ranks the candidates by months overdue.
+The CLI (main.py) and the web app share the library file but judge and
+template prompts differently, so entries also record their source and a
+prompt is only reused by the side that passed it.
+
+Usage:
+    python prompt_library.py report
+    python prompt_library.py lookup --source web --personality "polite but persistent" --company "ABC Credit Card Company" \
+        --customer Alex --debt 2500 --months 3 --funds 400
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_LIBRARY_PATH = os.getenv("PROMPT_LIBRARY_PATH", "prompt_library.jsonl")
+# Minimum cosine similarity for a library prompt to be used as a warm start
+MIN_SIMILARITY = 0.95
+
+# Personalities offered in the web form; anything else shares the last slot
+KNOWN_PERSONALITIES = [
+    "aggressive and firm",
+    "polite but persistent",
+    "empathetic and understanding",
+    "professional and neutral",
+    "friendly but assertive",
+]
+
+
+def scenario_features(personality: str, debt_amount: float, months_overdue: int, available_funds: float) -> np.ndarray:
+    """Feature vector for a scenario: personality one-hot, debt/funds ratio, months overdue."""
+    vector = np.zeros(len(KNOWN_PERSONALITIES) + 3)
+    personality = personality.strip().lower()
+    slot = KNOWN_PERSONALITIES.index(personality) if personality in KNOWN_PERSONALITIES else len(KNOWN_PERSONALITIES)
+    vector[slot] = 1.0
+    # Log-scaled so a 2x change in affordability matters the same at any debt size
+    ratio = debt_amount / max(available_funds, 1.0)
+    vector[-2] = math.log1p(ratio) / math.log1p(100)
+    vector[-1] = min(months_overdue, 24) / 24
+    return vector
+
+
+def scenario_key(source: str, personality: str, company_name: str, customer_name: str, debt_amount: float,
+                 available_funds: float) -> tuple:
+    """The app ("cli" or "web") and scenario values a stored prompt passed under; only prompts with the same key are reused."""
+    return (source, personality.strip().lower(), company_name.strip(), customer_name.strip(),
+            round(float(debt_amount), 2), round(float(available_funds), 2))
+
+
+class PromptLibrary:
+    """Passing prompts and run outcomes, loaded incrementally from a JSONL file."""
+
+    def __init__(self, path: str = DEFAULT_LIBRARY_PATH):
+        self.path = path
+        self.offset = 0
+        self.prompts = []
+        self.vectors = []
+        self.keys = []
+        self.matrix = None
+        self.outcomes = {"warm": [], "cold": []}
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Load entries appended since the last refresh (including other processes' writes)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        self.offset += end
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._index(entry)
+
+    def _index(self, entry: dict):
+        start = "warm" if entry.get("warm_start") else "cold"
+        self.outcomes[start].append((entry["attempts"], entry["passed"]))
+        # Entries written before the company, customer and source were recorded can't be matched safely
+        if entry["passed"] and "company_name" in entry and "source" in entry:
+            self.keys.append(scenario_key(entry["source"], entry["personality"], entry["company_name"], entry["customer_name"],
+                                          entry["debt_amount"], entry["available_funds"]))
+            self.prompts.append(entry["final_prompt"])
+            self.vectors.append(scenario_features(
+                entry["personality"], entry["debt_amount"], entry["months_overdue"], entry["available_funds"]
+            ))
+            self.matrix = None
+
+    def nearest(self, source: str, personality: str, company_name: str, customer_name: str, debt_amount: float,
+                months_overdue: int, available_funds: float) -> tuple:
+        """Return (prompt, similarity) of the closest passing prompt for the same scenario key, or (None, 0.0)."""
+        key = scenario_key(source, personality, company_name, customer_name, debt_amount, available_funds)
+        with self.lock:
+            self.refresh()
+            candidates = np.array([entry_key == key for entry_key in self.keys], dtype=bool)
+            if not candidates.any():
+                return None, 0.0
+            if self.matrix is None:
+                matrix = np.stack(self.vectors)
+                self.matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+            query = scenario_features(personality, debt_amount, months_overdue, available_funds)
+            similarities = np.where(candidates, self.matrix @ (query / np.linalg.norm(query)), -np.inf)
+            best = int(np.argmax(similarities))
+            return self.prompts[best], float(similarities[best])
+
+    def warm_start(self, source: str, personality: str, company_name: str, customer_name: str, debt_amount: float,
+                   months_overdue: int, available_funds: float, min_similarity: float = MIN_SIMILARITY) -> tuple:
+        """Closest known-good prompt if it is similar enough, else (None, similarity)."""
+        prompt, similarity = self.nearest(source, personality, company_name, customer_name, debt_amount, months_overdue,
+                                          available_funds)
+        if similarity < min_similarity:
+            return None, similarity
+        return prompt, similarity
+
+    def record(self, source: str, personality: str, company_name: str, customer_name: str, debt_amount: float,
+               months_overdue: int, available_funds: float, passed: bool, attempts: int, final_prompt: str,
+               warm_start: bool):
+        """Append one finished run; passing runs become warm-start candidates."""
+        entry = {
+            "source": source,
+            "personality": personality,
+            "company_name": company_name,
+            "customer_name": customer_name,
+            "debt_amount": debt_amount,
+            "months_overdue": months_overdue,
+            "available_funds": available_funds,
+            "passed": passed,
+            "attempts": attempts,
+            "warm_start": warm_start,
+            "final_prompt": final_prompt if passed else None,
+        }
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def report(self) -> dict:
+        """Mean attempts-to-pass and pass rate for warm vs. cold starts, and the reduction."""
+        with self.lock:
+            self.refresh()
+            outcomes = {start: np.array(runs, dtype=float).reshape(-1, 2) for start, runs in self.outcomes.items()}
+            prompts = len(self.prompts)
+        report = {"prompts": prompts}
+        for start, runs in outcomes.items():
+            attempts, passed = runs[:, 0], runs[:, 1].astype(bool)
+            report[f"{start}_runs"] = len(runs)
+            report[f"{start}_pass_rate"] = round(float(passed.mean()), 4) if len(runs) else None
+            report[f"{start}_mean_attempts_to_pass"] = round(float(attempts[passed].mean()), 3) if passed.any() else None
+        warm, cold = report["warm_mean_attempts_to_pass"], report["cold_mean_attempts_to_pass"]
+        report["attempt_reduction"] = round(1 - warm / cold, 4) if warm is not None and cold else None
+        return report
+
+
+_libraries = {}
+
+
+def get_library(path: str = DEFAULT_LIBRARY_PATH) -> PromptLibrary:
+    """Process-wide shared library instance for a path."""
+    if path not in _libraries:
+        _libraries[path] = PromptLibrary(path)
+    return _libraries[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Passing-prompt library for warm starts.")
+    parser.add_argument("--library", default=DEFAULT_LIBRARY_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="Warm vs. cold pass rate and mean attempts to pass")
+    lookup = sub.add_parser("lookup", help="Show the closest passing prompt for a scenario")
+    lookup.add_argument("--source", choices=("cli", "web"), default="cli", help="App whose passing prompts to search")
+    lookup.add_argument("--personality", default=KNOWN_PERSONALITIES[0])
+    lookup.add_argument("--company", default="ABC Credit Card Company")
+    lookup.add_argument("--customer", default="Alex")
+    lookup.add_argument("--debt", type=float, default=2500)
+    lookup.add_argument("--months", type=int, default=3)
+    lookup.add_argument("--funds", type=float, default=400)
+    args = parser.parse_args()
+
+    library = PromptLibrary(args.library)
+    if args.command == "report":
+        report = library.report()
+        print("=" * 60)
+        print("📚 PROMPT LIBRARY")
+        print("=" * 60)
+        print(f"Passing prompts: {report['prompts']}")
+        for start in ("cold", "warm"):
+            print(f"{start.title()} starts: {report[f'{start}_runs']} runs, pass rate {report[f'{start}_pass_rate']}, "
+                  f"mean attempts to pass {report[f'{start}_mean_attempts_to_pass']}")
+        if report["attempt_reduction"] is not None:
+            print(f"Reduction in mean attempts to pass: {report['attempt_reduction']:.1%}")
+    else:
+        prompt, similarity = library.nearest(args.source, args.personality, args.company, args.customer, args.debt, args.months,
+                                             args.funds)
+        if prompt is None:
+            print("No passing prompts for this scenario in the library yet.")
+        else:
+            print(f"Similarity: {similarity:.3f}")
+            print("-" * 40)
+            print(prompt)
+
+
+if __name__ == "__main__":
+    main()
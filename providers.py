@@ -0,0 +1,118 @@
+"""
+Provider registry with lazy SDK imports.
+
+Provider SDKs (groq, google.generativeai, elevenlabs) are slow to import and
+their clients read API keys at construction, so nothing is imported or built
+until a provider is first requested with get(). Factories can be replaced with
+register(), e.g. to point a provider at a local stub; PROVIDER_STUB=1 swaps
+all of them for stub_provider.py (inherited by worker processes), and
+CASSETTE_MODE=record|replay puts cassette.py in front of Groq and Gemini.
+
+Calls can be capped per provider: wrap them in `with limit(name):` and set
+caps with set_limits() or PROVIDER_CONCURRENCY="groq=4,gemini=2".
+"""
+
+import contextlib
+import functools
+import os
+import threading
+
+_factories = {}
+_clients = {}
+_lock = threading.Lock()
+_limits = {}
+
+
+def register(name: str, factory):
+    """Register (or replace) the zero-argument factory for a provider."""
+    with _lock:
+        _factories[name] = factory
+        _clients.pop(name, None)
+
+
+def get(name: str):
+    """Return the provider's client, importing and constructing it on first use."""
+    client = _clients.get(name)
+    if client is not None or name in _clients:
+        return client
+    with _lock:
+        if name not in _clients:
+            if name not in _factories:
+                raise KeyError(f"Unknown provider: {name}")
+            _clients[name] = _factories[name]()
+        return _clients[name]
+
+
+def parse_limits(spec: str) -> dict:
+    """Parse "groq=4,gemini=2" into {"groq": 4, "gemini": 2}."""
+    limits = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, value = part.partition("=")
+            limits[name.strip()] = int(value)
+    return limits
+
+
+def set_limits(limits: dict):
+    """Cap concurrent calls per provider.
+
+    Values are slot counts, or semaphores shared between worker processes
+    (e.g. multiprocessing.BoundedSemaphore) to cap a whole process pool.
+    """
+    for name, value in limits.items():
+        _limits[name] = threading.BoundedSemaphore(value) if isinstance(value, int) else value
+
+
+def limit(name: str):
+    """Context manager holding one of the provider's call slots (no-op when uncapped)."""
+    return _limits.get(name) or contextlib.nullcontext()
+
+
+def loaded() -> list:
+    """Names of providers whose clients have been constructed."""
+    return sorted(_clients)
+
+
+def _groq():
+    from groq import Groq
+    return Groq()
+
+
+def _gemini():
+    # The module itself is the client; configure it once with the API key
+    import google.generativeai as genai
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if gemini_api_key:
+        genai.configure(api_key=gemini_api_key)
+    return genai
+
+
+def _elevenlabs():
+    elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not elevenlabs_api_key:
+        return None
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=elevenlabs_api_key)
+
+
+register("groq", _groq)
+register("gemini", _gemini)
+register("elevenlabs", _elevenlabs)
+
+
+def _stub(name: str):
+    import stub_provider
+    return stub_provider.client(name)
+
+
+if os.getenv("PROVIDER_STUB") == "1":
+    for _name in ("groq", "gemini", "elevenlabs"):
+        register(_name, functools.partial(_stub, _name))
+
+if os.getenv("CASSETTE_MODE") in ("record", "replay"):
+    import cassette
+    for _name in ("groq", "gemini"):
+        register(_name, cassette.wrap_factory(_name, _factories[_name]))
+
+if os.getenv("PROVIDER_CONCURRENCY"):
+    set_limits(parse_limits(os.getenv("PROVIDER_CONCURRENCY")))
@@ -0,0 +1,306 @@
+"""
+Cost- and latency-aware model router for the collector, defaulter, judge and
+optimizer roles.
+
+Each role has a pool of (provider, model) candidates. For every call the
+router ranks the pool: models whose recent p95 latency meets the role's SLO
+and whose error rate is low come first, cheapest (by token price) first;
+models that miss the SLO follow, fastest first. A failed call falls through
+to the next candidate, and every few calls a model that is currently out of
+favour is tried again so its statistics can recover. Every routed call is
+appended to a JSONL log so the throughput and cost impact can be reviewed.
+
+Enable with MODEL_ROUTER=1. Pools and SLOs can be overridden with a JSON
+file named by ROUTER_CONFIG: {"pools": {role: [[provider, model], ...]},
+"slo_p95_s": {role: seconds}}.
+
+Usage:
+    python router.py report [routing.jsonl]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# USD per 1M tokens (input, output); update when provider pricing changes
+MODEL_PRICES = {
+    "meta-llama/llama-4-scout-17b-16e-instruct": (0.11, 0.34),
+    "meta-llama/llama-4-maverick-17b-128e-instruct": (0.20, 0.60),
+    "openai/gpt-oss-120b": (0.15, 0.75),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+}
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD for one call's tokens at the model's MODEL_PRICES (0 for unpriced models)."""
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * price_in + (completion_tokens or 0) * price_out) / 1e6
+
+# Collector and defaulter turns are Groq chat completions, so their pools
+# only list Groq models; the judge and optimizer can use either provider.
+DEFAULT_POOLS = {
+    "collector": [
+        ("groq", "meta-llama/llama-4-scout-17b-16e-instruct"),
+        ("groq", "meta-llama/llama-4-maverick-17b-128e-instruct"),
+    ],
+    "defaulter": [
+        ("groq", "meta-llama/llama-4-scout-17b-16e-instruct"),
+        ("groq", "openai/gpt-oss-120b"),
+    ],
+    "judge": [
+        ("gemini", "gemini-2.0-flash-exp"),
+        ("groq", "meta-llama/llama-4-scout-17b-16e-instruct"),
+        ("groq", "meta-llama/llama-4-maverick-17b-128e-instruct"),
+    ],
+    "optimizer": [
+        ("gemini", "gemini-2.0-flash-exp"),
+        ("groq", "meta-llama/llama-4-maverick-17b-128e-instruct"),
+    ],
+}
+
+# p95 latency target per call, in seconds
+DEFAULT_SLO_P95_S = {
+    "collector": 2.0,
+    "defaulter": 2.0,
+    "judge": 4.0,
+    "optimizer": 8.0,
+}
+
+ROUTING_LOG_PATH = os.getenv("ROUTING_LOG_PATH", "routing.jsonl")
+WINDOW = 50          # Recent calls kept per model for latency/error statistics
+MIN_SAMPLES = 5      # Below this a model is assumed healthy
+MAX_ERROR_RATE = 0.2
+EXPLORE_EVERY = 20   # Retry an out-of-favour model once per this many calls per role
+MAX_TRIES = 2        # Candidates tried per call before giving up
+
+
+def _p95(values) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class ModelRouter:
+    """Per-role model selection from live latency/error statistics and token prices."""
+
+    def __init__(self, pools: dict = None, slo_p95_s: dict = None, log_path: str = ROUTING_LOG_PATH):
+        self.pools = {role: [tuple(candidate) for candidate in pool] for role, pool in (pools or DEFAULT_POOLS).items()}
+        self.slo_p95_s = dict(DEFAULT_SLO_P95_S, **(slo_p95_s or {}))
+        self.log_path = log_path
+        self.latencies = {}
+        self.outcomes = {}
+        self.last_used = {}
+        self.tokens = {role: [0, 0, 0] for role in self.pools}  # calls, prompt, completion
+        self.calls = {role: 0 for role in self.pools}
+        self.lock = threading.Lock()
+
+    def _expected_cost(self, role: str, model: str) -> float:
+        calls, prompt, completion = self.tokens[role]
+        mean_prompt, mean_completion = (prompt / calls, completion / calls) if calls else (1.0, 1.0)
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        return price_in * mean_prompt + price_out * mean_completion
+
+    def _health(self, role: str, candidate: tuple) -> tuple:
+        """(healthy, p95 or None, error rate) over the candidate's recent calls."""
+        latencies = self.latencies.get((role, candidate), ())
+        outcomes = self.outcomes.get((role, candidate), ())
+        if len(outcomes) < MIN_SAMPLES:
+            return True, None, 0.0
+        p95 = _p95(latencies) if latencies else None
+        error_rate = 1 - sum(outcomes) / len(outcomes)
+        healthy = error_rate <= MAX_ERROR_RATE and p95 is not None and p95 <= self.slo_p95_s[role]
+        return healthy, p95, error_rate
+
+    def candidates(self, role: str) -> list:
+        """Ranked [(provider, model, reason)] for the next call in a role."""
+        with self.lock:
+            self.calls[role] += 1
+            explore = self.calls[role] % EXPLORE_EVERY == 0
+            health = {candidate: self._health(role, candidate) for candidate in self.pools[role]}
+            healthy = sorted((c for c in self.pools[role] if health[c][0]),
+                             key=lambda c: self._expected_cost(role, c[1]))
+            slow = sorted((c for c in self.pools[role] if not health[c][0]),
+                          key=lambda c: (health[c][2], health[c][1] or 0.0))
+            if explore and slow:
+                stale = min(slow, key=lambda c: self.last_used.get((role, c), 0.0))
+                ranked = [(stale, "explore")] + [(c, "fallback") for c in healthy + slow if c != stale]
+            elif healthy:
+                first = healthy[0]
+                reason = "within_slo" if health[first][1] is not None else "warmup"
+                ranked = [(first, reason)] + [(c, "fallback") for c in healthy[1:] + slow]
+            else:
+                ranked = [(slow[0], "least_slow")] + [(c, "fallback") for c in slow[1:]]
+        return [(provider, model, reason) for (provider, model), reason in ranked]
+
+    def record(self, role: str, provider: str, model: str, latency_s: float, ok: bool, reason: str,
+               usage: tuple = None, error: str = None):
+        """Add one call's outcome to the statistics and the routing log."""
+        candidate = (provider, model)
+        prompt_tokens, completion_tokens = usage or (0, 0)
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        entry = {
+            "ts": round(time.time(), 3),
+            "role": role,
+            "provider": provider,
+            "model": model,
+            "reason": reason,
+            "latency_s": round(latency_s, 3),
+            "ok": ok,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": round((prompt_tokens * price_in + completion_tokens * price_out) / 1e6, 8),
+        }
+        if error:
+            entry["error"] = error[:200]
+        with self.lock:
+            self.latencies.setdefault((role, candidate), deque(maxlen=WINDOW)).append(latency_s)
+            self.outcomes.setdefault((role, candidate), deque(maxlen=WINDOW)).append(ok)
+            self.last_used[(role, candidate)] = time.time()
+            if usage:
+                totals = self.tokens[role]
+                totals[0] += 1
+                totals[1] += prompt_tokens
+                totals[2] += completion_tokens
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def call(self, role: str, fn, ok=None):
+        """Run fn(provider, model) on the best model and return its (result, usage).
+
+        fn returns (result, (prompt_tokens, completion_tokens) or None). A call
+        that raises, or whose result fails ok(result), is recorded as an error
+        and retried on the next candidate (up to MAX_TRIES models). If every
+        try fails the last bad result is returned, or the last exception
+        re-raised if no call returned at all.
+        """
+        results, last_error = [], None
+        for provider, model, reason in self.candidates(role)[:MAX_TRIES]:
+            start = time.perf_counter()
+            try:
+                result, usage = fn(provider, model)
+            except Exception as e:
+                self.record(role, provider, model, time.perf_counter() - start, False, reason,
+                            error=f"{type(e).__name__}: {e}")
+                last_error = e
+                continue
+            good = ok is None or ok(result)
+            self.record(role, provider, model, time.perf_counter() - start, good, reason, usage)
+            if good:
+                return result, usage
+            results.append((result, usage))
+        if results:
+            return results[-1]
+        raise last_error
+
+    def report(self) -> dict:
+        """Current per-role, per-model statistics as seen by the router."""
+        with self.lock:
+            roles = {}
+            for role, pool in self.pools.items():
+                models = []
+                for candidate in pool:
+                    healthy, p95, error_rate = self._health(role, candidate)
+                    models.append({
+                        "provider": candidate[0],
+                        "model": candidate[1],
+                        "calls": len(self.outcomes.get((role, candidate), ())),
+                        "p95_s": round(p95, 3) if p95 is not None else None,
+                        "error_rate": round(error_rate, 4),
+                        "healthy": healthy,
+                    })
+                roles[role] = {"slo_p95_s": self.slo_p95_s[role], "models": models}
+        return roles
+
+
+def summarize_log(path: str = ROUTING_LOG_PATH) -> dict:
+    """Calls, share, latency, errors and cost per role and model from a routing log."""
+    groups = {}
+    first_ts, last_ts = None, None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            first_ts = entry["ts"] if first_ts is None else min(first_ts, entry["ts"])
+            last_ts = entry["ts"] if last_ts is None else max(last_ts, entry["ts"])
+            group = groups.setdefault(entry["role"], {}).setdefault(entry["model"], {
+                "calls": 0, "errors": 0, "cost_usd": 0.0, "latencies": [], "reasons": {},
+            })
+            group["calls"] += 1
+            group["errors"] += 0 if entry["ok"] else 1
+            group["cost_usd"] += entry["cost_usd"]
+            group["latencies"].append(entry["latency_s"])
+            group["reasons"][entry["reason"]] = group["reasons"].get(entry["reason"], 0) + 1
+    minutes = max((last_ts - first_ts) / 60, 1 / 60) if first_ts is not None else None
+    summary = {}
+    for role, models in groups.items():
+        role_calls = sum(group["calls"] for group in models.values())
+        summary[role] = {
+            "calls": role_calls,
+            "calls_per_min": round(role_calls / minutes, 1),
+            "cost_usd": round(sum(group["cost_usd"] for group in models.values()), 6),
+            "models": {
+                model: {
+                    "calls": group["calls"],
+                    "share": round(group["calls"] / role_calls, 4),
+                    "error_rate": round(group["errors"] / group["calls"], 4),
+                    "p95_s": round(_p95(group["latencies"]), 3),
+                    "cost_usd": round(group["cost_usd"], 6),
+                    "reasons": group["reasons"],
+                }
+                for model, group in models.items()
+            },
+        }
+    return summary
+
+
+def _load_config() -> dict:
+    path = os.getenv("ROUTER_CONFIG")
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Process-wide router, configured from ROUTER_CONFIG on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            config = _load_config()
+            _router = ModelRouter(config.get("pools"), config.get("slo_p95_s"))
+        return _router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model router utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="Summarize a routing log")
+    report.add_argument("log", nargs="?", default=ROUTING_LOG_PATH)
+    report.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = summarize_log(args.log)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print("=" * 60)
+    print("🧭 MODEL ROUTING")
+    print("=" * 60)
+    for role, stats in summary.items():
+        print(f"\n{role}: {stats['calls']} calls ({stats['calls_per_min']}/min), ${stats['cost_usd']:.4f}")
+        for model, group in stats["models"].items():
+            print(f"  {group['share']:>6.1%}  {model:<48} p95 {group['p95_s']:.2f}s  "
+                  f"errors {group['error_rate']:.1%}  ${group['cost_usd']:.4f}  {group['reasons']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Local stand-in for the Groq, Gemini and ElevenLabs clients.
+
+Enabled with PROVIDER_STUB=1 (see providers.py). Responses are canned but
+deterministic for a given input, with configurable latency and CPU cost, so
+the training loop can be benchmarked and load-tested without API keys:
+
+    STUB_LATENCY_MS   simulated network latency per call (default 50)
+    STUB_CPU_MS       busy-loop CPU time per call, holding the GIL (default 0)
+    STUB_PASS_RATE    probability that a judge verdict is PASS (default 0.5)
+    STUB_MODEL_LATENCY_MS
+                      per-model latency overrides, e.g. "scout=800,gemini=100"
+                      (matched as substrings of the model name)
+    STUB_TAIL_MS      extra latency added to a random share of calls (default 0)
+    STUB_TAIL_RATE    share of calls that get the extra latency (default 0)
+    STUB_BATCH_MS     time a batch job takes to complete, however large (default 200)
+    STUB_ARTIFACT_RATE
+                      share of collector/defaulter replies that ramble and carry
+                      stage directions or placeholders, which the judge fails
+                      (default 0)
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "50"))
+CPU_MS = float(os.getenv("STUB_CPU_MS", "0"))
+PASS_RATE = float(os.getenv("STUB_PASS_RATE", "0.5"))
+TAIL_MS = float(os.getenv("STUB_TAIL_MS", "0"))
+TAIL_RATE = float(os.getenv("STUB_TAIL_RATE", "0"))
+BATCH_MS = float(os.getenv("STUB_BATCH_MS", "200"))
+ARTIFACT_RATE = float(os.getenv("STUB_ARTIFACT_RATE", "0"))
+MODEL_LATENCY_MS = {
+    name.strip(): float(value)
+    for name, _, value in (part.partition("=") for part in os.getenv("STUB_MODEL_LATENCY_MS", "").split(","))
+    if name.strip()
+}
+
+COLLECTOR_LINES = [
+    "Hi, this is a call about your overdue credit card balance.",
+    "I understand things are tight. Could you manage a monthly payment plan?",
+    "We can set up $100 a month starting next week if that works for you.",
+    "I need a commitment today to stop further collection activity.",
+    "Thank you, I'll send the payment plan details by email.",
+]
+CUSTOMER_LINES = [
+    "I lost my job last month, I really can't pay all of that.",
+    "I only have about $400 to my name right now.",
+    "Maybe I could do something small each month?",
+    "Please stop pressuring me, I'm doing my best.",
+    "Okay, a plan like that could work.",
+]
+ARTIFACTS = [
+    ("(sighing) ", " Let me know what works for you and we can go from there."),
+    ("*pauses* ", " [Your Name] from the collections team will follow up."),
+    ("I'm ready to start the call. ", " I really do want to help you sort this out today if we can."),
+]
+ARTIFACT_MARKERS = ("(sighing)", "*pauses*", "[Your Name]", "I'm ready to")
+FEEDBACK = [
+    "Agent stayed professional and offered a realistic plan.",
+    "Agent pressured the customer after they mentioned job loss.",
+    "Agent did not offer a payment plan after the first refusal.",
+    "Agent used threatening language about legal action.",
+]
+
+
+def _simulate(model: str = ""):
+    """Spend the configured latency (sleeping) and CPU time (spinning)."""
+    latency_ms = next((ms for name, ms in MODEL_LATENCY_MS.items() if name in model), LATENCY_MS)
+    if TAIL_RATE and random.random() < TAIL_RATE:
+        latency_ms += TAIL_MS
+    if latency_ms:
+        time.sleep(latency_ms / 1000)
+    if CPU_MS:
+        deadline = time.perf_counter() + CPU_MS / 1000
+        while time.perf_counter() < deadline:
+            pass
+
+
+def _rng(text: str) -> random.Random:
+    return random.Random(int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _verdict(conversation: str) -> str:
+    rng = _rng(conversation)
+    if any(marker in conversation for marker in ARTIFACT_MARKERS):
+        return json.dumps({"pass": False, "feedback": "Agent output stage directions or placeholder text.",
+                           "hang_up_detected": False})
+    passed = rng.random() < PASS_RATE
+    feedback = FEEDBACK[0] if passed else rng.choice(FEEDBACK[1:])
+    return json.dumps({"pass": passed, "feedback": feedback, "hang_up_detected": False})
+
+
+def _chunks(text: str, size: int = 16) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _optimizer_text(contents: str) -> str:
+    if "<add_rules>" in contents:
+        rule = _rng(contents).choice(["Offer a payment plan of at most $150/month after the first refusal.",
+                                      "Acknowledge job loss or low funds before discussing amounts.",
+                                      "Never mention legal action on a first call."])
+        return f"<add_rules>\n- {rule}\n</add_rules>"
+    current = contents.split("Current System Prompt:\n", 1)[-1].split("\n\nFailed Conversation:", 1)[0]
+    return f"<new_prompt>{current.strip()}\n- Stay calm, empathetic and offer a realistic plan.</new_prompt>"
+
+
+class _Stream(list):
+    """Iterable chunk list with the close() the real SDK streams have."""
+
+    def close(self):
+        pass
+
+
+def _chat_text(messages: list) -> str:
+    """Canned, deterministic reply to a chat request."""
+    prompt = "".join(message["content"] for message in messages)
+    if "Compliance Judge" in messages[0]["content"]:
+        # Judges only stream, except in batch jobs
+        return _verdict(messages[-1]["content"])
+    if "Current System Prompt:" in prompt:
+        return _optimizer_text(prompt)
+    lines = CUSTOMER_LINES if "a customer with an overdue debt" in messages[0]["content"] else COLLECTOR_LINES
+    rng = _rng(prompt)
+    text = rng.choice(lines)
+    if ARTIFACT_RATE and rng.random() < ARTIFACT_RATE:
+        prefix, suffix = rng.choice(ARTIFACTS)
+        text = f"{prefix}{text}{suffix}\n\nCustomer: ..."
+    return text
+
+
+def _limit(text: str, max_tokens: int = None, stop=None) -> tuple:
+    """Apply stop sequences and the token cap; returns (text, finish_reason)."""
+    for sequence in stop or ():
+        if sequence in text:
+            text = text[:text.index(sequence)]
+    if max_tokens and _tokens(text) > max_tokens:
+        return text[:max_tokens * 4], "length"
+    return text, "stop"
+
+
+class _GroqCompletions:
+    def create(self, model, messages, stream=False, **kwargs):
+        _simulate(model)
+        prompt = "".join(message["content"] for message in messages)
+        usage = SimpleNamespace(prompt_tokens=_tokens(prompt), completion_tokens=0)
+        text, finish_reason = _limit(_chat_text(messages), kwargs.get("max_completion_tokens"), kwargs.get("stop"))
+        usage.completion_tokens = _tokens(text)
+        if stream:
+            parts = _chunks(text)
+            chunks = [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part),
+                                                         finish_reason=finish_reason if i == len(parts) - 1 else None)],
+                                x_groq=None)
+                for i, part in enumerate(parts)
+            ]
+            chunks.append(SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage)))
+            return _Stream(chunks)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+
+class _FileContent:
+    def __init__(self, data: bytes):
+        self.content = data
+        self.text = data.decode("utf-8")
+
+
+class _Files:
+    """In-memory stand-in for the batch file store (files.create / files.content)."""
+
+    def __init__(self):
+        self.store = {}
+
+    def create(self, file, purpose="batch"):
+        name, data = file if isinstance(file, tuple) else (getattr(file, "name", "upload"), file.read())
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        file_id = f"file_{hashlib.sha1(data).hexdigest()[:12]}_{len(self.store)}"
+        self.store[file_id] = data
+        return SimpleNamespace(id=file_id, filename=name, purpose=purpose, bytes=len(data))
+
+    def content(self, file_id):
+        return _FileContent(self.store[file_id])
+
+
+class _Batches:
+    """Local stand-in batch server for /v1/chat/completions jobs.
+
+    A job is "in_progress" for STUB_BATCH_MS after it is created; the first
+    retrieve() after that answers every request in the input file at once
+    (no per-request latency) and writes the output and error files.
+    """
+
+    def __init__(self, files: _Files):
+        self.files = files
+        self.jobs = {}
+
+    def create(self, input_file_id, endpoint, completion_window="24h", metadata=None):
+        batch_id = f"batch_{len(self.jobs)}_{input_file_id[5:17]}"
+        lines = self.files.store[input_file_id].decode("utf-8").splitlines()
+        self.jobs[batch_id] = {
+            "batch": SimpleNamespace(
+                id=batch_id, endpoint=endpoint, input_file_id=input_file_id, completion_window=completion_window,
+                status="in_progress", output_file_id=None, error_file_id=None, metadata=metadata,
+                request_counts=SimpleNamespace(total=len(lines), completed=0, failed=0),
+            ),
+            "ready_at": time.monotonic() + BATCH_MS / 1000,
+            "lines": lines,
+        }
+        return self.jobs[batch_id]["batch"]
+
+    def retrieve(self, batch_id):
+        job = self.jobs[batch_id]
+        batch = job["batch"]
+        if batch.status == "in_progress" and time.monotonic() >= job["ready_at"]:
+            outputs, errors = [], []
+            for line in job["lines"]:
+                request = json.loads(line)
+                body = request.get("body", {})
+                try:
+                    text = _chat_text(body["messages"])
+                    prompt = "".join(message["content"] for message in body["messages"])
+                except (KeyError, TypeError, IndexError) as e:
+                    errors.append({"id": f"req_{len(errors)}", "custom_id": request.get("custom_id"),
+                                   "response": None, "error": {"code": "invalid_request", "message": str(e)}})
+                    continue
+                completion = {
+                    "object": "chat.completion",
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text)},
+                }
+                outputs.append({"id": f"req_{len(outputs)}", "custom_id": request.get("custom_id"),
+                                "response": {"status_code": 200, "body": completion}, "error": None})
+            if outputs:
+                batch.output_file_id = self.files.create(
+                    ("output.jsonl", "".join(json.dumps(entry) + "\n" for entry in outputs))).id
+            if errors:
+                batch.error_file_id = self.files.create(
+                    ("errors.jsonl", "".join(json.dumps(entry) + "\n" for entry in errors))).id
+            batch.request_counts.completed = len(outputs)
+            batch.request_counts.failed = len(errors)
+            batch.status = "completed"
+        return batch
+
+    def cancel(self, batch_id):
+        batch = self.jobs[batch_id]["batch"]
+        if batch.status == "in_progress":
+            batch.status = "cancelled"
+        return batch
+
+
+class _GenerationConfig(dict):
+    def __init__(self, **kwargs):
+        super().__init__(kwargs)
+
+
+class _GeminiResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = SimpleNamespace(prompt_token_count=_tokens(prompt), candidates_token_count=_tokens(text))
+
+
+class _GenerativeModel:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        _simulate(self.model_name)
+        if stream:
+            # Only judges stream; the conversation JSON follows the judge prompt
+            text = _verdict(contents)
+            return [_GeminiResponse(part, contents) for part in _chunks(text)]
+        return _GeminiResponse(_optimizer_text(contents), contents)
+
+
+class _TextToSpeech:
+    def convert(self, voice_id, text, model_id=None, output_format=None):
+        _simulate()
+        # About 50 bytes of 128 kbps audio per character of speech, scaled to the
+        # requested bitrate ("mp3_22050_32" -> 32 kbps); not playable
+        kbps = int((output_format or "mp3_44100_128").rsplit("_", 1)[-1])
+        payload = hashlib.sha1(text.encode("utf-8")).digest() * (len(text) * 50 * kbps // (20 * 128) + 1)
+        return iter(_chunks(payload, 4096))
+
+
+def client(name: str):
+    """Stub client for a provider name, shaped like the real SDK object."""
+    if name == "groq":
+        files = _Files()
+        return SimpleNamespace(chat=SimpleNamespace(completions=_GroqCompletions()), files=files,
+                               batches=_Batches(files))
+    if name == "gemini":
+        return SimpleNamespace(
+            GenerativeModel=_GenerativeModel,
+            types=SimpleNamespace(GenerationConfig=_GenerationConfig),
+            configure=lambda **kwargs: None,
+        )
+    if name == "elevenlabs":
+        return SimpleNamespace(text_to_speech=_TextToSpeech())
+    raise KeyError(f"No stub for provider: {name}")
@@ -0,0 +1,275 @@
+"""
+Scenario sweep engine.
+
+Expands a grid of scenario parameters (or samples it), runs every cell through
+main.run_scenario across a process pool, checkpoints each finished run to a
+JSONL file so an interrupted sweep can resume, and writes per-cell columnar
+results: pass rate, attempts to pass, tokens and latency.
+
+Usage:
+    python sweep.py --grid grid.json --repeats 3 --workers 8
+    python sweep.py --sample 500 --seed 7 --resume
+    python sweep.py --sample 500 --fresh           # discard an earlier checkpoint
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Parameters varied by default (values match the options in the web form)
+DEFAULT_GRID = {
+    "collector_personality": [
+        "aggressive and firm",
+        "polite but persistent",
+        "empathetic and understanding",
+        "professional and neutral",
+        "friendly but assertive",
+    ],
+    "debt_amount": [1000, 2500, 5000, 10000],
+    "months_overdue": [1, 3, 6, 12],
+    "available_funds": [100, 400, 1000],
+}
+
+# Parameters held fixed unless the grid overrides them
+DEFAULT_FIXED = {
+    "company_name": "ABC Credit Card Company",
+    "customer_name": "Alex",
+}
+
+DEFAULT_CHECKPOINT_PATH = "sweep_runs.jsonl"
+DEFAULT_RESULTS_PATH = "sweep_results.json"
+
+# Columns written per cell, in order
+CELL_KEYS = ["collector_personality", "debt_amount", "months_overdue", "available_funds"]
+RESULT_COLUMNS = CELL_KEYS + [
+    "runs", "pass_rate", "mean_attempts_to_pass",
+    "mean_tokens", "mean_latency_s", "p95_latency_s",
+]
+
+
+def grid_size(grid: dict) -> int:
+    """Number of cells in the full cartesian product of the grid."""
+    size = 1
+    for values in grid.values():
+        size *= len(values)
+    return size
+
+
+def expand_grid(grid: dict, fixed: dict = None) -> list:
+    """Expand a grid into one scenario dict per cell."""
+    keys = list(grid)
+    base = fixed if fixed is not None else DEFAULT_FIXED
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*grid.values())]
+
+
+def sample_grid(grid: dict, n: int, seed: int = 0, fixed: dict = None) -> list:
+    """Sample n distinct cells from the grid without materializing the full product."""
+    keys = list(grid)
+    base = fixed if fixed is not None else DEFAULT_FIXED
+    total = grid_size(grid)
+    rng = random.Random(seed)
+    scenarios = []
+    for flat_index in rng.sample(range(total), min(n, total)):
+        # Decode the flat index as a mixed-radix number, one digit per axis
+        values = {}
+        for key in reversed(keys):
+            flat_index, digit = divmod(flat_index, len(grid[key]))
+            values[key] = grid[key][digit]
+        scenarios.append({**base, **{key: values[key] for key in keys}})
+    return scenarios
+
+
+def scenario_id(scenario: dict, repeat: int) -> str:
+    """Stable ID for one run of a scenario, used as the checkpoint key."""
+    payload = json.dumps(scenario, sort_keys=True) + f"#{repeat}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(path: str) -> dict:
+    """Load completed runs from a checkpoint file, keyed by run ID."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn final line from an interrupted write
+            done[record["run_id"]] = record
+    return done
+
+
+def prepare_checkpoint(path: str, resume: bool, fresh: bool):
+    """Refuse to start over on an existing checkpoint (paid, finished runs) unless --fresh asks to."""
+    if resume or not os.path.exists(path):
+        return
+    if not fresh:
+        raise SystemExit(f"{path} already holds finished runs: pass --resume to keep them "
+                         f"or --fresh to delete them and start over")
+    os.remove(path)
+
+
+def run_one(task: dict) -> dict:
+    """Run a single scenario in a worker process and return its run record."""
+    import main  # Imported here so only worker processes build the API clients
+
+    scenario = task["scenario"]
+    # The CLI functions print every turn; keep worker output quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = main.run_scenario(
+            personality=scenario["collector_personality"],
+            company_name=scenario["company_name"],
+            customer_name=scenario["customer_name"],
+            debt_amount=scenario["debt_amount"],
+            months_overdue=scenario["months_overdue"],
+            available_funds=scenario["available_funds"],
+            max_attempts=task["max_attempts"],
+            num_turns=task["num_turns"],
+        )
+    return {"run_id": task["run_id"], "repeat": task["repeat"], **scenario, **result}
+
+
+def run_bounded(fn, items, workers: int = 4, max_pending: int = None):
+    """Apply fn to items across a process pool, yielding (item, result, error) as runs finish.
+
+    At most max_pending items are in flight at once, so items can be a lazy
+    iterator of any length without growing memory.
+    """
+    max_pending = max_pending or workers * 2
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for item in itertools.islice(items, max_pending):
+            pending[executor.submit(fn, item)] = item
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+                for next_item in itertools.islice(items, 1):
+                    pending[executor.submit(fn, next_item)] = next_item
+
+
+def build_tasks(scenarios: list, repeats: int, done: dict, max_attempts: int = 3, num_turns: int = 5) -> list:
+    """One task per (scenario, repeat) not already in `done`, for run_one."""
+    tasks = []
+    for scenario in scenarios:
+        for repeat in range(repeats):
+            run_id = scenario_id(scenario, repeat)
+            if run_id not in done:
+                tasks.append({
+                    "run_id": run_id,
+                    "repeat": repeat,
+                    "scenario": scenario,
+                    "max_attempts": max_attempts,
+                    "num_turns": num_turns,
+                })
+    return tasks
+
+
+def run_sweep(scenarios: list, repeats: int = 1, workers: int = 4,
+              checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+              max_attempts: int = 3, num_turns: int = 5) -> list:
+    """Run every scenario `repeats` times, skipping runs already in the checkpoint."""
+    done = load_checkpoint(checkpoint_path)
+    tasks = build_tasks(scenarios, repeats, done, max_attempts, num_turns)
+
+    total = len(tasks)
+    print(f"🧮 Sweep: {len(scenarios)} scenarios × {repeats} repeats, "
+          f"{len(done)} already done, {total} to run on {workers} workers")
+
+    start = time.perf_counter()
+    completed = 0
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for task, record, error in run_bounded(run_one, tasks, workers):
+            completed += 1
+            if error:
+                # Not checkpointed, so the run is retried on resume
+                print(f"❌ [{completed}/{total}] {task['run_id']}: {error}")
+                continue
+            checkpoint.write(json.dumps(record, separators=(",", ":")) + "\n")
+            checkpoint.flush()
+            done[record["run_id"]] = record
+            status = "✅ PASS" if record["passed"] else "❌ FAIL"
+            print(f"{status} [{completed}/{total}] {record['collector_personality']}, "
+                  f"${record['debt_amount']:,.0f} debt, {record['months_overdue']} mo, "
+                  f"${record['available_funds']:,.0f} funds — {record['attempts']} attempt(s)")
+
+    elapsed = time.perf_counter() - start
+    if total:
+        print(f"⏱️  {total} runs in {elapsed:.1f}s ({total / elapsed * 60:.1f} runs/min)")
+    return list(done.values())
+
+
+def summarize(records: list) -> dict:
+    """Aggregate run records into per-cell columns (one list per column)."""
+    cells = {}
+    for record in records:
+        cells.setdefault(tuple(record[key] for key in CELL_KEYS), []).append(record)
+
+    columns = {name: [] for name in RESULT_COLUMNS}
+    for cell, runs in sorted(cells.items(), key=lambda item: tuple(map(str, item[0]))):
+        for key, value in zip(CELL_KEYS, cell):
+            columns[key].append(value)
+        passed = [run for run in runs if run["passed"]]
+        latencies = sorted(run["latency_s"] for run in runs)
+        columns["runs"].append(len(runs))
+        columns["pass_rate"].append(round(len(passed) / len(runs), 4))
+        columns["mean_attempts_to_pass"].append(
+            round(sum(run["attempts"] for run in passed) / len(passed), 3) if passed else None
+        )
+        columns["mean_tokens"].append(
+            round(sum(run["prompt_tokens"] + run["completion_tokens"] for run in runs) / len(runs), 1)
+        )
+        columns["mean_latency_s"].append(round(sum(latencies) / len(latencies), 3))
+        columns["p95_latency_s"].append(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))])
+    return columns
+
+
+def write_columnar(columns: dict, path: str = DEFAULT_RESULTS_PATH):
+    """Write columnar results as compact JSON: {"columns": [...], "data": {name: [...]}}."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"columns": list(columns), "data": columns}, f, separators=(",", ":"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a scenario sweep over personality × debt × funds grids.")
+    parser.add_argument("--grid", help="JSON file mapping parameter name to list of values")
+    parser.add_argument("--sample", type=int, help="Sample this many cells instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --sample")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per cell")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--resume", action="store_true", help="Keep runs already in the checkpoint file")
+    parser.add_argument("--fresh", action="store_true", help="Delete an existing checkpoint file and start over")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid = {**DEFAULT_GRID, **json.load(f)}
+
+    prepare_checkpoint(args.checkpoint, args.resume, args.fresh)
+
+    scenarios = sample_grid(grid, args.sample, args.seed) if args.sample else expand_grid(grid)
+    records = run_sweep(scenarios, args.repeats, args.workers, args.checkpoint, args.max_attempts, args.turns)
+
+    columns = summarize(records)
+    write_columnar(columns, args.output)
+    print(f"📊 Wrote {len(columns['runs'])} cells to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
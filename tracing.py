@@ -0,0 +1,336 @@
+"""
+Per-run tracing spans with optional CPU and memory profiling.
+
+A run opened with trace() records nested spans (run → attempt → turn →
+provider call, plus judging, optimization, TTS and HTML rendering) with IDs,
+attributes and durations. span() is a no-op outside a traced run, so the
+instrumentation costs nothing unless a run asks for it. Spans follow the
+context into worker threads started with tracing.wrap().
+
+When the run ends its files are written to TRACE_DIR (default traces/):
+    <trace_id>.json          Chrome trace-event JSON (chrome://tracing, Perfetto)
+    <trace_id>.folded        collapsed span stacks, self time in µs
+    <trace_id>.cpu.folded    collapsed cProfile stacks (profile="cpu")
+    <trace_id>.pstats        raw cProfile stats (profile="cpu")
+Memory profiling (profile="memory") adds tracemalloc's peak and top
+allocation sites to the JSON. The .folded files render with flamegraph.pl or
+speedscope.
+
+Usage:
+    python tracing.py summary traces/<trace_id>.json
+"""
+
+import argparse
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+PROFILES = ("cpu", "memory")
+TOP_ALLOCATIONS = 20
+
+# (trace, span id) of the innermost open span, or None outside a traced run
+_current = contextvars.ContextVar("tracing_current", default=None)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, trace, parent_id: int, name: str, attrs: dict):
+        self.trace = trace
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(trace.ids)
+
+    def __enter__(self):
+        self.token = _current.set((self.trace, self.span_id))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            # Closed from another context (e.g. a generator finalized elsewhere)
+            pass
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace.add({
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start - self.trace.t0,
+            "duration": end - self.start,
+            "thread": threading.get_ident(),
+            "attrs": self.attrs,
+        })
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing one span under the current one (no-op outside a traced run)."""
+    current = _current.get()
+    if current is None:
+        return _NO_SPAN
+    return _Span(current[0], current[1], name, attrs)
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    current = _current.get()
+    if current is not None:
+        current[0].annotate(current[1], attrs)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+def wrap(fn):
+    """Bind fn to the caller's context so spans it opens in another thread nest correctly."""
+    if _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
+
+
+class Trace:
+    """Spans, profiles and output files of one traced run."""
+
+    def __init__(self, name: str, profile=(), **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.profile = [p for p in profile if p in PROFILES]
+        self.spans = []
+        self.pending_attrs = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self.profiler = None
+        self.memory = None
+        self.files = {}
+
+    def add(self, record: dict):
+        with self.lock:
+            record["attrs"].update(self.pending_attrs.pop(record["span_id"], {}))
+            self.spans.append(record)
+
+    def annotate(self, span_id: int, attrs: dict):
+        with self.lock:
+            self.pending_attrs.setdefault(span_id, {}).update(attrs)
+
+    def _start_profiling(self):
+        if "memory" in self.profile:
+            import tracemalloc
+            self._own_tracemalloc = not tracemalloc.is_tracing()
+            if self._own_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._snapshot_before = tracemalloc.take_snapshot()
+        if "cpu" in self.profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def _stop_profiling(self):
+        if self.profiler:
+            self.profiler.disable()
+        if "memory" in self.profile:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            top = snapshot.compare_to(self._snapshot_before, "lineno")[:TOP_ALLOCATIONS]
+            self.memory = {
+                "peak_kb": round(peak / 1024, 1),
+                "top": [{"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                         "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff} for stat in top],
+            }
+
+    def write(self, directory: str = TRACE_DIR) -> dict:
+        """Write the trace files and return their paths."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.trace_id)
+        pid = os.getpid()
+        events = [{
+            "name": record["name"],
+            "cat": record["name"].split(".")[0],
+            "ph": "X",
+            "ts": round(record["start"] * 1e6, 1),
+            "dur": round(record["duration"] * 1e6, 1),
+            "pid": pid,
+            "tid": record["thread"],
+            "args": {"span_id": record["span_id"], "parent_id": record["parent_id"], **record["attrs"]},
+        } for record in sorted(self.spans, key=lambda r: r["start"])]
+        document = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at,
+                          "profile": self.profile, "memory": self.memory, **self.attrs},
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(document, f, default=str)
+        self.files = {"trace": base + ".json", "folded": base + ".folded"}
+        _write_folded(base + ".folded", folded_spans(self.spans))
+        if self.profiler:
+            import pstats
+            self.profiler.dump_stats(base + ".pstats")
+            _write_folded(base + ".cpu.folded", folded_profile(pstats.Stats(self.profiler)))
+            self.files.update(pstats=base + ".pstats", cpu_folded=base + ".cpu.folded")
+        return self.files
+
+
+class _TraceContext:
+    def __init__(self, name: str, profile, attrs: dict):
+        self.trace = Trace(name, profile, **attrs)
+
+    def __enter__(self) -> Trace:
+        self.root = _Span(self.trace, 0, self.trace.name, dict(self.trace.attrs))
+        self.trace._start_profiling()
+        self.root.__enter__()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root.__exit__(exc_type, exc, tb)
+        self.trace._stop_profiling()
+        self.trace.write()
+        return False
+
+
+def trace(name: str = "run", profile=(), **attrs) -> _TraceContext:
+    """Context manager for one traced run whose root span is `name`.
+
+        with tracing.trace("run", profile=["cpu"], source="cli") as run_trace:
+            ...
+        run_trace.files  # paths written on exit
+    """
+    return _TraceContext(name, profile, attrs)
+
+
+def _label(record: dict) -> str:
+    role = record["attrs"].get("role")
+    return f"{record['name']}:{role}" if role else record["name"]
+
+
+def folded_spans(spans: list) -> dict:
+    """Collapsed stacks of span labels weighted by self time in µs."""
+    by_id = {record["span_id"]: record for record in spans}
+    child_time = {}
+    for record in spans:
+        child_time[record["parent_id"]] = child_time.get(record["parent_id"], 0.0) + record["duration"]
+    stacks = {}
+    for record in spans:
+        path, parent = [_label(record)], by_id.get(record["parent_id"])
+        while parent is not None:
+            path.append(_label(parent))
+            parent = by_id.get(parent["parent_id"])
+        # Parallel children (judge ensemble) can add up to more than their parent
+        self_time = max(0.0, record["duration"] - child_time.get(record["span_id"], 0.0))
+        key = ";".join(reversed(path))
+        stacks[key] = stacks.get(key, 0) + int(self_time * 1e6)
+    return stacks
+
+
+def folded_profile(stats, min_us: int = 50, max_depth: int = 64) -> dict:
+    """Approximate collapsed stacks from cProfile's caller graph, weighted by self time in µs.
+
+    cProfile keeps only caller→callee edges, so each function's self time is
+    split across its callers in proportion to the time each edge accounts for.
+    """
+    raw = stats.stats
+    stacks = {}
+
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    def walk(func, weight, path, seen):
+        callers = {caller: edge for caller, edge in raw[func][4].items() if caller in raw and caller not in seen}
+        total = sum(edge[3] for edge in callers.values())
+        if not callers or total <= 0 or len(path) >= max_depth:
+            key = ";".join(reversed(path))
+            stacks[key] = stacks.get(key, 0) + weight
+            return
+        for caller, edge in callers.items():
+            share = int(weight * edge[3] / total)
+            if share >= min_us:
+                walk(caller, share, path + [label(caller)], seen | {caller})
+
+    for func, (_, _, self_time, _, _) in raw.items():
+        weight = int(self_time * 1e6)
+        if weight >= min_us:
+            walk(func, weight, [label(func)], {func})
+    return stacks
+
+
+def _write_folded(path: str, stacks: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, weight in sorted(stacks.items()):
+            if weight > 0:
+                f.write(f"{stack} {weight}\n")
+
+
+def summarize(path: str) -> dict:
+    """Count, total and self time per span label from a trace file."""
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    spans = [{"span_id": e["args"]["span_id"], "parent_id": e["args"]["parent_id"], "name": e["name"],
+              "duration": e["dur"] / 1e6, "attrs": e["args"]} for e in document["traceEvents"]]
+    child_time = {}
+    for record in spans:
+        child_time[record["parent_id"]] = child_time.get(record["parent_id"], 0.0) + record["duration"]
+    rows = {}
+    for record in spans:
+        row = rows.setdefault(_label(record), {"count": 0, "total_s": 0.0, "self_s": 0.0})
+        row["count"] += 1
+        row["total_s"] += record["duration"]
+        row["self_s"] += max(0.0, record["duration"] - child_time.get(record["span_id"], 0.0))
+    return {"info": document["otherData"], "spans": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace file utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Time per span from a trace file")
+    summary_parser.add_argument("trace")
+    args = parser.parse_args()
+
+    summary = summarize(args.trace)
+    info = summary["info"]
+    wall = max((row["total_s"] for row in summary["spans"].values()), default=0.0)
+    print("=" * 60)
+    print(f"🔬 TRACE {info['trace_id']}")
+    print("=" * 60)
+    print(f"{'span':<28}{'count':>7}{'total s':>10}{'self s':>10}{'self %':>8}")
+    for label, row in sorted(summary["spans"].items(), key=lambda item: -item[1]["self_s"]):
+        share = row["self_s"] / wall if wall else 0.0
+        print(f"{label:<28}{row['count']:>7}{row['total_s']:>10.3f}{row['self_s']:>10.3f}{share:>8.1%}")
+    if info.get("memory"):
+        print(f"\nPeak traced memory: {info['memory']['peak_kb']} KB; top allocation sites:")
+        for site in info["memory"]["top"][:10]:
+            print(f"  {site['size_kb']:>9} KB  {site['count']:>6}  {site['where']}")
+
+
+if __name__ == "__main__":
+    main()
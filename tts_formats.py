@@ -0,0 +1,157 @@
+"""
+TTS output format negotiation and per-transcript audio stats.
+
+Transcript lines are one or two sentences of telephone speech, so the old
+fixed mp3_44100_128 spent most of its bytes on bandwidth the voice never
+uses. The browser now advertises the codecs it can decode (X-Audio-Codecs)
+and a quality hint (X-Audio-Quality, from the Network Information API); the
+Save-Data and ECT client-hint headers are honoured too. The server picks the
+most compact ElevenLabs output format the client can play for that quality:
+32 kbps Opus where supported, otherwise low-bitrate MP3. TTS_OUTPUT_FORMAT
+forces one format for every client.
+
+AudioStats keeps, per transcript, the bytes generated and served, what the
+same clips would have cost at mp3_44100_128, the TTS time to first audio and
+the client's own time to first audio (reported back by the page).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ElevenLabs output_format -> how it is served and how much it costs per second
+FORMATS = {
+    "opus_48000_32": {"codec": "opus", "mimetype": "audio/ogg", "ext": "ogg", "kbps": 32},
+    "opus_48000_64": {"codec": "opus", "mimetype": "audio/ogg", "ext": "ogg", "kbps": 64},
+    "mp3_22050_32": {"codec": "mp3", "mimetype": "audio/mpeg", "ext": "mp3", "kbps": 32},
+    "mp3_44100_64": {"codec": "mp3", "mimetype": "audio/mpeg", "ext": "mp3", "kbps": 64},
+    "mp3_44100_128": {"codec": "mp3", "mimetype": "audio/mpeg", "ext": "mp3", "kbps": 128},
+}
+BASELINE_FORMAT = "mp3_44100_128"
+
+# Formats to try, in order, for each quality tier
+PREFERENCES = {
+    "low": ["opus_48000_32", "mp3_22050_32"],
+    "standard": ["opus_48000_32", "mp3_44100_64"],
+    "high": ["opus_48000_64", "mp3_44100_128"],
+}
+SLOW_CONNECTIONS = ("slow-2g", "2g", "3g")
+
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "")
+# The CLI plays files with ffplay or mpg123, and mpg123 only decodes MP3
+CLI_OUTPUT_FORMAT = TTS_OUTPUT_FORMAT or "mp3_22050_32"
+MAX_TRANSCRIPTS = 50  # Transcripts kept in the stats report
+
+
+def choose_format(codecs=(), quality: str = "standard") -> str:
+    """Most compact output format the client can decode at the given quality tier.
+
+    A client that advertises nothing gets MP3, which every browser plays.
+    """
+    if TTS_OUTPUT_FORMAT:
+        return TTS_OUTPUT_FORMAT
+    codecs = set(codecs) or {"mp3"}
+    for output_format in PREFERENCES.get(quality, PREFERENCES["standard"]):
+        if FORMATS[output_format]["codec"] in codecs:
+            return output_format
+    return "mp3_22050_32" if quality == "low" else "mp3_44100_64"
+
+
+def negotiate(headers) -> str:
+    """Output format for a request, from its X-Audio-Codecs / X-Audio-Quality / Save-Data / ECT headers."""
+    codecs = [codec.strip().lower() for codec in headers.get("X-Audio-Codecs", "").split(",") if codec.strip()]
+    quality = headers.get("X-Audio-Quality", "").strip().lower()
+    if quality not in PREFERENCES:
+        slow = headers.get("Save-Data", "").lower() == "on" or headers.get("ECT", "").lower() in SLOW_CONNECTIONS
+        quality = "low" if slow else "standard"
+    return choose_format(codecs, quality)
+
+
+def mimetype(output_format: str) -> str:
+    return FORMATS.get(output_format, FORMATS[BASELINE_FORMAT])["mimetype"]
+
+
+def extension(output_format: str) -> str:
+    return FORMATS.get(output_format, FORMATS[BASELINE_FORMAT])["ext"]
+
+
+def baseline_bytes(size: int, output_format: str) -> int:
+    """Approximate size of the same clip at mp3_44100_128 (constant-bitrate estimate)."""
+    kbps = FORMATS.get(output_format, FORMATS[BASELINE_FORMAT])["kbps"]
+    return round(size * FORMATS[BASELINE_FORMAT]["kbps"] / kbps)
+
+
+class AudioStats:
+    """Bytes and time-to-first-audio for the most recent transcripts."""
+
+    def __init__(self, max_transcripts: int = MAX_TRANSCRIPTS):
+        self.max_transcripts = max_transcripts
+        self.transcripts = OrderedDict()
+        self.clip_transcripts = {}  # audio ID -> transcript ID, for bytes served
+        self.lock = threading.Lock()
+
+    def start(self, transcript_id: str, output_format: str):
+        with self.lock:
+            self.transcripts[transcript_id] = {
+                "format": output_format,
+                "started": time.perf_counter(),
+                "clips": 0,
+                "cached_clips": 0,
+                "bytes": 0,
+                "baseline_bytes": 0,
+                "bytes_served": 0,
+                "tts_first_audio_s": None,
+                "tts_total_s": 0.0,
+                "client_first_audio_s": None,
+            }
+            while len(self.transcripts) > self.max_transcripts:
+                old_id, _ = self.transcripts.popitem(last=False)
+                self.clip_transcripts = {a: t for a, t in self.clip_transcripts.items() if t != old_id}
+
+    def clip(self, transcript_id: str, audio_id: str, size: int, tts_s: float, cached: bool):
+        """Count one clip of the transcript; tts_s is the time spent generating it (0 when cached)."""
+        with self.lock:
+            entry = self.transcripts.get(transcript_id)
+            if entry is None:
+                return
+            self.clip_transcripts[audio_id] = transcript_id
+            entry["clips"] += 1
+            entry["cached_clips"] += cached
+            entry["bytes"] += size
+            entry["baseline_bytes"] += baseline_bytes(size, entry["format"])
+            entry["tts_total_s"] = round(entry["tts_total_s"] + tts_s, 3)
+            if entry["tts_first_audio_s"] is None:
+                # First clip ready, counted from the start of the transcript request
+                entry["tts_first_audio_s"] = round(time.perf_counter() - entry["started"], 3)
+
+    def served(self, audio_id: str, size: int):
+        with self.lock:
+            entry = self.transcripts.get(self.clip_transcripts.get(audio_id))
+            if entry is not None:
+                entry["bytes_served"] += size
+
+    def client_first_audio(self, transcript_id: str, seconds: float):
+        with self.lock:
+            entry = self.transcripts.get(transcript_id)
+            if entry is not None and entry["client_first_audio_s"] is None:
+                entry["client_first_audio_s"] = round(seconds, 3)
+
+    def report(self) -> dict:
+        with self.lock:
+            transcripts = {
+                transcript_id: {
+                    **{key: value for key, value in entry.items() if key != "started"},
+                    "bytes_saved": round(1 - entry["bytes"] / entry["baseline_bytes"], 4)
+                    if entry["baseline_bytes"] else 0.0,
+                }
+                for transcript_id, entry in self.transcripts.items()
+            }
+        total = sum(entry["bytes"] for entry in transcripts.values())
+        baseline = sum(entry["baseline_bytes"] for entry in transcripts.values())
+        return {
+            "transcripts": transcripts,
+            "bytes": total,
+            "baseline_bytes": baseline,
+            "bytes_saved": round(1 - total / baseline, 4) if baseline else 0.0,
+        }
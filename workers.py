@@ -0,0 +1,309 @@
+"""
+Process-pool backend for training runs.
+
+A training run is a generator of event dicts (app.training_events). With
+TRAINING_BACKEND=process each run executes in its own worker process, so the
+JSON serialization, prompt diffing and bookkeeping of concurrent runs no
+longer contend for one GIL with each other or with the web server.
+
+Workers share nothing but one multiprocessing queue: they push
+(run_id, event) tuples onto it, and a dispatcher thread in the web process
+routes each event to that run's in-process queue, which the streaming
+response reads from. Runs are scheduled by pull: every idle worker takes the
+next queued run, so load spreads across cores without a central assignment
+step, and runs beyond the worker count wait in FIFO order.
+
+Closing a run's stream (the client disconnected) cancels it if it is still
+queued, and otherwise raises its flag in a shared array the workers inherit;
+the worker checks the flag between events and closes the run's generator, so
+an abandoned run stops at its next turn instead of spending provider calls.
+
+Usage:
+    python workers.py bench                          # runs/min for 1..N workers
+    python workers.py bench --runs 32 --max-workers 8 --cpu-ms 20
+"""
+
+import argparse
+import functools
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+DEFAULT_WORKERS = int(os.getenv("TRAINING_WORKERS", "0")) or os.cpu_count() or 1
+# Runs in flight or queued that can be stopped early; any beyond this run to completion
+STOP_SLOTS = int(os.getenv("TRAINING_STOP_SLOTS", "1024"))
+
+# Marks the end of a run's event stream
+_END = None
+
+# Set in each worker process by _init_worker
+_events = None
+_stop_flags = None
+
+
+def _init_worker(event_queue, stop_flags):
+    global _events, _stop_flags
+    _events = event_queue
+    _stop_flags = stop_flags
+
+
+def _run_unit(run_id: str, target, args: tuple, kwargs: dict, slot: int = None) -> tuple:
+    """Worker side: drive one run's event generator and forward every event.
+
+    Returns (worker pid, whether the run was stopped because its stream closed).
+    """
+    stopped = False
+    events = target(*args, **kwargs)
+    try:
+        for event in events:
+            if slot is not None and _stop_flags[slot]:
+                stopped = True
+                break
+            _events.put((run_id, event))
+    except Exception as e:
+        _events.put((run_id, {"type": "error", "error": f"{type(e).__name__}: {e}"}))
+    finally:
+        if hasattr(events, "close"):
+            events.close()
+        _events.put((run_id, _END))
+    return os.getpid(), stopped
+
+
+def _warm_up(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+
+class WorkerPool:
+    """Process pool that streams each submitted run's events back to the caller."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        # spawn, not fork: the web server is multi-threaded
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.event_queue = context.Queue()
+        # One stop flag per slot, shared with the workers by inheritance
+        self.stop_flags = context.RawArray("b", STOP_SLOTS)
+        self.free_slots = list(range(STOP_SLOTS))
+        self.slots = {}
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_worker, initargs=(self.event_queue, self.stop_flags),
+        )
+        self.streams = {}
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "stopped": 0, "events": 0,
+                      "runs_by_worker": {}}
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            item = self.event_queue.get()
+            if item is None:
+                return
+            run_id, event = item
+            with self.lock:
+                self.stats["events"] += 1
+                stream = self.streams.get(run_id)
+            if stream is not None:
+                stream.put(event)
+
+    def _finished(self, run_id: str, future):
+        with self.lock:
+            slot = self.slots.pop(run_id, None)
+            if slot is not None:
+                self.free_slots.append(slot)
+            if future.cancelled():
+                # Never started: its stream was closed while it waited for a worker
+                self.stats["cancelled"] += 1
+                return
+            error = future.exception()
+            if error is None:
+                self.stats["completed"] += 1
+                pid, stopped = future.result()
+                self.stats["stopped"] += stopped
+                self.stats["runs_by_worker"][pid] = self.stats["runs_by_worker"].get(pid, 0) + 1
+                return
+            self.stats["failed"] += 1
+            stream = self.streams.get(run_id)
+        # The worker died before it could end its own stream
+        if stream is not None:
+            stream.put({"type": "error", "error": f"Worker failed: {error}"})
+            stream.put(_END)
+
+    def pending(self) -> int:
+        """Runs submitted but not finished (running or waiting for a worker)."""
+        with self.lock:
+            return self._pending(self.stats)
+
+    @staticmethod
+    def _pending(stats: dict) -> int:
+        return stats["submitted"] - stats["completed"] - stats["failed"] - stats["cancelled"]
+
+    def submit(self, target, *args, **kwargs) -> tuple:
+        """Queue one run of target(*args, **kwargs); returns (run_id, future, event queue)."""
+        run_id = uuid.uuid4().hex
+        stream = queue.Queue()
+        with self.lock:
+            self.streams[run_id] = stream
+            self.stats["submitted"] += 1
+            slot = self.free_slots.pop() if self.free_slots else None
+            if slot is not None:
+                self.stop_flags[slot] = 0
+                self.slots[run_id] = slot
+        future = self.executor.submit(_run_unit, run_id, target, args, kwargs, slot)
+        future.add_done_callback(functools.partial(self._finished, run_id))
+        return run_id, future, stream
+
+    def stream(self, target, *args, **kwargs):
+        """Run target in a worker and yield its events as they arrive.
+
+        Yields a {"type": "queued"} event first if every worker is busy,
+        with the number of runs already waiting ahead of this one.
+        Closing the generator cancels the run if it has not started yet and
+        stops it at its next event if it has.
+        """
+        ahead = self.pending() - self.workers
+        run_id, future, events = self.submit(target, *args, **kwargs)
+        try:
+            if ahead >= 0:
+                yield {"type": "queued", "ahead": ahead}
+            while True:
+                event = events.get()
+                if event is _END:
+                    return
+                yield event
+        finally:
+            future.cancel()
+            with self.lock:
+                self.streams.pop(run_id, None)
+                # The slot stays this run's until _finished frees it, which only happens once it is done
+                slot = self.slots.get(run_id)
+                if slot is not None and not future.done():
+                    self.stop_flags[slot] = 1
+
+    def warm_up(self):
+        """Start every worker process up front so the first runs don't pay for spawning."""
+        list(self.executor.map(_warm_up, [0.2] * self.workers))
+
+    def report(self) -> dict:
+        with self.lock:
+            report = dict(self.stats, runs_by_worker=dict(self.stats["runs_by_worker"]))
+        report["workers"] = self.workers
+        report["pending"] = self._pending(report)
+        return report
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.event_queue.put(None)
+        self.dispatcher.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool:
+    """Process-wide pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+
+def _drain(events) -> int:
+    return sum(1 for _ in events)
+
+
+def bench(runs: int, max_workers: int, attempts: int, turns: int) -> list:
+    """Runs/minute for 1..max_workers processes plus a same-size thread pool baseline."""
+    import app
+
+    config = dict(app.DEFAULT_CONFIG)
+    run_args = (
+        config,
+        app.get_debt_collector_prompt(config["company_name"], config["customer_name"],
+                                      config["debt_amount"], config["collector_personality"]),
+        app.get_defaulter_prompt(config["customer_name"], config["debt_amount"],
+                                 config["months_overdue"], config["available_funds"]),
+        None, attempts, turns,
+    )
+
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    results = []
+    for count in counts:
+        pool = WorkerPool(count)
+        pool.warm_up()
+        start = time.perf_counter()
+        streams = [pool.submit(app.training_events, *run_args)[2] for _ in range(runs)]
+        for stream in streams:
+            while stream.get() is not _END:
+                pass
+        elapsed = time.perf_counter() - start
+        pool.close()
+        results.append({"backend": "process", "workers": count, "seconds": elapsed})
+
+    # Same number of threads in one process, for comparison under the GIL
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda _: _drain(app.training_events(*run_args)), range(runs)))
+    results.append({"backend": "thread", "workers": max_workers, "seconds": time.perf_counter() - start})
+
+    base = results[0]["seconds"]
+    for result in results:
+        result["runs_per_min"] = round(runs / result["seconds"] * 60, 1)
+        result["speedup"] = round(base / result["seconds"], 2)
+        result["efficiency"] = round(result["speedup"] / result["workers"], 2)
+        result["seconds"] = round(result["seconds"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training worker pool utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="Scaling benchmark against the local stub provider")
+    bench_parser.add_argument("--runs", type=int, default=16)
+    bench_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    bench_parser.add_argument("--attempts", type=int, default=3)
+    bench_parser.add_argument("--turns", type=int, default=5)
+    bench_parser.add_argument("--latency-ms", type=float, default=20, help="Stub latency per provider call")
+    bench_parser.add_argument("--cpu-ms", type=float, default=10, help="Stub CPU time per provider call (holds the GIL)")
+    args = parser.parse_args()
+
+    # Must be set before app is imported here and before workers are spawned
+    scratch = tempfile.mkdtemp(prefix="workers-bench-")
+    os.environ.update({
+        "PROVIDER_STUB": "1",
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_CPU_MS": str(args.cpu_ms),
+        "PROMPT_LIBRARY": "0",
+        "RUNS_LOG_PATH": os.path.join(scratch, "runs.jsonl"),
+        # Benchmark runs checkpoint every turn; keep them (and their cleanup) away from real resumable runs
+        "CHECKPOINT_DIR": os.path.join(scratch, "checkpoints"),
+    })
+
+    print("=" * 60)
+    print("🏭 WORKER POOL SCALING BENCHMARK")
+    print("=" * 60)
+    print(f"{args.runs} runs × up to {args.attempts} attempts × {args.turns} turns, "
+          f"stub latency {args.latency_ms:g} ms + CPU {args.cpu_ms:g} ms per call")
+    print(f"\n{'backend':<9}{'workers':>8}{'seconds':>10}{'runs/min':>10}{'speedup':>9}{'eff.':>7}")
+    for result in bench(args.runs, args.max_workers, args.attempts, args.turns):
+        print(f"{result['backend']:<9}{result['workers']:>8}{result['seconds']:>10}{result['runs_per_min']:>10}"
+              f"{result['speedup']:>9}{result['efficiency']:>7}")
+
+
+if __name__ == "__main__":
+    main()